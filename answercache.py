@@ -0,0 +1,146 @@
+import asyncio
+import os
+import re
+import time
+import logging
+import numpy as np
+from collections import defaultdict
+from typing import Optional, Tuple, Callable, Awaitable
+from embedders import embedding_manager
+from metrics import metrics
+from sharedstate import shared_state
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase and collapse whitespace/punctuation so trivially different questions match"""
+    return re.sub(r"[^\w]+", " ", question.lower()).strip()
+
+
+class AnswerCache:
+    
+    def __init__(self):
+        """Semantic cache of /bot answers scoped by guild and channel"""
+        self.enabled = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+        self.threshold = float(os.getenv('ANSWER_CACHE_THRESHOLD', "0.92"))
+        self.ttl = float(os.getenv('ANSWER_CACHE_TTL', "600"))
+        self.max_entries = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', "200"))
+        self.entries = defaultdict(list)
+        self.in_flight = {}
+        # Last seen value of the shared "documents_version" counter, bumped on every
+        # document change in any shard process; answers computed against an older set are not stored
+        self.documents_version = 0
+    
+    @staticmethod
+    def scope_for(message) -> Tuple[Optional[str], str]:
+        """Cache scope of a Discord message"""
+        return (str(message.guild.id) if message.guild else None, str(message.channel.id))
+    
+    async def invalidate_documents(self, guild_id: Optional[str], channel_id: str):
+        """
+        Drop every cached answer after a document change. get_context searches all
+        channels when the model gives no channel_id, so any scope may depend on
+        the new document, not only the uploading guild/channel. Other shard
+        processes see the bumped shared version before their next lookup.
+        """
+        self._clear(await shared_state.increment("documents_version"), guild_id or channel_id)
+    
+    def _clear(self, documents_version: int, source: str):
+        self.documents_version = documents_version
+        stale = len(self.entries)
+        self.entries.clear()
+        if stale:
+            logger.info(f"Invalidated cached answers for {stale} scope(s) after document change in {source}")
+    
+    async def sync_documents_version(self) -> int:
+        """Drop cached answers if any process changed the documents since we last looked"""
+        documents_version = await shared_state.counter("documents_version")
+        if documents_version != self.documents_version:
+            self._clear(documents_version, "another process")
+        return documents_version
+    
+    async def embed(self, question: str) -> np.ndarray:
+        """Embed and L2-normalize a question off the event loop"""
+        embedding = np.asarray(await asyncio.to_thread(embedding_manager.get_embedding, question), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+    
+    def lookup(self, scope, embedding: np.ndarray) -> Optional[str]:
+        """Return the cached answer most similar to the question, if above threshold"""
+        now = time.monotonic()
+        entries = [entry for entry in self.entries.get(scope, []) if entry["expires_at"] > now]
+        self.entries[scope] = entries
+        if not entries:
+            return None
+        
+        similarities = np.stack([entry["embedding"] for entry in entries]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold:
+            return entries[best]["answer"]
+        return None
+    
+    def store(self, scope, question: str, embedding: np.ndarray, answer: str):
+        """Cache an answer for the scope, evicting the oldest entries beyond the limit"""
+        entries = self.entries[scope]
+        entries.append({
+            "question": question,
+            "embedding": embedding,
+            "answer": answer,
+            "expires_at": time.monotonic() + self.ttl
+        })
+        if len(entries) > self.max_entries:
+            del entries[:len(entries) - self.max_entries]
+    
+    async def get_or_compute(self, message, question: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Answer from cache, join an identical in-flight question, or compute and cache
+        
+        Args:
+            message: Discord message asking the question
+            question: Question text
+            compute: Coroutine factory producing the answer, or None if it should not be cached
+            
+        Returns:
+            The answer text, or None if compute failed
+        """
+        if not self.enabled:
+            return await compute()
+        
+        scope = self.scope_for(message)
+        key = (scope, normalize_question(question))
+        
+        if key in self.in_flight:
+            metrics.inc("answer_cache_requests", result="coalesced")
+            return await asyncio.shield(self.in_flight[key])
+        
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            embedding = await self.embed(question)
+            documents_version = await self.sync_documents_version()
+            answer = self.lookup(scope, embedding)
+            if answer is not None:
+                metrics.inc("answer_cache_requests", result="hit")
+            else:
+                metrics.inc("answer_cache_requests", result="miss")
+                answer = await compute()
+                if answer and documents_version == await self.sync_documents_version():
+                    self.store(scope, question, embedding, answer)
+            future.set_result(answer)
+            return answer
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                # Followers did not cancel; give them an ordinary failure to report instead
+                e = Exception("The answer being shared was cancelled")
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure isn't logged when nobody joined
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+
+# Global instance
+answer_cache = AnswerCache()
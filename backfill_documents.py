@@ -0,0 +1,83 @@
+"""
+One-off backfill of document vectors for documents stored before the doc_embed
+collection existed. Hierarchical retrieval (HIERARCHICAL_RETRIEVAL=true) only
+reaches documents that have one, so run this once before enabling it on an
+existing store:
+
+    python backfill_documents.py [--dry-run]
+
+Each document vector is computed from the chunk embeddings already in the
+store, so nothing is re-embedded. Documents that have a vector are skipped,
+which makes the script safe to re-run.
+"""
+import argparse
+import json
+import numpy as np
+from collections import defaultdict
+from dotenv import load_dotenv
+from storage import STORAGE_BACKEND
+from vectors import vector_manager
+
+load_dotenv()
+
+
+def _rows(client, table_name, columns):
+    """Raw rows of a vector collection; the clients only expose similarity queries"""
+    if STORAGE_BACKEND == 'sqlite':
+        sqlite_columns = ["metadata" if column == "meta" else column for column in columns]
+        return [tuple(row) for row in client.connection.execute(f'SELECT {", ".join(sqlite_columns)} FROM "{table_name}"')]
+    result = client.execute(f"SELECT {', '.join(columns)} FROM {table_name}")
+    if not result.get("success"):
+        raise RuntimeError(f"Could not read {table_name}: {result.get('error')}")
+    return [tuple(row) for row in result["result"]]
+
+
+def _embedding(value):
+    """Stored embedding as a float vector (SQLite keeps raw float32 bytes, TiDB a '[...]' string)"""
+    if isinstance(value, (bytes, bytearray, memoryview)) and STORAGE_BACKEND == 'sqlite':
+        return np.frombuffer(bytes(value), dtype=np.float32)
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode()
+    return np.asarray(json.loads(value) if isinstance(value, str) else value, dtype=np.float32)
+
+
+def backfill(dry_run=False):
+    indexed = {str(row[0]) for row in _rows(vector_manager.doc_client, 'doc_embed', ["id"])}
+
+    chunks = defaultdict(list)
+    for document, meta, embedding in _rows(vector_manager.vector_client, 'embed', ["document", "meta", "embedding"]):
+        metadata = json.loads(meta) if isinstance(meta, (str, bytes)) else (meta or {})
+        attachment_id = metadata.get("attachment_id")
+        if attachment_id is None or str(attachment_id) in indexed:
+            continue
+        chunks[str(attachment_id)].append((metadata.get("chunk_index", 0), document, metadata, embedding))
+
+    print(f"{len(indexed)} documents already have a vector, {len(chunks)} to backfill")
+    for attachment_id, document_chunks in chunks.items():
+        document_chunks.sort(key=lambda chunk: chunk[0])
+        _, first_text, metadata, _ = document_chunks[0]
+        if dry_run:
+            print(f"would backfill {metadata.get('filename')} ({attachment_id}, {len(document_chunks)} chunks)")
+            continue
+        vector_manager.doc_client.insert(
+            ids=[attachment_id],
+            texts=[f"{metadata.get('filename')}\n{first_text}"],
+            embeddings=[vector_manager.document_embedding([_embedding(chunk[3]) for chunk in document_chunks])],
+            metadatas=[{
+                "message_id": metadata.get("message_id"),
+                "channel_id": metadata.get("channel_id"),
+                "guild_id": metadata.get("guild_id"),
+                "author": metadata.get("author"),
+                "filename": metadata.get("filename"),
+                "attachment_id": metadata.get("attachment_id"),
+                "timestamp": metadata.get("timestamp"),
+                "total_chunks": len(document_chunks)
+            }]
+        )
+        print(f"backfilled {metadata.get('filename')} ({attachment_id}, {len(document_chunks)} chunks)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute missing document vectors from stored chunk embeddings")
+    parser.add_argument("--dry-run", action="store_true", help="List the documents without writing")
+    backfill(parser.parse_args().dry_run)
@@ -0,0 +1,254 @@
+"""
+Offline component benchmarks for the storage, embedding, extraction and LLM client layers.
+
+Runs without network access: documents and messages are synthetic, the LLM is
+the local fake server, and the database is a local MySQL-compatible instance
+(e.g. `tiup playground` for TiDB with vector and full-text search). The
+embedding model must already be in the local Hugging Face cache.
+
+    python benchmarks/components.py --db-url mysql://root@127.0.0.1:4000/test --output results.json
+    python benchmarks/components.py --compare baseline.json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import fixtures
+import dbhelpers
+
+ALL_BENCHES = ["message_insert", "history_fetch", "embedding", "extraction", "vector_query", "llm_client"]
+
+
+def latency_stats(timings):
+    timings = sorted(timings)
+    return {
+        "count": len(timings),
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def bench_message_insert(args, run_id):
+    from storage import db_manager
+    rows = fixtures.messages(args.messages, channel_id=f"bench-{run_id}")
+    start = time.perf_counter()
+    for row in rows:
+        db_manager.add_message(row)
+    elapsed = time.perf_counter() - start
+    return {"messages": len(rows), "seconds": elapsed, "messages_per_second": len(rows) / elapsed}
+
+
+def bench_history_fetch(args, run_id):
+    from storage import db_manager
+    channel_id = f"bench-{run_id}"
+    results = {}
+    for limit in (10, 50):
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            db_manager.get_chat_history(channel_id, limit=limit)
+            timings.append(time.perf_counter() - start)
+        results[f"limit_{limit}"] = latency_stats(timings)
+    return results
+
+
+def bench_embedding(args, run_id):
+    from embedders import embedding_manager
+    texts = [fixtures.document_text(1000, seed=i) for i in range(max(args.batch_sizes) * 2)]
+    embedding_manager.get_embeddings(texts[:2])  # warm up
+    results = {}
+    for batch_size in args.batch_sizes:
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        start = time.perf_counter()
+        for batch in batches:
+            embedding_manager.get_embeddings(batch)
+        elapsed = time.perf_counter() - start
+        results[f"batch_{batch_size}"] = {"texts": len(texts), "texts_per_second": len(texts) / elapsed}
+    return results
+
+
+def bench_extraction(args, run_id):
+    from filehandler import file_handler
+    from vectors import vector_manager
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for kind, chars, path in fixtures.build_documents(directory, sizes=args.doc_sizes):
+            start = time.perf_counter()
+            text = file_handler.extract_text(path, os.path.basename(path))
+            extract_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            chunks = vector_manager.chunk_text(text or "")
+            chunk_seconds = time.perf_counter() - start
+
+            results[f"{kind}_{chars}"] = {
+                "extracted_chars": len(text or ""),
+                "extract_chars_per_second": len(text or "") / extract_seconds if extract_seconds else None,
+                "chunks": len(chunks),
+                "chunk_chars_per_second": len(text or "") / chunk_seconds if chunk_seconds else None
+            }
+    return results
+
+
+def bench_vector_query(args, run_id):
+    from vectors import vector_manager
+    message_id = f"bench-{run_id}"
+    text = fixtures.document_text(args.vector_chars, seed=7)
+    attachment = {
+        'attachment_id': message_id, 'message_id': message_id, 'channel_id': f"bench-{run_id}",
+        'guild_id': "bench-guild", 'author': "bench", 'filename': "bench.txt",
+        'content_type': "text/plain", 'timestamp': datetime.now(timezone.utc)
+    }
+    start = time.perf_counter()
+    vector_manager.store_document_chunks(text, attachment)
+    ingest_seconds = time.perf_counter() - start
+    try:
+        queries = [fixtures.sentence(random.Random(i)) for i in range(args.repeats)]
+        results = {"ingest_seconds": ingest_seconds}
+        for label, channel_id in (("unfiltered", None), ("channel_filter", f"bench-{run_id}")):
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                vector_manager.search_similar_chunks(query, 5, channel_id)
+                timings.append(time.perf_counter() - start)
+            results[label] = latency_stats(timings)
+        return results
+    finally:
+        vector_manager.delete_document_chunks(message_id)
+
+
+def bench_llm_client(args, run_id):
+    async def run():
+        from fake_openai import start_server
+        runner = await start_server(port=args.llm_port)
+        from llm import LLMManager
+        manager = LLMManager()
+        try:
+            messages = [{"role": "user", "content": fixtures.document_text(2000)}]
+            await manager.make_chat_completion_request(messages=messages)
+            timings = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                await manager.make_chat_completion_request(messages=messages)
+                timings.append(time.perf_counter() - start)
+            return latency_stats(timings)
+        finally:
+            await manager.close()
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def cleanup(run_id):
+    from storage import db_manager
+    dbhelpers.delete_channel_data(db_manager, f"bench-{run_id}")
+
+
+def run(args):
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    if args.db_url:
+        os.environ['TIDB_CONNECTION_URL'] = args.db_url
+    if args.sqlite:
+        os.environ['STORAGE_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = args.sqlite
+    os.environ['API_BASE_URL'] = f"http://127.0.0.1:{args.llm_port}"
+    os.environ.pop('LLM_ENDPOINTS', None)
+
+    run_id = str(int(time.time()))
+    benches = args.only or ALL_BENCHES
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output")},
+        "results": {}
+    }
+
+    functions = {name: globals()[f"bench_{name}"] for name in ALL_BENCHES}
+    try:
+        for name in benches:
+            print(f"running {name}...")
+            try:
+                report["results"][name] = functions[name](args, run_id)
+            except Exception as e:
+                report["results"][name] = {"error": repr(e)}
+            print(json.dumps(report["results"][name], indent=2))
+    finally:
+        if "message_insert" in benches:
+            cleanup(run_id)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"wrote {args.output}")
+
+
+def flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten(f"{prefix}.{key}" if prefix else key, item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(old_path, new_path):
+    """Print each numeric metric of two result files side by side"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old_values = flatten("", old["results"], {})
+    new_values = flatten("", new["results"], {})
+    print(f"{'metric':<55} {'old':>12} {'new':>12} {'change':>8}")
+    for key in sorted(set(old_values) | set(new_values)):
+        a, b = old_values.get(key), new_values.get(key)
+        if a is None or b is None:
+            print(f"{key:<55} {str(a):>12} {str(b):>12}")
+            continue
+        change = f"{(b - a) / a * 100:+.1f}%" if a else ""
+        print(f"{key:<55} {a:>12.6g} {b:>12.6g} {change:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline component benchmarks")
+    parser.add_argument("--db-url", default=os.getenv('BENCH_TIDB_URL'),
+                        help="Local MySQL-compatible database (defaults to BENCH_TIDB_URL, then TIDB_CONNECTION_URL)")
+    parser.add_argument("--sqlite", metavar="PATH", help="Benchmark the embedded SQLite backend instead of TiDB")
+    parser.add_argument("--only", nargs="+", choices=ALL_BENCHES)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--doc-sizes", type=int, nargs="+", default=[20_000, 200_000])
+    parser.add_argument("--vector-chars", type=int, default=200_000)
+    parser.add_argument("--llm-port", type=int, default=8091)
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
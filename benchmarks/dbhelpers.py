@@ -0,0 +1,38 @@
+"""
+Raw SQL for benchmark setup and cleanup. This stays out of the storage
+managers so that benchmark-only or destructive operations are not part of
+the bot's storage API. Statements use %s placeholders and run on the
+manager's admin connection, for either storage backend.
+"""
+import sqlite3
+
+BENCH_TABLES = ("messages", "attachments", "channel_summaries")
+
+
+def run_sql(db_manager, statement, params=()):
+    """Execute one statement and return its rows as dicts"""
+    connection = db_manager.connection
+    if isinstance(connection, sqlite3.Connection):
+        return [dict(row) for row in connection.execute(statement.replace("%s", "?"), params)]
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(statement, params)
+        return cursor.fetchall() if cursor.with_rows else []
+    finally:
+        cursor.close()
+
+
+def delete_channel_data(db_manager, channel_id):
+    """Delete a benchmark channel's messages, attachments and summary"""
+    for table in BENCH_TABLES:
+        run_sql(db_manager, f"DELETE FROM {table} WHERE channel_id = %s", (channel_id,))
+
+
+def recorded_messages(db_manager, channel_id, limit):
+    """A channel's user messages, oldest first, for exporting replay traffic"""
+    return run_sql(
+        db_manager,
+        "SELECT guild_id, author, content, attachments, timestamp FROM messages "
+        "WHERE channel_id = %s AND author != 'bot' ORDER BY timestamp ASC, id ASC LIMIT %s",
+        (channel_id, limit)
+    )
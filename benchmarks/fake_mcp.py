@@ -0,0 +1,86 @@
+"""
+Stand-in MCP tool server exposing the same tool names and arguments as tools.py.
+
+Every tool sleeps for an injected latency and returns synthetic passages;
+web_search forwards to a Perplexity-compatible URL (e.g. a fake_openai.py
+instance) so its latency can be shaped separately:
+
+    python benchmarks/fake_mcp.py --port 8093 --latency 0.2 --pplx-url http://127.0.0.1:8092/chat/completions
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from typing import List, Optional
+
+import aiohttp
+from fastmcp import FastMCP
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixtures
+
+mcp = FastMCP("Jarvis-Stub")
+settings = {"latency": 0.0, "jitter": 0.0, "pplx_url": None, "passages": 5}
+
+
+async def delay():
+    await asyncio.sleep(settings["latency"] + random.uniform(0, settings["jitter"]))
+
+
+def passages(query: str) -> str:
+    rng = random.Random(query)
+    return "\n\n".join(fixtures.paragraph(rng) for _ in range(settings["passages"]))
+
+
+@mcp.tool()
+async def get_context(query: str, channel_id: Optional[str] = None, author: Optional[str] = None,
+                      include_web: bool = False, traceparent: Optional[str] = None) -> str:
+    """Return synthetic document passages for the query"""
+    await delay()
+    return passages(query)
+
+
+@mcp.tool()
+async def get_context_multi(queries: List[str], channel_id: Optional[str] = None, author: Optional[str] = None,
+                            k: int = 5, traceparent: Optional[str] = None) -> str:
+    """Return synthetic document passages for several queries"""
+    await delay()
+    return passages(" ".join(queries))
+
+
+@mcp.tool()
+async def web_search(query: str, traceparent: Optional[str] = None) -> str:
+    """Forward the query to the stub Perplexity endpoint"""
+    if not settings["pplx_url"]:
+        await delay()
+        return passages(query)
+    async with aiohttp.ClientSession() as session:
+        async with session.post(settings["pplx_url"], json={
+            "model": "sonar",
+            "messages": [{"role": "user", "content": query}]
+        }) as response:
+            data = await response.json()
+    return data["choices"][0]["message"]["content"]
+
+
+@mcp.tool()
+async def search_chats(keywords: List[str], traceparent: Optional[str] = None) -> str:
+    """Return synthetic chat lines mentioning the keywords"""
+    await delay()
+    return "\n".join(f"user{i}: {' '.join(keywords)}" for i in range(settings["passages"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub MCP tool server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8093)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--pplx-url")
+    parser.add_argument("--passages", type=int, default=5)
+    args = parser.parse_args()
+
+    settings.update(latency=args.latency, jitter=args.jitter, pplx_url=args.pplx_url, passages=args.passages)
+    mcp.run(transport="http", host=args.host, port=args.port, path="/mcp", log_level="warning")
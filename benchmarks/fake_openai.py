@@ -0,0 +1,211 @@
+"""
+Local fake OpenAI-compatible chat completions server.
+
+Used as a stand-in for the real LLM endpoint when benchmarking or load testing.
+Latency, error and rate-limit behaviour can be injected from the command line:
+
+    python benchmarks/fake_openai.py --port 8081 --latency 0.5 --rate-limit 0.1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from aiohttp import web
+
+
+def build_app(latency: float = 0.0,
+              jitter: float = 0.0,
+              error_rate: float = 0.0,
+              rate_limit: float = 0.0,
+              retry_after: float = 1.0,
+              token_latency: float = 0.0,
+              tool_call_rate: float = 0.0) -> web.Application:
+    """
+    Build the fake server application
+    
+    Args:
+        latency: Base delay in seconds before each response
+        jitter: Extra random delay in seconds (uniform 0..jitter)
+        error_rate: Fraction of requests answered with HTTP 500
+        rate_limit: Fraction of requests answered with HTTP 429
+        retry_after: Retry-After value sent with 429 responses
+        token_latency: Delay between streamed tokens when "stream" is requested
+        tool_call_rate: Fraction of requests offering tools that answer with a tool call
+                        (never right after a tool result, so each question makes at most one round)
+        
+    Returns:
+        aiohttp application
+    """
+    stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "prompt_tokens": 0, "cached_tokens": 0}
+    # Prefix hashes seen so far, standing in for a server-side prefix cache
+    seen_prefixes = set()
+
+    def usage_for(payload: dict, content: str) -> dict:
+        """Usage block with cached_tokens for the longest previously seen message prefix"""
+        digest = hashlib.sha256(json.dumps(payload.get("tools") or []).encode())
+        prompt_tokens = len(json.dumps(payload.get("tools") or [])) // 4
+        cached_tokens = 0
+        matching = True
+        for message in payload.get("messages", []):
+            encoded = json.dumps(message)
+            digest.update(encoded.encode())
+            prompt_tokens += len(encoded) // 4
+            key = digest.hexdigest()
+            if matching and key in seen_prefixes:
+                cached_tokens = prompt_tokens
+            else:
+                matching = False
+                seen_prefixes.add(key)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        payload = await request.json()
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(latency + random.uniform(0, jitter))
+
+            roll = random.random()
+            if roll < rate_limit:
+                return web.json_response(
+                    {"error": {"message": "rate limited"}},
+                    status=429,
+                    headers={"Retry-After": str(retry_after)}
+                )
+            if roll < rate_limit + error_rate:
+                return web.json_response({"error": {"message": "injected failure"}}, status=500)
+
+            last_user = next(
+                (m.get("content") for m in reversed(payload.get("messages", [])) if m.get("role") == "user"),
+                ""
+            )
+            content = f"Echo: {last_user}"
+            tool_call = None
+            messages = payload.get("messages", [])
+            if payload.get("tools") and messages and messages[-1].get("role") != "tool" and random.random() < tool_call_rate:
+                tool_call = fake_tool_call(random.choice(payload["tools"]), last_user)
+            if payload.get("stream"):
+                return await stream_response(request, payload, content, tool_call)
+            message = {"role": "assistant", "content": content}
+            if tool_call:
+                message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+            return web.json_response({
+                "id": f"chatcmpl-{stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_call else "stop"
+                }],
+                "usage": usage_for(payload, content)
+            })
+        finally:
+            stats["in_flight"] -= 1
+
+    async def stream_response(request: web.Request, payload: dict, content: str, tool_call: dict = None) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        if tool_call:
+            chunk = {
+                "id": f"chatcmpl-{stats['requests']}",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"tool_calls": [dict(tool_call, index=0)]}, "finish_reason": "tool_calls"}]
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            content = ""
+        for i, word in enumerate(content.split(" ") if content else []):
+            chunk = {
+                "id": f"chatcmpl-{stats['requests']}",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(token_latency)
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            chunk = {
+                "id": f"chatcmpl-{stats['requests']}",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "fake"),
+                "choices": [],
+                "usage": usage_for(payload, content)
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app["stats"] = stats
+    app.router.add_post("/chat/completions", chat_completions)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def fake_tool_call(tool: dict, text: str) -> dict:
+    """Build a call to the given tool, filling required arguments from the user's text"""
+    function = tool.get("function", {})
+    parameters = function.get("parameters", {})
+    arguments = {}
+    for name in parameters.get("required", []):
+        schema = parameters.get("properties", {}).get(name, {})
+        arguments[name] = [text] if schema.get("type") == "array" else text
+    return {
+        "id": f"call_{random.getrandbits(32):08x}",
+        "type": "function",
+        "function": {"name": function.get("name", ""), "arguments": json.dumps(arguments)}
+    }
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 8081, **options) -> web.AppRunner:
+    """Start the fake server in the running event loop and return its runner"""
+    runner = web.AppRunner(build_app(**options))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--tool-call-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    web.run_app(
+        build_app(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate_limit=args.rate_limit,
+            retry_after=args.retry_after,
+            token_latency=args.token_latency,
+            tool_call_rate=args.tool_call_rate
+        ),
+        host=args.host,
+        port=args.port
+    )
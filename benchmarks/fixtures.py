@@ -0,0 +1,135 @@
+"""
+Synthetic inputs for the offline benchmarks: chat messages and TXT/PDF/DOCX
+documents generated locally, so no network or real user data is needed.
+"""
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+WORDS = (
+    "exam lecture theorem proof matrix vector gradient entropy protein enzyme "
+    "market supply demand equilibrium history treaty empire revolution poem "
+    "metaphor algorithm recursion pointer compiler network latency cache "
+    "question answer deadline assignment chapter summary revision formula"
+).split()
+
+
+def sentence(rng: random.Random, min_words: int = 6, max_words: int = 18) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def document_text(chars: int, seed: int = 0) -> str:
+    """Deterministic prose of roughly the given length"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < chars:
+        part = paragraph(rng, rng.randint(3, 7))
+        parts.append(part)
+        total += len(part) + 2
+    return "\n\n".join(parts)[:chars]
+
+
+def messages(count: int, channel_id: str, guild_id: str = "bench-guild", seed: int = 0):
+    """Message rows shaped like BotMessage.store_message output"""
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=count)
+    base_id = rng.randint(10 ** 17, 10 ** 18)
+    rows = []
+    for i in range(count):
+        referenced = str(base_id + i - 1) if i and rng.random() < 0.2 else None
+        rows.append({
+            'message_id': str(base_id + i),
+            'channel_id': channel_id,
+            'guild_id': guild_id,
+            'author': f"user{rng.randint(1, 25)}",
+            'content': (" ".join(sentence(rng) for _ in range(rng.randint(1, 4))))[:1900],
+            'timestamp': start + timedelta(seconds=i),
+            'edited_timestamp': None,
+            'type': 0,
+            'embeds': None,
+            'attachments': None,
+            'mentions': None,
+            'referenced_message_id': referenced
+        })
+    return rows
+
+
+def write_txt(path: str, text: str) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, text: str, lines_per_page: int = 50, width: int = 90) -> str:
+    """Write a plain multi-page PDF with Helvetica text, no PDF library required"""
+    lines = []
+    for para in text.split("\n"):
+        while len(para) > width:
+            cut = para.rfind(" ", 0, width)
+            cut = cut if cut > 0 else width
+            lines.append(para[:cut])
+            para = para[cut:].lstrip()
+        lines.append(para)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in pages:
+        stream = "BT /F1 10 Tf 50 800 Td 14 TL " + " ".join(f"({_pdf_escape(l)}) '" for l in page) + " ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1', 'replace'))} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1", "replace")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def write_docx(path: str, text: str):
+    """Write a .docx with one paragraph per text paragraph; None if python-docx is missing"""
+    try:
+        from docx import Document
+    except ImportError:
+        return None
+    document = Document()
+    for para in text.split("\n\n"):
+        document.add_paragraph(para)
+    document.save(path)
+    return path
+
+
+def build_documents(directory: str, sizes=(20_000, 200_000)):
+    """Generate TXT/PDF/DOCX fixtures of each size; returns [(kind, chars, path)]"""
+    os.makedirs(directory, exist_ok=True)
+    fixtures = []
+    for chars in sizes:
+        text = document_text(chars, seed=chars)
+        fixtures.append(("txt", chars, write_txt(os.path.join(directory, f"doc_{chars}.txt"), text)))
+        fixtures.append(("pdf", chars, write_pdf(os.path.join(directory, f"doc_{chars}.pdf"), text)))
+        docx = write_docx(os.path.join(directory, f"doc_{chars}.docx"), text)
+        if docx:
+            fixtures.append(("docx", chars, docx))
+    return fixtures
@@ -0,0 +1,136 @@
+"""
+Accuracy and latency-saved evaluation of the local intent router (intents.py).
+
+A dataset is JSONL of {"text", "intent"} with intent one of chat, documents,
+web or fallback ("needs the model's judgement": any routed answer is wrong).
+The router's examples (INTENT_EXAMPLES or the built-in set) should not
+overlap the dataset. Thresholds are swept and each setting is scored:
+
+    python benchmarks/intent_eval.py --dataset benchmarks/intents.jsonl \\
+        --ks 3 5 7 --min-similarities 0.5 0.6 0.7 --min-confidences 0.6 0.7 0.8 \\
+        --round-seconds 1.5 --tool-seconds 0.3 --output intents.json
+
+Savings model per question, against the normal tool loop:
+    documents/web routed correctly   one completion round saved (--round-seconds)
+    documents/web routed wrongly     the pre-run tool is wasted (--tool-seconds)
+    chat routed wrongly              answered without tools: counted as harmful
+    chat routed correctly, fallback  no time saved (chat only saves prompt tokens)
+and every question pays the router's own latency.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from components import latency_stats, git_commit
+from intents import IntentRouter, CHAT, DOCUMENTS, WEB, FALLBACK
+
+INTENTS = [CHAT, DOCUMENTS, WEB, FALLBACK]
+
+
+def score(predictions, labels, round_seconds, tool_seconds, route_seconds):
+    """Accuracy, coverage, harmful rate and estimated seconds saved per question"""
+    confusion = {label: {intent: 0 for intent in INTENTS} for label in INTENTS}
+    saved = 0.0
+    harmful = 0
+    for predicted, label in zip(predictions, labels):
+        confusion[label][predicted] += 1
+        if predicted in (DOCUMENTS, WEB):
+            saved += round_seconds if predicted == label else -tool_seconds
+        elif predicted == CHAT and label != CHAT:
+            harmful += 1
+    routed = [(p, l) for p, l in zip(predictions, labels) if p != FALLBACK]
+    return {
+        "accuracy": sum(p == l for p, l in zip(predictions, labels)) / len(labels),
+        "routed_precision": sum(p == l for p, l in routed) / len(routed) if routed else 0.0,
+        "coverage": len(routed) / len(labels),
+        "harmful_rate": harmful / len(labels),
+        "saved_seconds_per_question": saved / len(labels) - route_seconds,
+        "confusion": confusion
+    }
+
+
+def run(args):
+    with open(args.dataset) as f:
+        dataset = [json.loads(line) for line in f if line.strip()]
+    texts = [item["text"] for item in dataset]
+    labels = [item["intent"] for item in dataset]
+
+    embedder = None
+    if args.model:
+        from embedders import EmbeddingManager
+        embedder = EmbeddingManager(args.model).get_embeddings
+    router = IntentRouter(IntentRouter.load_examples(args.examples), embed=embedder)
+    router._load()
+
+    # Router latency as seen in production: one question embedded and classified at a time
+    timings = []
+    embeddings = []
+    for text in texts:
+        start = time.perf_counter()
+        embedding = router.embed([text])[0]
+        router.classify_embedding(embedding)
+        timings.append(time.perf_counter() - start)
+        embeddings.append(embedding)
+    latency = latency_stats(timings)
+    route_seconds = latency["mean_ms"] / 1000
+    print(f"router latency: mean={latency['mean_ms']:.2f}ms p95={latency['p95_ms']:.2f}ms "
+          f"({len(router.labels)} examples, {len(dataset)} questions)")
+
+    results = []
+    for k in args.ks:
+        for min_similarity in args.min_similarities:
+            for min_confidence in args.min_confidences:
+                router.k, router.min_similarity, router.min_confidence = k, min_similarity, min_confidence
+                predictions = [router.classify_embedding(embedding)[0] for embedding in embeddings]
+                result = {
+                    "k": k,
+                    "min_similarity": min_similarity,
+                    "min_confidence": min_confidence,
+                    **score(predictions, labels, args.round_seconds, args.tool_seconds, route_seconds)
+                }
+                results.append(result)
+                print(f"k={k} sim>={min_similarity:.2f} conf>={min_confidence:.2f} "
+                      f"accuracy={result['accuracy']:.3f} precision={result['routed_precision']:.3f} "
+                      f"coverage={result['coverage']:.3f} harmful={result['harmful_rate']:.3f} "
+                      f"saved={result['saved_seconds_per_question'] * 1000:.0f}ms/question")
+
+    passing = [r for r in results if r["harmful_rate"] <= args.max_harmful]
+    best = max(passing, key=lambda r: (r["saved_seconds_per_question"], r["accuracy"])) if passing else None
+    if best:
+        print(f"\nMost time saved with harmful rate <= {args.max_harmful}:")
+        print(f"  INTENT_K={best['k']} INTENT_MIN_SIMILARITY={best['min_similarity']} "
+              f"INTENT_MIN_CONFIDENCE={best['min_confidence']}")
+    else:
+        print(f"\nNo setting kept the harmful rate <= {args.max_harmful}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "questions": len(dataset),
+                "examples": len(router.labels),
+                "router_latency": latency,
+                "best": best,
+                "results": results
+            }, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intent router accuracy and latency-saved evaluation")
+    parser.add_argument("--dataset", default=os.path.join(BENCH_DIR, "intents.jsonl"))
+    parser.add_argument("--examples", default=os.getenv('INTENT_EXAMPLES'), help="JSONL of router examples (default: built-in)")
+    parser.add_argument("--model", help="Embedding model (default: EMBEDDING_MODEL)")
+    parser.add_argument("--ks", type=int, nargs="+", default=[3, 5, 7])
+    parser.add_argument("--min-similarities", type=float, nargs="+", default=[0.5, 0.6, 0.7])
+    parser.add_argument("--min-confidences", type=float, nargs="+", default=[0.6, 0.7, 0.8])
+    parser.add_argument("--round-seconds", type=float, default=1.5, help="Latency of one completion round")
+    parser.add_argument("--tool-seconds", type=float, default=0.3, help="Latency of a wasted pre-run tool call")
+    parser.add_argument("--max-harmful", type=float, default=0.02, help="Allowed share of tool questions answered as chat")
+    parser.add_argument("--output")
+    run(parser.parse_args())
@@ -0,0 +1,46 @@
+"""
+Check that concurrent LLM requests overlap instead of queueing.
+
+Starts the fake OpenAI-compatible server with a fixed latency, fires N
+requests at once through LLMManager and compares wall time to N * latency:
+
+    python benchmarks/llm_concurrency.py --requests 20 --latency 1.0
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import start_server
+
+
+async def main(requests: int, latency: float, port: int):
+    os.environ['API_BASE_URL'] = f"http://127.0.0.1:{port}"
+    from llm import LLMManager
+
+    runner = await start_server(port=port, latency=latency)
+    manager = LLMManager()
+    try:
+        messages = [{"role": "user", "content": "ping"}]
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            manager.make_chat_completion_request(messages=messages) for _ in range(requests)
+        ])
+        elapsed = time.perf_counter() - start
+        print(f"{requests} requests with {latency:.2f}s latency finished in {elapsed:.2f}s "
+              f"(sequential would take {requests * latency:.2f}s)")
+    finally:
+        await manager.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM client concurrency check")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency, args.port))
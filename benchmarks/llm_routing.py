@@ -0,0 +1,85 @@
+"""
+Exercise multi-endpoint routing against several local fake servers.
+
+Starts one fake OpenAI-compatible server per --server spec (latency,error_rate)
+and sends requests through LLMManager, then reports which endpoints served
+them and the latency percentiles:
+
+    python benchmarks/llm_routing.py --server 0.2,0 --server 1.0,0 --server 0.1,0.5 --hedge-delay 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import start_server
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def main(servers, requests, concurrency, hedge_delay, base_port):
+    endpoints = []
+    runners = []
+    for i, (latency, error_rate) in enumerate(servers):
+        port = base_port + i
+        runners.append(await start_server(port=port, latency=latency, error_rate=error_rate))
+        endpoints.append({"name": f"fake-{i}", "base_url": f"http://127.0.0.1:{port}", "model": "fake"})
+
+    os.environ['LLM_ENDPOINTS'] = json.dumps(endpoints)
+    os.environ['LLM_HEDGE_DELAY'] = str(hedge_delay)
+    from llm import LLMManager
+
+    manager = LLMManager()
+    latencies = []
+    failures = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal failures
+        async with limit:
+            start = time.perf_counter()
+            try:
+                await manager.make_chat_completion_request(messages=[{"role": "user", "content": "ping"}])
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    try:
+        await asyncio.gather(*[one() for _ in range(requests)])
+    finally:
+        await manager.close()
+
+    served = Counter()
+    for runner, endpoint in zip(runners, endpoints):
+        served[endpoint["name"]] = runner.app["stats"]["requests"]
+        await runner.cleanup()
+
+    print(f"requests={requests} failures={failures} "
+          f"p50={percentile(latencies, 0.5):.3f}s p95={percentile(latencies, 0.95):.3f}s p99={percentile(latencies, 0.99):.3f}s")
+    for endpoint in manager.router.endpoints:
+        print(f"  {endpoint.name}: upstream requests={served[endpoint.name]} {endpoint.to_dict()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM routing benchmark")
+    parser.add_argument("--server", action="append", default=[],
+                        help="latency,error_rate for one fake endpoint (repeatable)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--hedge-delay", type=float, default=0.0)
+    parser.add_argument("--base-port", type=int, default=8181)
+    args = parser.parse_args()
+
+    specs = args.server or ["0.2,0", "0.8,0", "0.1,0.3"]
+    servers = [tuple(float(x) for x in spec.split(",")) for spec in specs]
+    asyncio.run(main(servers, args.requests, args.concurrency, args.hedge_delay, args.base_port))
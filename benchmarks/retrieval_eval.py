@@ -0,0 +1,290 @@
+"""
+Retrieval quality versus latency sweep over chunking, embedding model, k and filter strategy.
+
+A dataset is JSONL of {"question", "document", "answer", "channel_id"}: the
+answer is a span of the document's text, so labels do not depend on how the
+document is chunked. A retrieved chunk counts as relevant when it comes from
+the same document and contains at least --match of the answer's words.
+Datasets can be hand-labelled or generated from local documents:
+
+    python benchmarks/retrieval_eval.py build --docs ./docs --output dataset.jsonl
+    python benchmarks/retrieval_eval.py sweep --docs ./docs --dataset dataset.jsonl \\
+        --chunk-sizes 500 1000 1500 --overlaps 0 100 200 --ks 3 5 10 \\
+        --models sentence-transformers/all-MiniLM-L6-v2 BAAI/bge-small-en-v1.5 \\
+        --min-recall 0.8 --output sweep.json
+
+Search runs in-process with exact cosine similarity by default. Use --backend tidb
+to load each configuration into a scratch TiDB vector table (TIDB_CONNECTION_URL),
+which measures the production query path and its post-filtering.
+
+Filter strategies, applied to the question's channel:
+    none       no channel filter
+    post       k nearest overall, then drop other channels (what a vector index does)
+    overfetch  4k nearest overall, then drop other channels and keep k
+    pre        exact search over the channel's chunks only
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from components import git_commit
+
+STRATEGIES = ["none", "post", "overfetch", "pre"]
+OVERFETCH = 4
+WORD = re.compile(r"\w+")
+
+
+def load_documents(directory, channels):
+    """Extract text from every supported file; documents are spread over `channels` channels"""
+    from filehandler import file_handler
+    documents = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path) or not file_handler.is_supported_file(name):
+            continue
+        text = file_handler.extract_text(path, name)
+        if text:
+            text = '\n'.join(line.strip() for line in text.splitlines() if line.strip())
+            documents[name] = {"text": text, "channel_id": f"c{len(documents) % channels}"}
+    return documents
+
+
+def build_dataset(documents, per_document, seed):
+    """Turn random sentences into questions by dropping and shuffling some words"""
+    rng = random.Random(seed)
+    dataset = []
+    for name, document in documents.items():
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", document["text"]) if len(s.split()) >= 8]
+        for answer in rng.sample(sentences, min(per_document, len(sentences))):
+            kept = [w for w in answer.rstrip(".!?").split() if rng.random() > 0.3]
+            tail = kept[len(kept) // 2:]
+            rng.shuffle(tail)
+            dataset.append({
+                "question": " ".join(kept[:len(kept) // 2] + tail).lower() + "?",
+                "document": name,
+                "answer": answer,
+                "channel_id": document["channel_id"]
+            })
+    return dataset
+
+
+def words(text):
+    return set(WORD.findall(text.lower()))
+
+
+def chunk_documents(documents, chunk_size, overlap):
+    # Same splitter settings as VectorManager.text_splitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    chunks = []
+    for name, document in documents.items():
+        for text in splitter.split_text(document["text"]):
+            chunks.append({"document": name, "channel_id": document["channel_id"], "text": text})
+    return chunks
+
+
+def is_relevant(chunk, item, match):
+    answer = words(item["answer"])
+    return chunk["document"] == item["document"] and len(answer & words(chunk["text"])) >= match * len(answer)
+
+
+class LocalIndex:
+    """Exact cosine search over normalized embeddings held in memory"""
+
+    def __init__(self, chunks, embeddings):
+        self.chunks = chunks
+        self.matrix = np.asarray(embeddings, dtype=np.float32)
+        self.matrix /= np.linalg.norm(self.matrix, axis=1, keepdims=True) + 1e-12
+        self.channels = np.array([chunk["channel_id"] for chunk in chunks])
+
+    def size_bytes(self):
+        return self.matrix.nbytes + sum(len(chunk["text"].encode()) for chunk in self.chunks)
+
+    def search(self, query_embedding, k, channel_id, strategy):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        scores = self.matrix @ query
+        if strategy == "pre":
+            candidates = np.flatnonzero(self.channels == channel_id)
+            order = candidates[np.argsort(-scores[candidates])[:k]]
+        else:
+            fetch = k * OVERFETCH if strategy == "overfetch" else k
+            order = np.argsort(-scores)[:fetch]
+            if strategy != "none":
+                order = [i for i in order if self.channels[i] == channel_id][:k]
+        return [self.chunks[i] for i in order]
+
+
+class TiDBIndex:
+    """Scratch TiDB vector table, queried the way VectorManager does"""
+
+    def __init__(self, chunks, embeddings):
+        from tidb_vector.integrations import TiDBVectorClient
+        self.chunks = chunks
+        self.client = TiDBVectorClient(
+            table_name=f"eval_embed_{len(embeddings[0])}",
+            connection_string=os.environ['TIDB_CONNECTION_URL'],
+            vector_dimension=len(embeddings[0]),
+            drop_existing_table=True,
+            distance_strategy="cosine"
+        )
+        self.client.insert(
+            ids=[str(i) for i in range(len(chunks))],
+            texts=[chunk["text"] for chunk in chunks],
+            embeddings=embeddings,
+            metadatas=[{"channel_id": chunk["channel_id"], "index": i} for i, chunk in enumerate(chunks)]
+        )
+        self.dimension = len(embeddings[0])
+
+    def size_bytes(self):
+        return len(self.chunks) * self.dimension * 4 + sum(len(chunk["text"].encode()) for chunk in self.chunks)
+
+    def search(self, query_embedding, k, channel_id, strategy):
+        if strategy in ("pre", "post"):
+            # Both use the SQL metadata filter, which is the production path
+            results = self.client.query(query_vector=query_embedding, k=k, filter={"channel_id": channel_id})
+        else:
+            fetch = k * OVERFETCH if strategy == "overfetch" else k
+            results = self.client.query(query_vector=query_embedding, k=fetch)
+            if strategy == "overfetch":
+                results = [r for r in results if r.metadata["channel_id"] == channel_id][:k]
+        return [self.chunks[r.metadata["index"]] for r in results]
+
+
+def evaluate(index, dataset, question_embeddings, k, strategy, match):
+    hits, reciprocal_ranks, timings = 0, [], []
+    for item, embedding in zip(dataset, question_embeddings):
+        start = time.perf_counter()
+        results = index.search(embedding, k, item["channel_id"], strategy)
+        timings.append(time.perf_counter() - start)
+        rank = next((i + 1 for i, chunk in enumerate(results) if is_relevant(chunk, item, match)), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    timings.sort()
+    return {
+        "recall_at_k": hits / len(dataset),
+        "mrr": statistics.fmean(reciprocal_ranks),
+        "query_p50_ms": timings[len(timings) // 2] * 1000,
+        "query_p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000
+    }
+
+
+def sweep(args):
+    from embedders import EmbeddingManager
+
+    documents = load_documents(args.docs, args.channels)
+    with open(args.dataset) as f:
+        dataset = [json.loads(line) for line in f if line.strip()]
+    dataset = [item for item in dataset if item["document"] in documents]
+    if not dataset:
+        raise SystemExit("No dataset questions match the documents in --docs")
+
+    index_class = TiDBIndex if args.backend == "tidb" else LocalIndex
+    results = []
+    for model_name in args.models:
+        embedder = EmbeddingManager(model_name)
+        start = time.perf_counter()
+        question_embeddings = embedder.get_embeddings([item["question"] for item in dataset])
+        embed_query_ms = (time.perf_counter() - start) / len(dataset) * 1000
+
+        for chunk_size in args.chunk_sizes:
+            for overlap in args.overlaps:
+                if overlap >= chunk_size:
+                    continue
+                start = time.perf_counter()
+                chunks = chunk_documents(documents, chunk_size, overlap)
+                embeddings = embedder.get_embeddings([chunk["text"] for chunk in chunks])
+                index = index_class(chunks, embeddings)
+                ingest_seconds = time.perf_counter() - start
+
+                for k in args.ks:
+                    for strategy in args.strategies:
+                        result = {
+                            "model": model_name,
+                            "chunk_size": chunk_size,
+                            "overlap": overlap,
+                            "k": k,
+                            "strategy": strategy,
+                            "chunks": len(chunks),
+                            "index_bytes": index.size_bytes(),
+                            "ingest_seconds": ingest_seconds,
+                            "embed_query_ms": embed_query_ms,
+                            **evaluate(index, dataset, question_embeddings, k, strategy, args.match)
+                        }
+                        result["latency_ms"] = result["embed_query_ms"] + result["query_p50_ms"]
+                        results.append(result)
+                        print(f"{model_name} size={chunk_size} overlap={overlap} k={k} {strategy:<9} "
+                              f"recall={result['recall_at_k']:.3f} mrr={result['mrr']:.3f} "
+                              f"chunks={len(chunks)} ingest={ingest_seconds:.1f}s latency={result['latency_ms']:.2f}ms")
+
+    passing = [r for r in results if r["recall_at_k"] >= args.min_recall]
+    best = min(passing, key=lambda r: (r["latency_ms"], r["index_bytes"])) if passing else None
+    if best:
+        print(f"\nFastest configuration with recall@k >= {args.min_recall}:")
+        print(f"  EMBEDDING_MODEL={best['model']} CHUNK_SIZE={best['chunk_size']} "
+              f"CHUNK_OVERLAP={best['overlap']} CONTEXT_TOP_K={best['k']} (filter: {best['strategy']})")
+    else:
+        print(f"\nNo configuration reached recall@k >= {args.min_recall}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "questions": len(dataset),
+                "documents": len(documents),
+                "backend": args.backend,
+                "best": best,
+                "results": results
+            }, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval quality/latency evaluation")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Generate a question dataset from local documents")
+    build.add_argument("--docs", required=True)
+    build.add_argument("--output", required=True)
+    build.add_argument("--per-document", type=int, default=20)
+    build.add_argument("--channels", type=int, default=4)
+    build.add_argument("--seed", type=int, default=0)
+
+    run = commands.add_parser("sweep", help="Evaluate every configuration against a dataset")
+    run.add_argument("--docs", required=True)
+    run.add_argument("--dataset", required=True)
+    run.add_argument("--channels", type=int, default=4, help="Must match the value used by build")
+    run.add_argument("--models", nargs="+", default=[os.getenv('EMBEDDING_MODEL', "sentence-transformers/all-MiniLM-L6-v2")])
+    run.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, 1000, 1500])
+    run.add_argument("--overlaps", type=int, nargs="+", default=[0, 100, 200])
+    run.add_argument("--ks", type=int, nargs="+", default=[3, 5, 10])
+    run.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=STRATEGIES)
+    run.add_argument("--match", type=float, default=0.8, help="Share of answer words a relevant chunk must contain")
+    run.add_argument("--min-recall", type=float, default=0.8)
+    run.add_argument("--backend", choices=["local", "tidb"], default="local")
+    run.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        dataset = build_dataset(load_documents(args.docs, args.channels), args.per_document, args.seed)
+        with open(args.output, "w") as f:
+            for item in dataset:
+                f.write(json.dumps(item) + "\n")
+        print(f"wrote {len(dataset)} questions to {args.output}")
+    else:
+        sweep(args)
@@ -0,0 +1,107 @@
+"""
+Compare per-call overhead of in-process and HTTP MCP tool dispatch.
+
+Starts a throwaway FastMCP server with a no-op tool in a subprocess, then
+times the same call through MCPSession over HTTP and in-process:
+
+    python benchmarks/tool_dispatch.py --calls 500
+
+Pass --real-tool/--real-args to also time a tool from tools.py in-process
+(requires the bot's database and embedding model to be available).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastmcp import FastMCP
+
+bench_server = FastMCP("Dispatch-Bench")
+
+
+@bench_server.tool()
+def noop(payload: str = "") -> str:
+    """Return the payload unchanged"""
+    return payload
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"MCP bench server did not start on port {port}")
+
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    mean = sum(timings) / len(timings)
+    p50 = timings[len(timings) // 2]
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<28} mean={mean * 1000:.3f}ms p50={p50 * 1000:.3f}ms p99={p99 * 1000:.3f}ms")
+    return {"mean_ms": mean * 1000, "p50_ms": p50 * 1000, "p99_ms": p99 * 1000}
+
+
+async def time_calls(session, name, arguments, calls):
+    await session.call_tool(name, arguments)  # warm up
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await session.call_tool(name, arguments)
+        timings.append(time.perf_counter() - start)
+    await session.close()
+    return timings
+
+
+async def main(args):
+    from llmclient import MCPSession
+
+    payload = {"payload": "x" * args.payload_bytes}
+    results = {}
+
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(args.port)])
+    try:
+        wait_for_port(args.port)
+        remote = await time_calls(MCPSession(f"http://127.0.0.1:{args.port}/mcp"), "noop", payload, args.calls)
+        results["noop_http"] = summarize("noop over HTTP", remote)
+    finally:
+        server.terminate()
+        server.wait()
+
+    local = await time_calls(MCPSession(bench_server), "noop", payload, args.calls)
+    results["noop_inprocess"] = summarize("noop in-process", local)
+    print(f"HTTP hop overhead: {results['noop_http']['mean_ms'] - results['noop_inprocess']['mean_ms']:.3f}ms per call")
+
+    if args.real_tool:
+        from tools import mcp
+        real = await time_calls(MCPSession(mcp), args.real_tool, json.loads(args.real_args), args.calls)
+        results[f"{args.real_tool}_inprocess"] = summarize(f"{args.real_tool} in-process", real)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCP tool dispatch overhead benchmark")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--payload-bytes", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=9197)
+    parser.add_argument("--real-tool")
+    parser.add_argument("--real-args", default="{}")
+    parser.add_argument("--output")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        bench_server.run(transport="http", host="127.0.0.1", port=args.serve, path="/mcp", log_level="warning")
+    else:
+        asyncio.run(main(args))
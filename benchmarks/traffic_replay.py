@@ -0,0 +1,428 @@
+"""
+Load test for main.on_message with fake Discord objects and stubbed services.
+
+Drives the real on_message handler (storage, summaries, attachment ingestion,
+/bot answers) in one event loop, the way the bot runs in production. The LLM
+and Perplexity are fake_openai.py instances and the MCP tools are fake_mcp.py,
+all with injected latency; attachments are served from a local file server.
+The database is a local MySQL-compatible instance, as in components.py.
+
+Synthetic traffic, stepping the arrival rate to find saturation:
+
+    python benchmarks/traffic_replay.py --db-url mysql://root@127.0.0.1:4000/test --rates 2 5 10 20 --duration 30
+
+Replay of recorded traffic (JSONL, see --export) at 4x speed:
+
+    python benchmarks/traffic_replay.py --export 123456789 --limit 2000 > traffic.jsonl
+    python benchmarks/traffic_replay.py --replay traffic.jsonl --speed 4
+
+Each record is {"offset": seconds, "guild_id", "channel_id", "author", "content",
+"attachments": [{"filename", "size"}]}; channels are remapped to throwaway
+bench channels, which are deleted afterwards.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from aiohttp import web
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import fixtures
+import dbhelpers
+from components import latency_stats, git_commit
+
+ids = itertools.count(int(time.time() * 1000) << 22)
+
+
+class FakeUser:
+
+    def __init__(self, name):
+        self.id = next(ids)
+        self.name = name
+        self.bot = False
+
+    def __str__(self):
+        return self.name
+
+
+class FakeAttachment:
+
+    def __init__(self, filename, size, url):
+        self.id = next(ids)
+        self.filename = filename
+        self.content_type = None
+        self.size = size
+        self.url = url
+        self.proxy_url = url
+
+
+class FakeMessage:
+
+    def __init__(self, channel, author, content, attachments=None):
+        self.id = next(ids)
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.created_at = datetime.now(timezone.utc)
+        self.edited_at = None
+        self.type = SimpleNamespace(value=0)
+        self.embeds = []
+        self.attachments = attachments or []
+        self.mentions = []
+        self.reference = None
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+        self.edited_at = datetime.now(timezone.utc)
+        self.channel.edits += 1
+        return self
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+
+    def __init__(self, channel_id, guild, bot_user):
+        self.id = channel_id
+        self.guild = guild
+        self.bot_user = bot_user
+        self.sent = []
+        self.edits = 0
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(self, self.bot_user, content)
+        self.sent.append(message)
+        return message
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Stub server did not start on port {port}")
+
+
+def synthetic_traffic(rate, duration, args, rng):
+    """Poisson arrivals of chat, /bot and attachment messages"""
+    records = []
+    offset = rng.expovariate(rate)
+    while offset < duration:
+        channel = rng.randrange(args.channels)
+        record = {
+            "offset": offset,
+            "guild_id": f"g{channel % args.guilds}",
+            "channel_id": f"c{channel}",
+            "author": f"user{rng.randrange(50)}",
+            "content": fixtures.sentence(rng),
+            "attachments": []
+        }
+        roll = rng.random()
+        if roll < args.bot_fraction:
+            record["content"] = "/bot " + record["content"]
+        elif roll < args.bot_fraction + args.attachment_fraction:
+            kind = rng.choice(["txt", "pdf"])
+            record["attachments"] = [{"filename": f"upload.{kind}", "size": rng.choice(args.attachment_sizes)}]
+        records.append(record)
+        offset += rng.expovariate(rate)
+    return records
+
+
+def load_traffic(path, speed):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        record["offset"] = record["offset"] / speed
+    return records
+
+
+def export_traffic(channel_id, limit):
+    """Print recorded messages of a channel as replay records"""
+    from storage import db_manager
+    rows = dbhelpers.recorded_messages(db_manager, channel_id, limit)
+    if not rows:
+        return
+    start = rows[0]["timestamp"]
+    for row in rows:
+        attachments = json.loads(row["attachments"]) if row["attachments"] else []
+        print(json.dumps({
+            "offset": (row["timestamp"] - start).total_seconds(),
+            "guild_id": row["guild_id"],
+            "channel_id": channel_id,
+            "author": row["author"],
+            "content": row["content"] or "",
+            # Recorded sizes are unknown; use a mid-sized fixture
+            "attachments": [{"filename": a["filename"], "size": 50_000} for a in attachments]
+        }))
+
+
+class Harness:
+
+    def __init__(self, args, run_id, files_url, documents):
+        import main
+        self.main = main
+        self.args = args
+        self.prefix = f"rp{run_id[-6:]}-"
+        self.files_url = files_url
+        self.documents = documents
+        self.bot_user = FakeUser("Jarvis")
+        self.guilds = {}
+        self.channels = {}
+        self.messages_with_attachments = []
+
+    def channel(self, guild_id, channel_id):
+        # Recorded ids are replaced by short bench ids that fit the schema's id columns
+        key = (guild_id, channel_id)
+        if key not in self.channels:
+            if guild_id not in self.guilds:
+                self.guilds[guild_id] = SimpleNamespace(id=f"{self.prefix}g{len(self.guilds)}")
+            self.channels[key] = FakeChannel(f"{self.prefix}{len(self.channels)}", self.guilds[guild_id], self.bot_user)
+        return self.channels[key]
+
+    def build_message(self, record):
+        channel = self.channel(record.get("guild_id"), record["channel_id"])
+        attachments = []
+        for item in record.get("attachments") or []:
+            kind = os.path.splitext(item["filename"])[1].lstrip(".").lower()
+            # Serve the fixture closest in type and size to the recorded upload
+            _, chars, path = min(self.documents, key=lambda entry: (entry[0] != kind, abs(entry[1] - item["size"])))
+            attachments.append(FakeAttachment(item["filename"], chars, f"{self.files_url}/{os.path.basename(path)}"))
+        message = FakeMessage(channel, FakeUser(record.get("author") or "user"), record.get("content") or "", attachments)
+        if attachments:
+            self.messages_with_attachments.append(message)
+        return message
+
+    async def deliver(self, message, results):
+        start = time.monotonic()
+        is_question = message.content.startswith('/bot')
+        sent_before = len(message.channel.sent)
+        try:
+            await self.main.on_message(message)
+        except Exception as e:
+            results["errors"] += 1
+            print(f"on_message failed: {e!r}")
+            return
+        elapsed = time.monotonic() - start
+        results["handled"] += 1
+        if not is_question:
+            results["ingest_latency"].append(elapsed)
+        elif any(sent.content == self.main.BUSY_REPLY for sent in message.channel.sent[sent_before:]):
+            results["busy"] += 1
+        else:
+            results["reply_latency"].append(elapsed)
+
+    def ingest_tasks(self):
+        return [task for task in asyncio.all_tasks() if task.get_coro().__qualname__ == "ingest_attachments"]
+
+    async def monitor(self, samples, stop):
+        """Sample event-loop lag and queue depths until stopped"""
+        interval = self.args.lag_interval
+        scheduler = self.main.scheduler
+        while not stop.is_set():
+            start = time.monotonic()
+            await asyncio.sleep(interval)
+            samples["loop_lag"].append(max(0.0, time.monotonic() - start - interval))
+            samples["interactive_queue"].append(scheduler.depth[self.main.INTERACTIVE])
+            samples["background_queue"].append(scheduler.depth[self.main.BACKGROUND])
+            samples["ingest_tasks"].append(len(self.ingest_tasks()))
+
+    async def run_step(self, records, label):
+        results = {"handled": 0, "errors": 0, "busy": 0, "reply_latency": [], "ingest_latency": []}
+        samples = {"loop_lag": [], "interactive_queue": [], "background_queue": [], "ingest_tasks": []}
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self.monitor(samples, stop))
+
+        start = time.monotonic()
+        deliveries = []
+        for record in records:
+            delay = start + record["offset"] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            deliveries.append(asyncio.create_task(self.deliver(self.build_message(record), results)))
+        offered_seconds = max(time.monotonic() - start, 1e-9)
+
+        await asyncio.gather(*deliveries)
+        handled_seconds = time.monotonic() - start
+        pending = self.ingest_tasks()
+        if pending:
+            await asyncio.wait(pending, timeout=self.args.drain_timeout)
+        drained_seconds = time.monotonic() - start
+        stop.set()
+        await monitor
+
+        questions = sum(1 for record in records if record["content"].startswith('/bot'))
+        report = {
+            "label": label,
+            "messages": len(records),
+            "questions": questions,
+            "offered_messages_per_second": len(records) / offered_seconds,
+            "offered_questions_per_second": questions / offered_seconds,
+            "handled_messages_per_second": results["handled"] / handled_seconds,
+            "replies_per_second": len(results["reply_latency"]) / handled_seconds,
+            "busy_replies": results["busy"],
+            "errors": results["errors"],
+            "reply_latency": latency_stats(results["reply_latency"]) if results["reply_latency"] else None,
+            "ingest_latency": latency_stats(results["ingest_latency"]) if results["ingest_latency"] else None,
+            "loop_lag": latency_stats(samples["loop_lag"]) if samples["loop_lag"] else None,
+            "max_interactive_queue": max(samples["interactive_queue"], default=0),
+            "max_background_queue": max(samples["background_queue"], default=0),
+            "max_ingest_tasks": max(samples["ingest_tasks"], default=0),
+            "ingest_drain_seconds": drained_seconds - handled_seconds,
+            "undrained_ingest_tasks": len([task for task in pending if not task.done()])
+        }
+        print(json.dumps(report, indent=2))
+        return report
+
+    async def cleanup(self):
+        from storage import db_manager
+        from vectors import vector_manager
+        for task in self.ingest_tasks():
+            task.cancel()
+        for message in self.messages_with_attachments:
+            await asyncio.to_thread(vector_manager.delete_document_chunks, str(message.id))
+        for channel in self.channels.values():
+            await asyncio.to_thread(dbhelpers.delete_channel_data, db_manager, channel.id)
+
+
+async def start_file_server(directory, port):
+    app = web.Application()
+    app.router.add_static("/files", directory)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def saturation_point(steps):
+    """First step whose replies fall behind the offered /bot rate or get rejected"""
+    for step in steps:
+        if step["busy_replies"] or step["replies_per_second"] < 0.9 * step["offered_questions_per_second"]:
+            return step["label"]
+    return None
+
+
+async def run(args):
+    from fake_openai import start_server
+
+    llm = await start_server(port=args.llm_port, latency=args.llm_latency, jitter=args.llm_jitter,
+                             token_latency=args.token_latency, tool_call_rate=args.tool_call_rate)
+    pplx = await start_server(port=args.pplx_port, latency=args.pplx_latency, jitter=args.pplx_jitter)
+    mcp_server = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_mcp.py"),
+        "--port", str(args.mcp_port), "--latency", str(args.tool_latency), "--jitter", str(args.tool_jitter),
+        "--pplx-url", f"http://127.0.0.1:{args.pplx_port}/chat/completions"
+    ])
+    directory = tempfile.TemporaryDirectory()
+    files = await start_file_server(directory.name, args.files_port)
+
+    run_id = str(int(time.time()))
+    harness = None
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "export")},
+        "steps": []
+    }
+    try:
+        documents = await asyncio.to_thread(fixtures.build_documents, directory.name, args.attachment_sizes)
+        await asyncio.to_thread(wait_for_port, args.mcp_port)
+        harness = Harness(args, run_id, f"http://127.0.0.1:{args.files_port}/files", documents)
+        # Bot commands are not under test; skip discord.py's command parsing
+        harness.main.bot.process_commands = lambda message: asyncio.sleep(0)
+
+        rng = random.Random(args.seed)
+        if args.replay:
+            report["steps"].append(await harness.run_step(load_traffic(args.replay, args.speed), f"replay x{args.speed}"))
+        else:
+            for rate in args.rates:
+                records = synthetic_traffic(rate, args.duration, args, rng)
+                report["steps"].append(await harness.run_step(records, f"{rate}/s"))
+        report["saturated_at"] = saturation_point(report["steps"])
+        print(f"Saturated at: {report['saturated_at'] or 'not reached'}")
+    finally:
+        if harness is not None:
+            await harness.cleanup()
+            from llm import llmManager
+            await llmManager.close()
+        await files.cleanup()
+        directory.cleanup()
+        mcp_server.terminate()
+        mcp_server.wait()
+        await pplx.cleanup()
+        await llm.cleanup()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"wrote {args.output}")
+
+
+def configure(args):
+    """Point the bot at the stubs; must run before main/llm/tidb are imported"""
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    if args.db_url:
+        os.environ['TIDB_CONNECTION_URL'] = args.db_url
+    if args.sqlite:
+        os.environ['STORAGE_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = args.sqlite
+    os.environ['API_BASE_URL'] = f"http://127.0.0.1:{args.llm_port}"
+    os.environ.pop('LLM_ENDPOINTS', None)
+    os.environ['TOOL_TRANSPORT'] = 'mcp'
+    os.environ['MCP_HOST'] = '127.0.0.1'
+    os.environ['MCP_PORT'] = str(args.mcp_port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="on_message traffic replay load test")
+    parser.add_argument("--db-url", default=os.getenv('BENCH_TIDB_URL'))
+    parser.add_argument("--sqlite", metavar="PATH", help="Use the embedded SQLite backend instead of TiDB")
+    parser.add_argument("--replay", help="JSONL traffic file to replay instead of synthetic traffic")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up factor")
+    parser.add_argument("--export", metavar="CHANNEL_ID", help="Print a channel's recorded messages as JSONL and exit")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--rates", type=float, nargs="+", default=[2, 5, 10, 20], help="Messages per second per step")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per step")
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--guilds", type=int, default=4)
+    parser.add_argument("--bot-fraction", type=float, default=0.2)
+    parser.add_argument("--attachment-fraction", type=float, default=0.02)
+    parser.add_argument("--attachment-sizes", type=int, nargs="+", default=[20_000, 200_000])
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--llm-jitter", type=float, default=0.4)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--tool-call-rate", type=float, default=0.5)
+    parser.add_argument("--tool-latency", type=float, default=0.15)
+    parser.add_argument("--tool-jitter", type=float, default=0.1)
+    parser.add_argument("--pplx-latency", type=float, default=1.5)
+    parser.add_argument("--pplx-jitter", type=float, default=1.0)
+    parser.add_argument("--llm-port", type=int, default=8091)
+    parser.add_argument("--pplx-port", type=int, default=8092)
+    parser.add_argument("--mcp-port", type=int, default=8093)
+    parser.add_argument("--files-port", type=int, default=8094)
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--lag-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    configure(args)
+    if args.export:
+        export_traffic(args.export, args.limit)
+    else:
+        asyncio.run(run(args))
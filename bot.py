@@ -1,16 +1,17 @@
-from tidb import db_manager
+from storage import db_manager
 import json
 import asyncio
 from filehandler import file_handler
 from vectors import vector_manager
+from answercache import answer_cache
 
 class BotMessage:
 
     def __init_(self):
         return 
     
-    async def store_message(self,message):
-        """Store Discord message in database"""
+    async def store_message(self,message, read_back=True):
+        """Store Discord message in database (see add_message for read_back)"""
         message_data = {
             'message_id': str(message.id),
             'channel_id': str(message.channel.id),
@@ -26,7 +27,7 @@ class BotMessage:
             'referenced_message_id': str(message.reference.message_id) if message.reference else None
         }
         
-        db_manager.add_message(message_data)
+        db_manager.add_message(message_data, read_back=read_back)
 
     async def store_bot_message(self,bot_message, referenced_message_id):
         """Store bot response in database"""
@@ -84,12 +85,15 @@ class BotMessage:
                 
                 if text_content:
                     # Store document chunks in vector database
-                    success = vector_manager.store_document_chunks(text_content, attachment_data)
+                    # Chunking and embedding are CPU-bound; keep them off the event loop
+                    success = await asyncio.to_thread(vector_manager.store_document_chunks, text_content, attachment_data)
                     
                     if success:
                         # Store attachment metadata in database
                         attachment_data['text_content'] = None  # Don't store raw text in DB
                         db_manager.add_attachment(attachment_data)
+                        # Cached answers may no longer reflect the document set
+                        await answer_cache.invalidate_documents(attachment_data['guild_id'], attachment_data['channel_id'])
                         print(f"Successfully processed attachment: {attachment.filename}")
                     else:
                         print(f"Failed to store chunks for: {attachment.filename}")
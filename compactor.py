@@ -0,0 +1,151 @@
+import os
+import json
+from typing import List, Dict, Any, Optional
+from packer import context_packer
+
+DEFAULT_TOOL_BUDGETS = {
+    "get_context": 1500,
+    "get_context_multi": 2500,
+    "search_chats": 800,
+    "web_search": 1200
+}
+
+# Overlaps shorter than this are more likely coincidence than splitter overlap
+MIN_OVERLAP = 20
+
+
+class ContextCompactor:
+
+    def __init__(self):
+        """Shrink tool results before they are serialized into the prompt"""
+        self.budgets = {**DEFAULT_TOOL_BUDGETS, **json.loads(os.getenv('TOOL_TOKEN_BUDGETS', "{}"))}
+        self.max_overlap = int(os.getenv('CHUNK_OVERLAP', "200")) * 2
+
+    def budget_for(self, tool_name: str) -> int:
+        return self.budgets.get(tool_name, 1500)
+
+    def strip_overlap(self, previous: str, following: str) -> str:
+        """Remove the prefix of following that repeats the end of previous"""
+        limit = min(len(previous), len(following), self.max_overlap)
+        for size in range(limit, MIN_OVERLAP - 1, -1):
+            if previous.endswith(following[:size]):
+                return following[size:]
+        return following
+
+    def _group_key(self, metadata: Dict[str, Any]):
+        if metadata.get("source_type") == "web":
+            return ("web", metadata.get("query_key"))
+        return ("doc", metadata.get("attachment_id") or metadata.get("message_id"))
+
+    def _citation(self, metadata: Dict[str, Any], first_index: int, last_index: int, score: float) -> Dict[str, Any]:
+        """Keep only what the model needs to cite a passage"""
+        if metadata.get("source_type") == "web":
+            citation = {
+                "source": "web",
+                "query": metadata.get("query"),
+                "sources": metadata.get("sources", []),
+                "fetched_at": metadata.get("fetched_at")
+            }
+        else:
+            timestamp = metadata.get("timestamp")
+            citation = {
+                "source": metadata.get("filename"),
+                "author": metadata.get("author"),
+                "date": timestamp[:10] if timestamp else None
+            }
+        citation["part"] = str(first_index) if first_index == last_index else f"{first_index}-{last_index}"
+        citation["relevance"] = round(1 - score, 3) if score is not None else None
+        return citation
+
+    def compact_chunks(self, chunks: List[Dict[str, Any]], tool_name: str = "get_context",
+                       token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Merge adjacent chunks of the same document, strip splitter overlap,
+        reduce metadata to citations and fit the result into a token budget
+        
+        Args:
+            chunks: Results from the vector store (content, metadata, similarity_score)
+            tool_name: Tool whose budget applies
+            token_budget: Overrides the configured budget
+            
+        Returns:
+            Compact passages, most relevant first
+        """
+        budget = token_budget or self.budget_for(tool_name)
+        
+        groups = {}
+        for chunk in chunks:
+            metadata = chunk.get("metadata") or {}
+            groups.setdefault(self._group_key(metadata), []).append(chunk)
+        
+        passages = []
+        for group in groups.values():
+            group.sort(key=lambda chunk: chunk["metadata"].get("chunk_index", 0))
+            run = [group[0]]
+            for chunk in group[1:]:
+                if chunk["metadata"].get("chunk_index", 0) == run[-1]["metadata"].get("chunk_index", 0) + 1:
+                    run.append(chunk)
+                else:
+                    passages.append(self._merge(run))
+                    run = [chunk]
+            passages.append(self._merge(run))
+        
+        passages.sort(key=lambda passage: -(passage["relevance"] or 0))
+        
+        compacted = []
+        remaining = budget
+        for passage in passages:
+            overhead = context_packer.count_tokens(json.dumps({k: v for k, v in passage.items() if k != "content"}))
+            available = remaining - overhead
+            if available <= MIN_OVERLAP:
+                break
+            passage["content"] = context_packer.truncate(passage["content"], available)
+            remaining -= overhead + context_packer.count_tokens(passage["content"])
+            compacted.append(passage)
+        
+        return compacted
+
+    def _merge(self, run: List[Dict[str, Any]]) -> Dict[str, Any]:
+        content = run[0]["content"]
+        for previous, chunk in zip(run, run[1:]):
+            following = self.strip_overlap(previous["content"], chunk["content"])
+            # Without a shared overlap the chunks only touch; keep their boundary words apart
+            content += following if len(following) < len(chunk["content"]) else "\n" + following
+        
+        best = min(run, key=lambda chunk: chunk["similarity_score"])
+        best_score = best["similarity_score"]
+        metadata = run[0]["metadata"]
+        passage = self._citation(
+            metadata,
+            metadata.get("chunk_index", 0),
+            run[-1]["metadata"].get("chunk_index", 0),
+            best_score
+        )
+        # get_context_multi tags each chunk with the query that found it
+        if "query" in best:
+            passage["query"] = best["query"]
+        passage["content"] = content
+        return passage
+
+    def compact_texts(self, texts: List[str], tool_name: str) -> List[str]:
+        """Keep whole texts in order until the tool's budget is used"""
+        remaining = self.budget_for(tool_name)
+        kept = []
+        for text in texts:
+            text = context_packer.truncate(text, min(remaining, context_packer.max_message_tokens))
+            cost = context_packer.count_tokens(text)
+            if not text:
+                continue
+            if cost > remaining:
+                break
+            kept.append(text)
+            remaining -= cost
+        return kept
+
+    def compact_text(self, text: str, tool_name: str) -> str:
+        """Truncate a single text result to the tool's budget"""
+        return context_packer.truncate(text, self.budget_for(tool_name))
+
+
+# Global instance
+context_compactor = ContextCompactor()
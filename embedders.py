@@ -1,21 +1,24 @@
 from sentence_transformers import SentenceTransformer
+from dotenv import load_dotenv
 import logging
+import os
 from typing import List
 import numpy as np
 
+load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class EmbeddingManager:
     
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = None):
         """
         Initialize embedding model from Hugging Face
         
         Args:
-            model_name: Hugging Face model name for embeddings
+            model_name: Hugging Face model name for embeddings (defaults to EMBEDDING_MODEL)
         """
-        self.model_name = model_name
+        self.model_name = model_name or os.getenv('EMBEDDING_MODEL', "sentence-transformers/all-MiniLM-L6-v2")
         self.model = None
         self.embedding_dimension = None
         self._load_model()
@@ -185,7 +185,7 @@ class FileHandler:
         
         try:
             # Extract text
-            text_content = self.extract_text(temp_file_path, filename)
+            text_content = await asyncio.to_thread(self.extract_text, temp_file_path, filename)
             if text_content:
                 # Clean up the text (remove excessive whitespace)
                 text_content = '\n'.join(line.strip() for line in text_content.splitlines() if line.strip())
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import time
+import logging
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from dotenv import load_dotenv
+from metrics import metrics
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHAT = "chat"
+DOCUMENTS = "documents"
+WEB = "web"
+FALLBACK = "fallback"
+
+# Tool pre-run for each intent, called with {"query": question}
+INTENT_TOOLS = {DOCUMENTS: "get_context", WEB: "web_search"}
+
+# Seed examples; INTENT_EXAMPLES points to a JSONL file of {"text", "intent"} to replace them
+DEFAULT_EXAMPLES = [
+    ("hi", CHAT),
+    ("hello jarvis", CHAT),
+    ("hey, how are you?", CHAT),
+    ("good morning everyone", CHAT),
+    ("thanks, that helped a lot", CHAT),
+    ("thank you!", CHAT),
+    ("lol that's funny", CHAT),
+    ("who are you?", CHAT),
+    ("what can you do?", CHAT),
+    ("tell me a joke", CHAT),
+    ("ok cool", CHAT),
+    ("bye, see you tomorrow", CHAT),
+    ("what does the uploaded document say about pricing?", DOCUMENTS),
+    ("summarize the pdf I shared", DOCUMENTS),
+    ("according to the file, what is the deadline?", DOCUMENTS),
+    ("what are the main points of the report?", DOCUMENTS),
+    ("find the section about refunds in the attachment", DOCUMENTS),
+    ("what does the contract say about termination?", DOCUMENTS),
+    ("in the docx I sent, who is the project owner?", DOCUMENTS),
+    ("list the requirements from the spec document", DOCUMENTS),
+    ("what did the paper conclude?", DOCUMENTS),
+    ("based on the notes I uploaded, what should I study first?", DOCUMENTS),
+    ("what's the latest news about the election?", WEB),
+    ("what is the weather in London today?", WEB),
+    ("current price of bitcoin", WEB),
+    ("who won the match last night?", WEB),
+    ("what's new in the latest python release?", WEB),
+    ("search the web for cheap flights to Tokyo", WEB),
+    ("what happened in the stock market this week?", WEB),
+    ("is the service down right now?", WEB),
+    ("what are today's top headlines?", WEB),
+    ("when is the next iphone launch?", WEB),
+]
+
+
+class IntentRouter:
+
+    def __init__(self, examples: Optional[List[Tuple[str, str]]] = None, embed: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        """
+        Route a /bot question before any LLM call by weighted k-nearest-neighbour
+        vote over embedded labelled examples. Confident "chat" answers without
+        tools; confident "documents"/"web" pre-run the matching tool so the model
+        can answer in one round; anything else keeps the normal tool loop.
+
+        Args:
+            examples: (text, intent) pairs (defaults to INTENT_EXAMPLES or the built-in set)
+            embed: Batch embedding function (defaults to the shared embedding model)
+        """
+        self.enabled = os.getenv('INTENT_ROUTING', 'false').lower() == 'true'
+        self.k = int(os.getenv('INTENT_K', "5"))
+        self.min_similarity = float(os.getenv('INTENT_MIN_SIMILARITY', "0.6"))
+        self.min_confidence = float(os.getenv('INTENT_MIN_CONFIDENCE', "0.7"))
+        self.examples = examples if examples is not None else self.load_examples(os.getenv('INTENT_EXAMPLES'))
+        self._embed = embed
+        self.labels = None
+        self.matrix = None
+
+    @staticmethod
+    def load_examples(path: Optional[str]) -> List[Tuple[str, str]]:
+        """Read (text, intent) pairs from a JSONL file, or return the built-in examples"""
+        if not path:
+            return list(DEFAULT_EXAMPLES)
+        with open(path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [(row["text"], row["intent"]) for row in rows]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed and L2-normalize texts"""
+        if self._embed is None:
+            from embedders import embedding_manager
+            self._embed = embedding_manager.get_embeddings
+        vectors = np.asarray(self._embed(texts), dtype=np.float32)
+        return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+    def _load(self):
+        if self.matrix is None:
+            self.labels = [intent for _, intent in self.examples]
+            self.matrix = self.embed([text for text, _ in self.examples])
+            logger.info(f"Intent router loaded {len(self.labels)} examples")
+
+    def classify_embedding(self, embedding: np.ndarray) -> Tuple[str, float]:
+        """
+        Vote over the k most similar examples
+
+        Args:
+            embedding: Normalized question embedding
+
+        Returns:
+            Tuple of (intent, confidence); FALLBACK when too far from every example or the vote is split
+        """
+        self._load()
+        similarities = self.matrix @ embedding
+        nearest = np.argsort(-similarities)[:self.k]
+        if similarities[nearest[0]] < self.min_similarity:
+            return FALLBACK, 0.0
+
+        votes = {}
+        for i in nearest:
+            votes[self.labels[i]] = votes.get(self.labels[i], 0.0) + max(float(similarities[i]), 0.0)
+        intent = max(votes, key=votes.get)
+        confidence = votes[intent] / (sum(votes.values()) or 1.0)
+        if confidence < self.min_confidence:
+            return FALLBACK, confidence
+        return intent, confidence
+
+    def classify(self, question: str) -> Tuple[str, float]:
+        """Classify a question (blocking: runs the embedding model)"""
+        return self.classify_embedding(self.embed([question])[0])
+
+    async def route(self, question: str) -> str:
+        """
+        Pick the intent for a question off the event loop
+
+        Returns:
+            One of CHAT, DOCUMENTS, WEB or FALLBACK (always FALLBACK when disabled)
+        """
+        if not self.enabled or not question:
+            return FALLBACK
+        started = time.monotonic()
+        try:
+            intent, confidence = await asyncio.to_thread(self.classify, question)
+        except Exception as e:
+            print(f"Intent routing failed, using the tool loop: {e}")
+            return FALLBACK
+        metrics.observe("intent_route_seconds", time.monotonic() - started)
+        metrics.inc("intent_route_total", intent=intent)
+        print(f"Routed question as {intent} ({confidence:.2f})")
+        return intent
+
+    @staticmethod
+    def tool_call_for(intent: str, question: str, tools: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Tool call to pre-run for the intent, if it has one and the tool is available"""
+        name = INTENT_TOOLS.get(intent)
+        if not name or not any(tool["function"]["name"] == name for tool in tools):
+            return None
+        return {
+            "id": f"call_routed_{name}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps({"query": question})}
+        }
+
+
+# Global instance
+intent_router = IntentRouter()
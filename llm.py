@@ -1,97 +1,191 @@
-from tidb import db_manager
-import requests
+from storage import db_manager
+import aiohttp
+import asyncio
 import os
 import json
+import time
 from dotenv import load_dotenv
-from llmclient import client
-from datetime import date
+from llmclient import mcp_session
+from metrics import metrics, TOKEN_BUCKETS, COUNT_BUCKETS
+from packer import context_packer
+from prompts import prompt_builder
+from answercache import answer_cache
+from llmrouter import llm_router, RequestRejected
+from tracing import tracer
+from sharedstate import shared_state
+from prefetch import context_prefetcher
+from intents import intent_router, CHAT
 
 load_dotenv()
 
-today = date.today()
 class LLMManager:
 
     def __init__(self):
-        self.API_BASE_URL = os.getenv('API_BASE_URL', 'https://api.openai.com/v1')
-        self.API_KEY = os.getenv('OPENAI_API_KEY')
+        self.router = llm_router
+        self.request_timeout = float(os.getenv('LLM_TIMEOUT', "60"))
+        self.max_retries = int(os.getenv('LLM_MAX_RETRIES', "3"))
+        self.pool_size = int(os.getenv('LLM_POOL_SIZE', "100"))
+        self.session = None
+        self._tool_schema = None
+        self._tool_schema_version = None
+        self._traced_tools = set()
+        self.tool_timeout = float(os.getenv('TOOL_TIMEOUT', "30"))
+        self.tool_timeouts = json.loads(os.getenv('TOOL_TIMEOUTS', "{}"))
+        self.tool_semaphore = asyncio.Semaphore(int(os.getenv('TOOL_CONCURRENCY', "8")))
+        self.history_fetch_limit = int(os.getenv('HISTORY_FETCH_LIMIT', "50"))
+        self.stream_usage = os.getenv('LLM_STREAM_USAGE', 'true').lower() == 'true'
         return 
+
+    async def get_session(self):
+        """Return the shared HTTP session, creating it on first use"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=60,
+                enable_cleanup_closed=True
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def _retry_delay(self, response, attempt):
+        """Seconds to wait before retrying, honouring Retry-After (capped at the request timeout) when present"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                # A long Retry-After would hold the reply and its global LLM slot for that long
+                return min(max(0.0, float(retry_after)), self.request_timeout)
+            except ValueError:
+                pass
+        return min(2 ** attempt, 30)
     
     async def get_tools(self):
-        """Get available tools using FastMCP client"""
+        """Get available tools as OpenAI function schemas, cached per MCP tool list version"""
         try:
-            async with client:
-                tools_response = await client.list_tools()
-                available_functions = []
-                
-                for tool in tools_response:
-                    func = {
-                        "type": "function",
-                        "function": {
-                            "name": tool.name,
-                            "description": tool.description,
-                            "parameters": {
-                                "type": "object",
-                                "properties": tool.inputSchema.get("properties", {}),
-                                "required": tool.inputSchema.get("required", []),
-                            },
+            tools_response = await mcp_session.list_tools()
+            if self._tool_schema is not None and self._tool_schema_version == mcp_session.tools_version:
+                return self._tool_schema
+            
+            available_functions = []
+            traced_tools = set()
+            
+            for tool in tools_response:
+                properties = dict(tool.inputSchema.get("properties", {}))
+                # Trace context is filled in by the bot, not by the model
+                if properties.pop("traceparent", None) is not None:
+                    traced_tools.add(tool.name)
+                func = {
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": tool.description,
+                        "parameters": {
+                            "type": "object",
+                            "properties": properties,
+                            "required": [name for name in tool.inputSchema.get("required", []) if name != "traceparent"],
                         },
-                    }
-                    available_functions.append(func)
-                
-                return available_functions
+                    },
+                }
+                available_functions.append(func)
+            
+            self._traced_tools = traced_tools
+            
+            # Stable order and key layout keep the tool block of the prompt cacheable
+            self._tool_schema = prompt_builder.canonical_tools(available_functions)
+            self._tool_schema_version = mcp_session.tools_version
+            return self._tool_schema
         except Exception as e:
             print(f"Error getting tools: {str(e)}")
             return []
 
-    async def handle_tool_calls(self, tool_calls):
-        """Handle tool calls using FastMCP client"""
-        tool_responses = []
+    def _tool_result_text(self, tool_result):
+        """Flatten a FastMCP tool result into the text sent back to the model"""
+        result_text = ""
+        
+        if hasattr(tool_result, 'content') and tool_result.content:
+            for content in tool_result.content:
+                if hasattr(content, 'text'):
+                    result_text += content.text
+        elif hasattr(tool_result, 'structured_content') and tool_result.structured_content:
+            result_text = json.dumps(tool_result.structured_content)
+        else:
+            result_text = "No result"
+        
+        return result_text
+
+    async def _invoke_tool(self, function_name, function_args):
+        """Call a tool over the MCP session and return its result text"""
+        timeout = self.tool_timeouts.get(function_name, self.tool_timeout)
+        with tracer.span("tool_call", tool=function_name):
+            if function_name in self._traced_tools:
+                function_args = {**function_args, "traceparent": tracer.traceparent()}
+            async with self.tool_semaphore:
+                tool_result = await asyncio.wait_for(mcp_session.call_tool(function_name, function_args), timeout)
+        return self._tool_result_text(tool_result)
+
+    async def _call_tool(self, tool_call, prefetch=None, from_model=True):
+        """Run a single tool call, turning timeouts and errors into a tool message"""
+        function_name = tool_call["function"]["name"]
+        timeout = self.tool_timeouts.get(function_name, self.tool_timeout)
         
         try:
-            async with client:
-                for tool_call in tool_calls:
-                    function_name = tool_call["function"]["name"]
-                    function_args = json.loads(tool_call["function"]["arguments"]) if isinstance(tool_call["function"]["arguments"], str) else tool_call["function"]["arguments"]
-                    
-                    print(f"Calling tool: {function_name} with args: {function_args}")
-                    
-                    # Call tool using FastMCP client
-                    tool_result = await client.call_tool(name=function_name, arguments=function_args)
-                    
-                    result_text = ""
-                    
-                    if hasattr(tool_result, 'content') and tool_result.content:
-                        for content in tool_result.content:
-                            if hasattr(content, 'text'):
-                                result_text += content.text
-                    elif hasattr(tool_result, 'structured_content') and tool_result.structured_content:
-                        result_text = json.dumps(tool_result.structured_content)
-                    else:
-                        result_text = "No result"
-                    
-                    tool_responses.append({
-                        "tool_call_id": tool_call["id"],
-                        "role": "tool",
-                        "name": function_name,
-                        "content": result_text
-                    })
+            function_args = json.loads(tool_call["function"]["arguments"]) if isinstance(tool_call["function"]["arguments"], str) else tool_call["function"]["arguments"]
             
-            return tool_responses
+            if from_model:
+                context_prefetcher.observe_call(function_name, function_args)
+            result_text = None
+            if prefetch is not None and prefetch.matches(function_name, function_args, context_prefetcher.threshold):
+                print(f"Using prefetched {function_name} for args: {function_args}")
+                try:
+                    result_text = await prefetch.claim()
+                except Exception as e:
+                    print(f"Prefetched {function_name} failed ({e!r}), calling it directly")
+            if result_text is None:
+                print(f"Calling tool: {function_name} with args: {function_args}")
+                result_text = await self._invoke_tool(function_name, function_args)
+        except asyncio.TimeoutError:
+            print(f"Tool {function_name} timed out after {timeout}s")
+            result_text = f"Error: tool {function_name} timed out after {timeout} seconds"
         except Exception as e:
-            print(f"Error handling tool calls: {str(e)}")
-            return []
+            print(f"Error calling tool {function_name}: {str(e)}")
+            result_text = f"Error: tool {function_name} failed: {str(e)}"
+        
+        return {
+            "tool_call_id": tool_call["id"],
+            "role": "tool",
+            "name": function_name,
+            "content": result_text
+        }
+
+    async def handle_tool_calls(self, tool_calls, prefetch=None, from_model=True):
+        """
+        Run tool calls concurrently over the shared FastMCP session, keeping their order.
+        A matching call is answered from the speculative prefetch, if one is given.
+        Only calls the model made (from_model) teach the prefetcher which filters it uses.
+        """
+        try:
+            return list(await asyncio.gather(*[self._call_tool(tool_call, prefetch, from_model) for tool_call in tool_calls]))
+        finally:
+            if prefetch is not None:
+                called = any(tool_call["function"]["name"] == prefetch.tool_name for tool_call in tool_calls)
+                prefetch.discard("miss" if called else "unused")
 
-    def make_chat_completion_request(self, messages, tools=None, tool_choice="auto"):
-        """Make a direct API request to chat completions endpoint with detailed logging"""
-        url = f"{self.API_BASE_URL}/chat/completions"
+    def _build_request(self, endpoint, messages, tools=None, tool_choice="auto", stream=False):
+        """Build url, headers and payload for a chat completions call to an endpoint"""
+        url = f"{endpoint.base_url}/chat/completions"
         
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.API_KEY}" if self.API_KEY and self.API_KEY.strip() else "Bearer dummy"
+            "Authorization": f"Bearer {endpoint.api_key}" if endpoint.api_key and endpoint.api_key.strip() else "Bearer dummy"
         }
         
         payload = {
-            "model": os.getenv('LLM_MODEL', 'gpt-4o'),
+            "model": endpoint.model,
             "messages": messages,
             "temperature": float(os.getenv('TEMPERATURE', "0.7")),
             "max_tokens": int(os.getenv('MAX_TOKENS', "1500"))
@@ -101,109 +195,335 @@ class LLMManager:
             payload["tools"] = tools
             payload["tool_choice"] = tool_choice
         
-        try:
-            response = requests.post(
-                url, 
-                headers=headers, 
-                data=json.dumps(payload), 
-                timeout=60
-            )
+        if stream:
+            payload["stream"] = True
+            if self.stream_usage:
+                # Ask for the usage block (with cached token counts) in the final chunk
+                payload["stream_options"] = {"include_usage": True}
+        
+        return url, headers, payload
+
+    def _attempts(self):
+        """Retry on the same endpoint only when there is nowhere else to fail over to"""
+        return self.max_retries + 1 if len(self.router.endpoints) == 1 else 1
+
+    @staticmethod
+    def _raise_for_status(endpoint, response, detail=None):
+        """Raise RequestRejected for a rejected request (4xx other than 429), ClientResponseError for other errors"""
+        if 400 <= response.status < 500 and response.status != 429:
+            print(f"API request to {endpoint.name} rejected with {response.status}: {str(detail)[:500]}")
+            raise RequestRejected(f"API request rejected with {response.status}: {str(detail)[:500]}")
+        response.raise_for_status()
+
+    async def _send(self, endpoint, url, headers, payload, request_timeout, stream=False):
+        """
+        POST to one endpoint over the pooled session, retrying connection errors and
+        retryable statuses until something has been yielded
+        
+        Yields:
+            The decoded JSON response, or each parsed SSE chunk when streaming
+        """
+        session = await self.get_session()
+        attempts = self._attempts()
+        yielded = False
+        
+        for attempt in range(attempts):
+            try:
+                async with shared_state.limit("llm"), \
+                        session.post(url, headers=headers, json=payload, timeout=request_timeout) as response:
+                    if response.status in (429, 500, 502, 503, 504) and attempt < attempts - 1:
+                        delay = self._retry_delay(response, attempt)
+                        print(f"API returned {response.status}, retrying in {delay:.1f}s")
+                    elif not stream:
+                        response_data = None
+                        try:
+                            response_data = await response.json(content_type=None)
+                        except json.JSONDecodeError:
+                            print("Failed to decode JSON response")
+                        
+                        self._raise_for_status(endpoint, response, response_data)
+                        yielded = True
+                        yield response_data
+                        return
+                    else:
+                        if response.status >= 400:
+                            self._raise_for_status(endpoint, response, await response.text())
+                        
+                        async for raw_line in response.content:
+                            line = raw_line.decode('utf-8').strip()
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                return
+                            try:
+                                chunk = json.loads(data)
+                            except json.JSONDecodeError:
+                                print(f"Failed to decode stream chunk: {data[:200]}")
+                                continue
+                            yielded = True
+                            yield chunk
+                        return
+                    
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # Once chunks have gone out a retry would repeat the answer from the start
+                if attempt < attempts - 1 and not yielded:
+                    delay = self._retry_delay(None, attempt)
+                    print(f"API request error ({e!r}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                print(f"API request to {endpoint.name} failed: {e!r}")
+                raise Exception(f"API request failed: {e!r}")
+            except aiohttp.ClientError as e:
+                print(f"API request to {endpoint.name} failed: {str(e)}")
+                raise Exception(f"API request failed: {str(e)}")
             
-            response_data = None
+            # Only a retryable status gets here; back off once the response, its pooled
+            # connection and the global LLM slot have been released
+            await asyncio.sleep(delay)
+
+    async def _post_completion(self, endpoint, messages, tools=None, tool_choice="auto", timeout=None):
+        """POST a chat completion to one endpoint over the pooled session"""
+        url, headers, payload = self._build_request(endpoint, messages, tools, tool_choice)
+        request_timeout = aiohttp.ClientTimeout(total=timeout or self.request_timeout)
+        
+        response_data = None
+        # Yields exactly once, so the loop runs the request to completion
+        async for response_data in self._send(endpoint, url, headers, payload, request_timeout):
+            pass
+        return response_data
+
+    async def make_chat_completion_request(self, messages, tools=None, tool_choice="auto", timeout=None):
+        """Make a chat completion request, routed to the healthiest endpoint"""
+        return await self.router.request(
+            lambda endpoint: self._post_completion(endpoint, messages, tools, tool_choice, timeout)
+        )
+
+    async def _stream_from(self, endpoint, messages, tools=None, tool_choice="auto"):
+        """Stream a chat completion from one endpoint, yielding each parsed SSE chunk"""
+        url, headers, payload = self._build_request(endpoint, messages, tools, tool_choice, stream=True)
+        # Bound the gap between chunks rather than the whole (possibly long) stream
+        request_timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.request_timeout, sock_read=self.request_timeout)
+        
+        async for chunk in self._send(endpoint, url, headers, payload, request_timeout, stream=True):
+            yield chunk
+
+    async def stream_chat_completion_request(self, messages, tools=None, tool_choice="auto"):
+        """
+        Stream a chat completion from the best endpoint. Retries and fails over
+        only before the first chunk; a stream that breaks after that raises and
+        resumes nothing. Streams are not hedged.
+        """
+        errors = []
+        for endpoint in self.router.ranked():
+            # Same single-probe gate as non-streamed requests for half-open endpoints
+            if not self.router.claim(endpoint):
+                continue
+            started = time.monotonic()
+            first_chunk = True
             try:
-                response_data = response.json()
-            except json.JSONDecodeError:
-                print("Failed to decode JSON response")
-                
-            response.raise_for_status()
-            return response_data if response_data else response.json()
+                async with endpoint.semaphore:
+                    endpoint.in_flight += 1
+                    try:
+                        async for chunk in self._stream_from(endpoint, messages, tools, tool_choice):
+                            if first_chunk:
+                                first_chunk = False
+                                self.router.record_success(endpoint, time.monotonic() - started)
+                            yield chunk
+                    finally:
+                        endpoint.in_flight -= 1
+                if first_chunk:
+                    self.router.record_success(endpoint, time.monotonic() - started)
+                return
+            except RequestRejected:
+                # The request itself is bad: not the endpoint's fault, and no other endpoint will take it
+                self.router.release(endpoint)
+                raise
+            except Exception as e:
+                if not first_chunk:
+                    raise
+                self.router.record_failure(endpoint)
+                errors.append(str(e))
+            except BaseException:
+                # Cancelled or closed before the first chunk: give the probe back
+                if first_chunk:
+                    self.router.release(endpoint)
+                raise
+        
+        raise Exception(f"All LLM endpoints failed: {'; '.join(errors) or 'no endpoint available'}")
+
+    async def complete(self, messages, tools=None, tool_choice="auto", stream=None):
+        """
+        Run one completion round and return the assistant message dict.
+        When a StreamingReply is given, content deltas are pushed to it as they arrive.
+        """
+        prompt_builder.observe_prefix(messages, tools)
+        if stream is None:
+            response = await self.make_chat_completion_request(messages=messages, tools=tools, tool_choice=tool_choice)
+            prompt_builder.record_usage(response.get("usage"))
+            return response["choices"][0]["message"]
+        
+        content = ""
+        tool_calls = {}
+        async for chunk in self.stream_chat_completion_request(messages=messages, tools=tools, tool_choice=tool_choice):
+            if chunk.get("usage"):
+                prompt_builder.record_usage(chunk["usage"])
+            if not chunk.get("choices"):
+                continue
+            delta = chunk["choices"][0].get("delta", {})
             
-        except requests.exceptions.RequestException as e:
-            print(f"API request failed: {str(e)}")
-            raise Exception(f"API request failed: {str(e)}")
+            if delta.get("content"):
+                content += delta["content"]
+                # Once the model is calling tools, its text is only a preamble
+                if not tool_calls:
+                    await stream.push(delta["content"])
+            
+            for call_delta in delta.get("tool_calls") or []:
+                if not tool_calls:
+                    await stream.reset()
+                call = tool_calls.setdefault(call_delta.get("index", 0), {
+                    "id": None,
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                if call_delta.get("id"):
+                    call["id"] = call_delta["id"]
+                function = call_delta.get("function") or {}
+                if function.get("name"):
+                    call["function"]["name"] += function["name"]
+                if function.get("arguments"):
+                    call["function"]["arguments"] += function["arguments"]
+        
+        message = {"role": "assistant", "content": content or None}
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+        return message
     
-    async def reply_query(self, question, message):
-        """Generate response using OpenAI with chat history context and tool support"""
+    async def reply_query(self, question, message, stream=None):
+        """
+        Generate response using OpenAI with chat history context and tool support.
+        If a StreamingReply is given, the answer is streamed into it as it is generated.
+        Repeated questions are answered from the semantic answer cache.
+        """
+        try:
+            # Replies depend on the message they reply to, so only standalone questions are shared
+            if message.reference:
+                response_text = await self.generate_reply(question, message, stream)
+            else:
+                response_text = await answer_cache.get_or_compute(
+                    message, question, lambda: self.generate_reply(question, message, stream)
+                )
+            
+            print(f"LLM response: {response_text}")
+            return response_text
+            
+        except Exception as e:
+            print(f"LLM error: {e}")
+            return "Sorry, I'm having trouble processing your request right now."
+
+    async def generate_reply(self, question, message, stream=None):
+        """Run the completion and tool rounds for a question and return the answer text"""
         channel_id = str(message.channel.id)
         author = str(message.author)
         
-        # Get chat history
-        chat_history = db_manager.get_chat_history(channel_id, limit=10)
+        intent = await intent_router.route(question)
+        
+        # Document retrieval for the question overlaps history fetch and the first round
+        prefetch = context_prefetcher.start(question, self._invoke_tool) if intent != CHAT else None
+        try:
+            return await self._generate_reply(question, message, channel_id, author, stream, prefetch, intent)
+        finally:
+            if prefetch is not None:
+                prefetch.discard()
+
+    async def _generate_reply(self, question, message, channel_id, author, stream, prefetch, intent):
+        """
+        Build the prompt, then run the completion round and, if requested, the tool round.
+        A routed intent drops the tools (chat) or runs its tool before the first round.
+        """
+        with tracer.span("history_fetch", channel_id=channel_id):
+            # Get chat history; the packer decides how much of it fits
+            chat_history = db_manager.get_chat_history(channel_id, limit=self.history_fetch_limit)
+            
+            # Messages already folded into the rolling summary are sent only through it
+            summary = db_manager.get_channel_summary(channel_id)
+            if summary:
+                cursor = (summary['summarized_until_timestamp'], summary['summarized_until_id'])
+                chat_history = [chat for chat in chat_history if (chat['timestamp'], chat['id']) > cursor]
+            
+            references = db_manager.get_referenced_messages(
+                [chat['referenced_message_id'] for chat in chat_history if chat['author'] != 'bot']
+                + ([str(message.reference.message_id)] if message.reference else [])
+            )
         
-        # Build context for OpenAI
-        messages = [
-            {"role": "system", "content": f"You are Jarvis, a helpful Discord bot. Respond conversationally based on the chat context. You have access to tools that can search through uploaded documents. Use the get_context tool when users ask questions that might be answered by documents they've shared. Don't give very long answers, try to answer in less than 1500 words. You have also the web_search tool which you can use to search for latest information from internet. Use this tool when you feel you require the latest information from the net. Today's date is {today}, you are also given the latest date and year, while doing net search if month or year is needed, you can use the today's date given to you."}
+        history = [
+            context_packer.format_chat(chat, references.get(chat['referenced_message_id']))
+            for chat in chat_history
         ]
         
-        # Add chat history as context
-        for chat in chat_history:
-            if chat['author'] == 'bot':
-                messages.append({"role": "assistant", "content": chat['content']})
-            else:
-                content = f"{chat['author']}: {chat['content']}"
-                if chat['referenced_message_id']:
-                    ref_msg = db_manager.get_referenced_message(chat['referenced_message_id'])
-                    if ref_msg:
-                        content = f"[Replying to {ref_msg['author']}: {ref_msg['content']}] {content}"
-                messages.append({"role": "user", "content": content})
-        
-        # Add current question
-        current_content = f"{author}: {question}"
-        if message.reference:
-            ref_msg = db_manager.get_referenced_message(str(message.reference.message_id))
-            if ref_msg:
-                current_content = f"[Replying to {ref_msg['author']}: {ref_msg['content']}] {current_content}"
-        
-        messages.append({"role": "user", "content": current_content})
+        # Current question is never truncated, only the message it replies to
+        current = context_packer.format_chat(
+            {"author": author, "content": question},
+            references.get(str(message.reference.message_id)) if message.reference else None,
+            truncate_content=False
+        )
         
-        try:
-            # Get available tools
+        # Get available tools
+        with tracer.span("get_tools"):
             available_functions = await self.get_tools()
-            
-            # Make initial completion request
-            completion_response = self.make_chat_completion_request(
+        
+        # A chat intent is answered without tools, so its prompt is packed and counted without them
+        round_tools = None if intent == CHAT else available_functions
+        
+        messages, usage = prompt_builder.build(summary['summary'] if summary else None, history, current, tools=round_tools)
+        print(f"Prompt tokens for {channel_id}: {usage}")
+        metrics.observe("prompt_tokens", usage["total"], buckets=TOKEN_BUCKETS)
+        metrics.observe("prompt_history_messages", usage["history_messages"], buckets=COUNT_BUCKETS)
+        
+        if intent != CHAT:
+            routed_call = intent_router.tool_call_for(intent, question, available_functions)
+            if routed_call:
+                # Leave an unrelated prefetch for the model's own tool calls
+                routed_prefetch = prefetch if prefetch is not None and prefetch.tool_name == routed_call["function"]["name"] else None
+                if routed_prefetch is not None:
+                    # Same call as the prefetch, so it is answered from it
+                    routed_call["function"]["arguments"] = json.dumps(routed_prefetch.arguments)
+                with tracer.span("tool_calls", count=1, routed=intent):
+                    routed_responses = await self.handle_tool_calls([routed_call], routed_prefetch, from_model=False)
+                messages = prompt_builder.follow_up(messages, {"content": None, "tool_calls": [routed_call]}, routed_responses)
+        
+        # Make initial completion request
+        with tracer.span("completion", round=1, prompt_tokens=usage["total"]):
+            assistant_message = await self.complete(
                 messages=messages,
-                tools=available_functions,
-                tool_choice="auto"
+                tools=round_tools,
+                tool_choice="auto",
+                stream=stream
             )
+        tool_calls = None
+        tool_responses = []
+        
+        # Handle tool calls if present
+        if assistant_message.get("tool_calls"):
+            tool_calls = assistant_message["tool_calls"]
+            with tracer.span("tool_calls", count=len(tool_calls)):
+                tool_responses = await self.handle_tool_calls(assistant_message["tool_calls"], prefetch)
             
-            assistant_message = completion_response["choices"][0]["message"]
-            tool_calls = None
-            tool_responses = []
+            # Same prefix as the first round, followed by the tool exchange
+            messages = prompt_builder.follow_up(messages, assistant_message, tool_responses)
             
-            # Handle tool calls if present
-            if assistant_message.get("tool_calls"):
-                tool_calls = assistant_message["tool_calls"]
-                tool_responses = await self.handle_tool_calls(assistant_message["tool_calls"])
-                
-                # Add assistant message with tool calls
-                messages.append({
-                    "role": "assistant",
-                    "content": assistant_message.get("content"),
-                    "tool_calls": assistant_message["tool_calls"]
-                })
-                
-                # Add tool responses
-                for tool_response in tool_responses:
-                    messages.append(tool_response)
-                
-                # Make final completion request
-                final_completion_response = self.make_chat_completion_request(
+            # Make final completion request
+            with tracer.span("completion", round=2):
+                final_message = await self.complete(
                     messages=messages,
                     tools=available_functions,
-                    tool_choice="auto"
+                    tool_choice="auto",
+                    stream=stream
                 )
-                
-                final_message = final_completion_response["choices"][0]["message"]
-                response_text = final_message["content"]
-            else:
-                response_text = assistant_message["content"]
-            
-            print(f"LLM response: {response_text}")
-            return response_text
-            
-        except Exception as e:
-            print(f"LLM error: {e}")
-            return "Sorry, I'm having trouble processing your request right now."
+            response_text = final_message["content"]
+        else:
+            response_text = assistant_message["content"]
+        
+        return response_text
 
 llmManager = LLMManager()
\ No newline at end of file
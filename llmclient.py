@@ -1,9 +1,118 @@
 from fastmcp import Client
+from fastmcp.client.messages import MessageHandler
 from dotenv import load_dotenv
+import asyncio
 import os
+import time
+from metrics import metrics
 load_dotenv()
 
 MCP_PORT = os.getenv('MCP_PORT')
 MCP_HOST = os.getenv('MCP_HOST')
 url = f"http://{MCP_HOST}:{MCP_PORT}/mcp"
-client = Client(url)
\ No newline at end of file
+
+# "mcp" talks to tools.py over HTTP; "inprocess" calls the same FastMCP
+# server in this process through FastMCP's in-memory transport
+TOOL_TRANSPORT = os.getenv('TOOL_TRANSPORT', 'mcp').lower()
+
+
+class ToolListChangedHandler(MessageHandler):
+
+    def __init__(self, session):
+        self.session = session
+
+    async def on_tool_list_changed(self, notification):
+        """Drop cached tool schemas when the server announces a change"""
+        print("MCP tool list changed, invalidating cached tools")
+        self.session.invalidate_tools()
+
+
+class MCPSession:
+
+    def __init__(self, transport):
+        """
+        Long-lived, auto-reconnecting FastMCP client shared by all requests
+        
+        Args:
+            transport: MCP server URL, or a FastMCP server instance to call in-process
+        """
+        self.transport = transport
+        self.client = None
+        self.tools_ttl = float(os.getenv('MCP_TOOLS_TTL', "300"))
+        self.tools = None
+        self.tools_version = 0
+        self._tools_fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate_tools(self):
+        """Force the next list_tools call to refetch from the server"""
+        self.tools = None
+
+    async def connect(self):
+        """Return a connected client, (re)opening the session if needed"""
+        if self.client is not None and self.client.is_connected():
+            return self.client
+        
+        async with self._lock:
+            if self.client is not None and self.client.is_connected():
+                return self.client
+            
+            if self.client is not None:
+                try:
+                    await self.client.__aexit__(None, None, None)
+                except Exception as e:
+                    print(f"Error closing stale MCP session: {e}")
+            
+            client = Client(self.transport, message_handler=ToolListChangedHandler(self))
+            await client.__aenter__()
+            self.client = client
+            # The server may have restarted with a different tool set
+            self.invalidate_tools()
+            print(f"Connected to MCP server at {self.transport}")
+            return client
+
+    async def _run(self, operation):
+        """Run operation(client), reconnecting once if the session dropped"""
+        client = await self.connect()
+        try:
+            return await operation(client)
+        except Exception:
+            if client.is_connected():
+                raise
+            print("MCP session lost, reconnecting")
+            client = await self.connect()
+            return await operation(client)
+
+    async def list_tools(self):
+        """Return the server's tools, served from cache until the TTL expires"""
+        if self.tools is not None and time.monotonic() - self._tools_fetched_at < self.tools_ttl:
+            metrics.inc("mcp_tools_cache_requests", result="hit")
+            return self.tools
+        
+        metrics.inc("mcp_tools_cache_requests", result="miss")
+        tools = await self._run(lambda client: client.list_tools())
+        self.tools = tools
+        self.tools_version += 1
+        self._tools_fetched_at = time.monotonic()
+        return tools
+
+    async def call_tool(self, name, arguments):
+        """Call a tool on the shared session"""
+        return await self._run(lambda client: client.call_tool(name=name, arguments=arguments))
+
+    async def close(self):
+        """Close the shared session"""
+        if self.client is not None:
+            await self.client.__aexit__(None, None, None)
+            self.client = None
+
+
+def create_session():
+    """Build the shared session for the configured tool transport"""
+    if TOOL_TRANSPORT == 'inprocess':
+        from tools import mcp
+        return MCPSession(mcp)
+    return MCPSession(url)
+
+
+mcp_session = create_session()
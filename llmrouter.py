@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import time
+from typing import List, Dict, Any, Optional
+from metrics import metrics
+
+
+class RequestRejected(Exception):
+    """Raised when an endpoint rejects the request itself (a 4xx other than 429); not an endpoint failure"""
+
+
+class Endpoint:
+
+    def __init__(self, name: str, base_url: str, api_key: Optional[str], model: str, max_concurrency: int = 16):
+        """One OpenAI-compatible endpoint/model pair and its observed health"""
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.ewma_latency = None
+        self.ewma_error = 0.0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "in_flight": self.in_flight,
+            "ewma_latency": self.ewma_latency,
+            "ewma_error": self.ewma_error,
+            "circuit": "open" if self.opened_at is not None else "closed"
+        }
+
+
+class LLMRouter:
+
+    def __init__(self, endpoints: Optional[List[Endpoint]] = None):
+        """
+        Route completions across endpoints by EWMA latency and error rate,
+        with circuit breaking, per-endpoint concurrency limits and hedging.
+        """
+        self.alpha = float(os.getenv('LLM_EWMA_ALPHA', "0.3"))
+        self.error_penalty = float(os.getenv('LLM_ERROR_PENALTY', "5"))
+        self.failure_threshold = int(os.getenv('LLM_BREAKER_FAILURES', "3"))
+        self.cooldown = float(os.getenv('LLM_BREAKER_COOLDOWN', "30"))
+        self.hedge_delay = float(os.getenv('LLM_HEDGE_DELAY', "0"))
+        self.default_latency = 1.0
+        self.endpoints = endpoints if endpoints is not None else self._load_endpoints()
+
+    @staticmethod
+    def _load_endpoints() -> List[Endpoint]:
+        """Read LLM_ENDPOINTS (JSON list), falling back to API_BASE_URL/LLM_MODEL"""
+        raw = os.getenv('LLM_ENDPOINTS')
+        if not raw:
+            return [Endpoint(
+                name="default",
+                base_url=os.getenv('API_BASE_URL', 'https://api.openai.com/v1'),
+                api_key=os.getenv('OPENAI_API_KEY'),
+                model=os.getenv('LLM_MODEL', 'gpt-4o'),
+                max_concurrency=int(os.getenv('LLM_POOL_SIZE', "100"))
+            )]
+        
+        endpoints = []
+        for i, config in enumerate(json.loads(raw)):
+            api_key = config.get('api_key')
+            if not api_key and config.get('api_key_env'):
+                api_key = os.getenv(config['api_key_env'])
+            endpoints.append(Endpoint(
+                name=config.get('name', f"endpoint-{i}"),
+                base_url=config['base_url'],
+                api_key=api_key,
+                model=config.get('model', os.getenv('LLM_MODEL', 'gpt-4o')),
+                max_concurrency=int(config.get('max_concurrency', 16))
+            ))
+        return endpoints
+
+    def score(self, endpoint: Endpoint) -> float:
+        """Expected cost of sending a request to the endpoint (lower is better)"""
+        latency = endpoint.ewma_latency if endpoint.ewma_latency is not None else self.default_latency
+        load = endpoint.in_flight / endpoint.max_concurrency
+        return latency * (1 + self.error_penalty * endpoint.ewma_error) * (1 + load)
+
+    def _available(self, endpoint: Endpoint, now: float) -> bool:
+        if endpoint.opened_at is None:
+            return True
+        # Half-open: let a single probe through after the cooldown
+        return now - endpoint.opened_at >= self.cooldown and not endpoint.probing
+
+    def ranked(self) -> List[Endpoint]:
+        """Available endpoints, best first"""
+        now = time.monotonic()
+        return sorted((e for e in self.endpoints if self._available(e, now)), key=self.score)
+
+    def claim(self, endpoint: Endpoint) -> bool:
+        """
+        Claim the endpoint for one request. Checking and taking the half-open
+        probe happen in one step, so concurrent requests can't both probe;
+        record_success/record_failure (or release) end the probe.
+        """
+        if not self._available(endpoint, time.monotonic()):
+            return False
+        if endpoint.opened_at is not None:
+            endpoint.probing = True
+        return True
+
+    def release(self, endpoint: Endpoint):
+        """End a probe that was abandoned (cancelled) without a result"""
+        endpoint.probing = False
+
+    def claim_next(self, candidates: List[Endpoint]) -> Optional[Endpoint]:
+        """Pop candidates until one can be claimed"""
+        while candidates:
+            endpoint = candidates.pop(0)
+            if self.claim(endpoint):
+                return endpoint
+        return None
+
+    def record_success(self, endpoint: Endpoint, latency: float):
+        if endpoint.ewma_latency is None:
+            endpoint.ewma_latency = latency
+        else:
+            endpoint.ewma_latency = self.alpha * latency + (1 - self.alpha) * endpoint.ewma_latency
+        endpoint.ewma_error = (1 - self.alpha) * endpoint.ewma_error
+        endpoint.consecutive_failures = 0
+        endpoint.probing = False
+        if endpoint.opened_at is not None:
+            print(f"LLM endpoint {endpoint.name} recovered, closing circuit")
+        endpoint.opened_at = None
+        metrics.observe("llm_request_seconds", latency, endpoint=endpoint.name)
+        metrics.set_gauge("llm_endpoint_ewma_latency_seconds", endpoint.ewma_latency, endpoint=endpoint.name)
+
+    def record_failure(self, endpoint: Endpoint):
+        endpoint.ewma_error = self.alpha + (1 - self.alpha) * endpoint.ewma_error
+        endpoint.consecutive_failures += 1
+        endpoint.probing = False
+        metrics.inc("llm_request_errors_total", endpoint=endpoint.name)
+        if endpoint.opened_at is not None or endpoint.consecutive_failures >= self.failure_threshold:
+            print(f"LLM endpoint {endpoint.name} failing, opening circuit for {self.cooldown}s")
+            endpoint.opened_at = time.monotonic()
+            metrics.inc("llm_circuit_opened_total", endpoint=endpoint.name)
+
+    async def _attempt(self, endpoint: Endpoint, send):
+        """Send to an endpoint already claimed with claim()"""
+        try:
+            async with endpoint.semaphore:
+                endpoint.in_flight += 1
+                started = time.monotonic()
+                try:
+                    result = await send(endpoint)
+                except asyncio.CancelledError:
+                    raise
+                except RequestRejected:
+                    # The endpoint answered; the same request would be rejected anywhere
+                    self.release(endpoint)
+                    raise
+                except Exception:
+                    self.record_failure(endpoint)
+                    raise
+                finally:
+                    endpoint.in_flight -= 1
+                self.record_success(endpoint, time.monotonic() - started)
+                return result
+        except asyncio.CancelledError:
+            self.release(endpoint)
+            raise
+
+    async def request(self, send):
+        """
+        Run send(endpoint) on the best endpoint, failing over on errors and
+        hedging to the next one if no answer arrives within the hedge delay.
+        RequestRejected is raised as-is without failing over.
+        
+        Args:
+            send: Coroutine function taking an Endpoint and returning the response
+            
+        Returns:
+            The first successful response
+        """
+        candidates = self.ranked()
+        endpoint = self.claim_next(candidates)
+        if endpoint is None:
+            raise Exception("No LLM endpoint available (all circuits open)")
+        
+        tasks = {asyncio.create_task(self._attempt(endpoint, send))}
+        errors = []
+        try:
+            while tasks:
+                timeout = self.hedge_delay if self.hedge_delay > 0 and candidates else None
+                done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if not done:
+                    endpoint = self.claim_next(candidates)
+                    if endpoint is not None:
+                        metrics.inc("llm_hedged_requests_total")
+                        tasks.add(asyncio.create_task(self._attempt(endpoint, send)))
+                    continue
+                
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    if isinstance(task.exception(), RequestRejected):
+                        raise task.exception()
+                    errors.append(str(task.exception()))
+                
+                if not tasks:
+                    endpoint = self.claim_next(candidates)
+                    if endpoint is not None:
+                        tasks.add(asyncio.create_task(self._attempt(endpoint, send)))
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        raise Exception(f"All LLM endpoints failed: {'; '.join(errors)}")
+
+
+# Global instance
+llm_router = LLMRouter()
@@ -4,7 +4,14 @@ import os
 from dotenv import load_dotenv
 from llm import llmManager
 import asyncio
+import time
 from bot import botManager
+from vectors import vector_manager
+from streaming import StreamingReply, split_message
+from summarizer import summarizer
+from scheduler import scheduler, SchedulerBusy, INTERACTIVE, BACKGROUND
+from metrics import start_metrics_server
+from tracing import tracer
 
 load_dotenv()
 
@@ -13,38 +20,104 @@ intents.message_content = True
 intents.guilds = True
 intents.guild_messages = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# SHARD_COUNT/SHARD_IDS are set by shards.py when several processes split the shards;
+# on its own the bot runs every shard Discord recommends in this process
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', "0")) or None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', "").split(",") if shard_id.strip()] or None
+
+bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', 'true').lower() == 'true'
+BUSY_REPLY = "I'm handling a lot of questions right now, please try again in a moment."
+WEB_INDEX_PURGE_INTERVAL = float(os.getenv('WEB_INDEX_PURGE_INTERVAL', "3600"))
+purge_task = None
+
+
+def _scope(message):
+    return (str(message.guild.id) if message.guild else None, str(message.channel.id))
+
+
+async def answer_question(question, message, received_at):
+    """Generate, send and store the reply to a /bot question"""
+    if STREAM_RESPONSES:
+        reply = StreamingReply(message.channel, started_at=received_at)
+        await reply.start()
+        response = await llmManager.reply_query(question, message, stream=reply)
+        with tracer.span("discord_send"):
+            bot_messages = await reply.finish(response)
+    else:
+        response = await llmManager.reply_query(question, message)
+        with tracer.span("discord_send"):
+            bot_messages = [await message.channel.send(part) for part in split_message(response)]
+    
+    # Store bot response in database
+    for bot_message in bot_messages:
+        await botManager.store_bot_message(bot_message, message.id)
+        summarizer.note_message(*_scope(message))
+
+
+async def ingest_attachments(message):
+    """Process attachments in the background lane"""
+    try:
+        await scheduler.run(BACKGROUND, *_scope(message), lambda: botManager.store_attachment(message))
+    except SchedulerBusy:
+        print(f"Dropped attachment processing for message {message.id}: scheduler busy")
+
+async def purge_web_index():
+    """Periodically delete expired web chunks in the background lane"""
+    while True:
+        await asyncio.sleep(WEB_INDEX_PURGE_INTERVAL)
+        try:
+            await scheduler.run(BACKGROUND, None, "web-index", lambda: asyncio.to_thread(vector_manager.purge_expired_web_chunks))
+        except SchedulerBusy:
+            print("Skipped web index purge: scheduler busy")
 
 @bot.event
 async def on_ready():
     print(f'{bot.user} has connected to Discord!')
-    print(f'Bot is ready and connected to {len(bot.guilds)} server(s)')
+    print(f'Bot is ready and connected to {len(bot.guilds)} server(s) on shards {sorted(bot.shards)} of {bot.shard_count}')
+    metrics_port = int(os.getenv('METRICS_PORT', "9100"))
+    if metrics_port:
+        start_metrics_server(os.getenv('METRICS_HOST', '127.0.0.1'), metrics_port)
+    # on_ready fires again after reconnects; one purge loop is enough, and only
+    # the process holding shard 0 runs it when shards.py splits the shards
+    global purge_task
+    if WEB_INDEX_PURGE_INTERVAL and purge_task is None and (SHARD_IDS is None or 0 in SHARD_IDS):
+        purge_task = asyncio.create_task(purge_web_index())
+    # Open the MCP session and cache tool schemas before the first question
+    await llmManager.get_tools()
 
 @bot.event
 async def on_message(message):
+    received_at = time.monotonic()
+
     # Don't respond to bot's own messages
     if message.author == bot.user:
         return
     
-    # Store all messages in database
-    await botManager.store_message(message)
-    if message.attachments:
-        asyncio.create_task(botManager.store_attachment(message))
-
-    # Check if message starts with /bot
-    if message.content.startswith('/bot'):
-        question = message.content[4:].strip()
-        
-        if not question:
-            await message.channel.send("Please ask me something! Example: `/bot What is Python?`")
-            return
-        
-        # Generate and send response
-        response = await llmManager.reply_query(question, message)
-        bot_message = await message.channel.send(response)
-        
-        # Store bot response in database
-        await botManager.store_bot_message(bot_message, message.id)
+    with tracer.span("on_message", channel_id=str(message.channel.id)) as span:
+        # Store all messages in database
+        with tracer.span("store_message"):
+            # A /bot question is handed to its reply directly, so it need not be read back
+            await botManager.store_message(message, read_back=not message.content.startswith('/bot'))
+        summarizer.note_message(*_scope(message))
+        if message.attachments:
+            asyncio.create_task(ingest_attachments(message))
+
+        # Check if message starts with /bot
+        if message.content.startswith('/bot'):
+            span.set(command="bot")
+            question = message.content[4:].strip()
+            
+            if not question:
+                await message.channel.send("Please ask me something! Example: `/bot What is Python?`")
+                return
+            
+            # Generate and send response once the scheduler grants a slot
+            try:
+                await scheduler.run(INTERACTIVE, *_scope(message), lambda: answer_question(question, message, received_at))
+            except SchedulerBusy:
+                await message.channel.send(BUSY_REPLY)
     
     await bot.process_commands(message)
 
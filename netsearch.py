@@ -1,12 +1,197 @@
-import requests
+import aiohttp
+import asyncio
 import json
 import os
+import re
+import time
 from typing import Dict, Any
+from metrics import metrics
+from sharedstate import shared_state
 
-def search_web_perplexity(query: str, 
-                         max_tokens: int = 500, 
-                         temperature: float = 0.7,
-                         model: str = "sonar") -> Dict[str, Any]:
+# Queries about things that change quickly get a short TTL and are served
+# stale while a background refresh runs
+TIME_SENSITIVE_PATTERN = re.compile(
+    r"\b(latest|today|tonight|yesterday|tomorrow|now|current|currently|news|recent|this (week|month|year)|"
+    r"price|stock|score|weather|live|breaking|20\d\d)\b",
+    re.IGNORECASE
+)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace/punctuation for cache keys"""
+    return re.sub(r"[^\w]+", " ", query.lower()).strip()
+
+
+class PerplexitySearch:
+
+    def __init__(self):
+        """Pooled, cached and coalesced client for the Perplexity API"""
+        self.url = os.getenv('PPLX_API_URL', "https://api.perplexity.ai/chat/completions")
+        self.timeout = float(os.getenv('WEB_SEARCH_TIMEOUT', "30"))
+        self.ttl = float(os.getenv('WEB_SEARCH_CACHE_TTL', "3600"))
+        self.fresh_ttl = float(os.getenv('WEB_SEARCH_FRESH_TTL', "300"))
+        self.stale_ttl = float(os.getenv('WEB_SEARCH_STALE_TTL', "1800"))
+        self.max_entries = int(os.getenv('WEB_SEARCH_CACHE_SIZE', "1000"))
+        self.session = None
+        self.cache = {}
+        self.in_flight = {}
+
+    async def get_session(self):
+        """Return the shared HTTP session, creating it on first use"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=20, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def _count(self, result: str):
+        metrics.inc("web_search_cache_requests", result=result)
+
+    async def search(self,
+                     query: str,
+                     max_tokens: int = 500,
+                     temperature: float = 0.7,
+                     model: str = "sonar") -> Dict[str, Any]:
+        """
+        Search through the cache, joining identical in-flight searches. The
+        local cache is backed by one shared by all shard processes.
+        """
+        key = (normalize_query(query), model)
+        time_sensitive = bool(TIME_SENSITIVE_PATTERN.search(query))
+        ttl = self.fresh_ttl if time_sensitive else self.ttl
+        # Wall clock: entries are compared across processes
+        now = time.time()
+        
+        entry = self.cache.get(key)
+        if entry is None or now - entry["fetched_at"] >= ttl:
+            shared = await shared_state.cache_get("web_search", key)
+            if shared and (entry is None or shared["fetched_at"] > entry["fetched_at"]):
+                entry = self.cache[key] = shared
+        if entry:
+            age = now - entry["fetched_at"]
+            if age < ttl:
+                self._count("hits")
+                return entry["result"]
+            if time_sensitive and age < ttl + self.stale_ttl:
+                self._count("stale_hits")
+                if key not in self.in_flight:
+                    self._start_fetch(key, query, max_tokens, temperature, model)
+                return entry["result"]
+        
+        if key in self.in_flight:
+            self._count("coalesced")
+            return await asyncio.shield(self.in_flight[key])
+        
+        self._count("misses")
+        return await asyncio.shield(self._start_fetch(key, query, max_tokens, temperature, model))
+
+    def _start_fetch(self, key, query, max_tokens, temperature, model) -> asyncio.Task:
+        task = asyncio.create_task(self._fetch(key, query, max_tokens, temperature, model))
+        self.in_flight[key] = task
+        return task
+
+    async def _fetch(self, key, query, max_tokens, temperature, model) -> Dict[str, Any]:
+        try:
+            started = time.monotonic()
+            result = await self._request(query, max_tokens, temperature, model)
+            elapsed = time.monotonic() - started
+            metrics.observe("web_search_upstream_seconds", elapsed)
+            
+            if result["success"]:
+                entry = {"result": result, "fetched_at": time.time()}
+                self.cache[key] = entry
+                if len(self.cache) > self.max_entries:
+                    oldest = min(self.cache, key=lambda k: self.cache[k]["fetched_at"])
+                    del self.cache[oldest]
+                await shared_state.cache_put("web_search", key, entry, self.max_entries)
+                metrics.set_gauge("web_search_cache_entries", len(self.cache))
+            else:
+                metrics.inc("web_search_upstream_errors_total")
+            return result
+        finally:
+            self.in_flight.pop(key, None)
+
+    async def _request(self, query: str, max_tokens: int, temperature: float, model: str) -> Dict[str, Any]:
+        """Call the Perplexity API once"""
+        try:
+            api_key = os.getenv('PPLX_API_KEY')
+            if not api_key:
+                return {
+                    "success": False,
+                    "error": "PERPLEXITY_API_KEY not found in environment variables"
+                }
+            
+            headers = {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            }
+            
+            payload = {
+                "model": model,
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": "Be precise and concise. Provide accurate, up-to-date information with relevant sources when possible."
+                    },
+                    {
+                        "role": "user",
+                        "content": query
+                    }
+                ],
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+            
+            session = await self.get_session()
+            async with shared_state.limit("web_search"), session.post(
+                self.url,
+                headers=headers,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                response.raise_for_status()
+                response_data = await response.json(content_type=None)
+            
+            # Extract the content from the response
+            if "choices" in response_data and len(response_data["choices"]) > 0:
+                content = response_data["choices"][0]["message"]["content"]
+                return {
+                    "success": True,
+                    "content": content,
+                    "sources": response_data.get("citations", []),
+                    "model_used": model,
+                    "usage": response_data.get("usage", {})
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": "No response content found"
+                }
+                
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {
+                "success": False,
+                "error": f"API request failed: {e!r}"
+            }
+        except json.JSONDecodeError as e:
+            return {
+                "success": False,
+                "error": f"Failed to decode JSON response: {str(e)}"
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Unexpected error: {str(e)}"
+            }
+
+
+# Global instance
+web_searcher = PerplexitySearch()
+
+
+async def search_web_perplexity(query: str, 
+                                max_tokens: int = 500, 
+                                temperature: float = 0.7,
+                                model: str = "sonar") -> Dict[str, Any]:
     """
     Search the web using Perplexity AI API
     
@@ -19,75 +204,4 @@ def search_web_perplexity(query: str,
     Returns:
         Dictionary containing the search response or error
     """
-    try:
-        api_key = os.getenv('PPLX_API_KEY')
-        if not api_key:
-            return {
-                "success": False,
-                "error": "PERPLEXITY_API_KEY not found in environment variables"
-            }
-        
-        url = "https://api.perplexity.ai/chat/completions"
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Be precise and concise. Provide accurate, up-to-date information with relevant sources when possible."
-                },
-                {
-                    "role": "user",
-                    "content": query
-                }
-            ],
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
-        
-        response = requests.post(
-            url,
-            headers=headers,
-            data=json.dumps(payload),
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        response_data = response.json()
-        
-        # Extract the content from the response
-        if "choices" in response_data and len(response_data["choices"]) > 0:
-            content = response_data["choices"][0]["message"]["content"]
-            return {
-                "success": True,
-                "content": content,
-                "model_used": model,
-                "usage": response_data.get("usage", {})
-            }
-        else:
-            return {
-                "success": False,
-                "error": "No response content found"
-            }
-            
-    except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "error": f"API request failed: {str(e)}"
-        }
-    except json.JSONDecodeError as e:
-        return {
-            "success": False,
-            "error": f"Failed to decode JSON response: {str(e)}"
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": f"Unexpected error: {str(e)}"
-        }
-
+    return await web_searcher.search(query, max_tokens, temperature, model)
@@ -0,0 +1,134 @@
+import os
+import json
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+# Exact token counts when tiktoken is available
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per-message framing overhead used by chat-format models
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class ContextPacker:
+    
+    def __init__(self):
+        """Fit chat history into a token budget, newest messages first"""
+        self.token_budget = int(os.getenv('CONTEXT_TOKEN_BUDGET', "4000"))
+        self.max_message_tokens = int(os.getenv('MAX_MESSAGE_TOKENS', "400"))
+        self.max_reference_tokens = int(os.getenv('MAX_REFERENCE_TOKENS', "100"))
+        self.encoding = None
+        self._load_encoding()
+    
+    def _load_encoding(self):
+        """Load the tokenizer for the configured model"""
+        if not TIKTOKEN_AVAILABLE:
+            logger.info("tiktoken not installed, estimating tokens from character count")
+            return
+        try:
+            self.encoding = tiktoken.encoding_for_model(os.getenv('LLM_MODEL', 'gpt-4o'))
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+    
+    def count_tokens(self, text: Optional[str]) -> int:
+        """Count tokens in text (roughly 4 characters per token without tiktoken)"""
+        if not text:
+            return 0
+        if self.encoding:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+    
+    def truncate(self, text: Optional[str], max_tokens: int) -> str:
+        """Truncate text to at most max_tokens, marking the cut"""
+        if not text or self.count_tokens(text) <= max_tokens:
+            return text or ""
+        if self.encoding:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return self.encoding.decode(tokens[:max_tokens]) + " [...]"
+        return text[:max_tokens * 4] + " [...]"
+    
+    def message_tokens(self, message: Dict[str, Any]) -> int:
+        """Tokens a chat message costs in the prompt"""
+        return self.count_tokens(message.get("content")) + MESSAGE_OVERHEAD_TOKENS
+    
+    def format_chat(self, chat: Dict[str, Any], reference: Optional[Dict[str, Any]] = None, truncate_content: bool = True) -> Dict[str, Any]:
+        """
+        Turn a stored chat row into a chat message
+        
+        Args:
+            chat: Row with author and content
+            reference: Row the chat replies to, inlined in truncated form
+            truncate_content: Whether to cap the chat's own content
+            
+        Returns:
+            Chat message dict with role and content
+        """
+        content = chat['content'] or ""
+        if truncate_content:
+            content = self.truncate(content, self.max_message_tokens)
+        
+        if chat['author'] == 'bot':
+            return {"role": "assistant", "content": content}
+        
+        content = f"{chat['author']}: {content}"
+        if reference:
+            ref_content = self.truncate(reference['content'], self.max_reference_tokens)
+            content = f"[Replying to {reference['author']}: {ref_content}] {content}"
+        return {"role": "user", "content": content}
+    
+    def pack(self,
+             system_messages: List[Dict[str, Any]],
+             history: List[Dict[str, Any]],
+             current: Dict[str, Any],
+             tools: Optional[List[Dict[str, Any]]] = None,
+             token_budget: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Build the prompt message list within the token budget
+        
+        Args:
+            system_messages: Messages that always lead the prompt
+            history: Formatted history messages, oldest first
+            current: The message being answered, always included
+            tools: Tool definitions sent with the request
+            token_budget: Overrides the configured budget
+            
+        Returns:
+            Tuple of (messages, token usage breakdown)
+        """
+        budget = token_budget or self.token_budget
+        usage = {
+            "system": sum(self.message_tokens(m) for m in system_messages),
+            "tools": self.count_tokens(json.dumps(tools)) if tools else 0,
+            "current": self.message_tokens(current),
+            "history": 0,
+            "history_messages": 0,
+            "history_dropped": 0
+        }
+        remaining = budget - usage["system"] - usage["tools"] - usage["current"]
+        
+        packed = []
+        for message in reversed(history):
+            cost = self.message_tokens(message)
+            if cost > remaining:
+                break
+            packed.append(message)
+            remaining -= cost
+            usage["history"] += cost
+        
+        usage["history_messages"] = len(packed)
+        usage["history_dropped"] = len(history) - len(packed)
+        usage["total"] = usage["system"] + usage["tools"] + usage["current"] + usage["history"]
+        usage["budget"] = budget
+        
+        return system_messages + list(reversed(packed)) + [current], usage
+
+
+# Global instance
+context_packer = ContextPacker()
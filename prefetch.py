@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, deque
+from answercache import normalize_question
+from metrics import metrics
+
+
+class Prefetch:
+
+    def __init__(self, tool_name, arguments, run, on_outcome=None):
+        """
+        One speculative tool call started before the model asked for it
+
+        Args:
+            tool_name: Tool being prefetched
+            arguments: Arguments it was called with
+            run: Callable returning the coroutine that performs the call
+            on_outcome: Called with "hit", "failed", "miss" or "unused" once the prefetch is settled
+        """
+        self.tool_name = tool_name
+        self.arguments = arguments
+        self.on_outcome = on_outcome
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.task = asyncio.create_task(run())
+        self.task.add_done_callback(self._finished)
+        self.claimed = False
+        self.discarded = False
+
+    def _finished(self, task):
+        self.finished_at = time.monotonic()
+        if not task.cancelled():
+            # Mark failures as retrieved; an unused prefetch's error is irrelevant
+            task.exception()
+
+    def matches(self, tool_name, arguments, threshold):
+        """Whether a requested call can be answered with the prefetched result"""
+        if self.claimed or self.discarded or tool_name != self.tool_name:
+            return False
+        # Any filter the model adds changes the result set
+        for name, value in arguments.items():
+            if name not in self.arguments and value not in (None, False, ""):
+                return False
+            if name in self.arguments and name != "query" and value != self.arguments[name]:
+                return False
+        # ...and so does any predicted filter the model left out
+        for name in self.arguments:
+            if name != "query" and arguments.get(name) in (None, False, ""):
+                return False
+        return jaccard(arguments.get("query", ""), self.arguments["query"]) >= threshold
+
+    async def claim(self):
+        """
+        Take the prefetched result, waiting for it if still running
+
+        Raises:
+            Exception: The prefetched call's error; the caller should run the call itself
+        """
+        self.claimed = True
+        requested_at = time.monotonic()
+        try:
+            result = await self.task
+        except Exception:
+            wasted = (self.finished_at or time.monotonic()) - self.started_at
+            self._settle("failed")
+            metrics.observe("prefetch_wasted_seconds", wasted, tool=self.tool_name)
+            print(f"Prefetched {self.tool_name} failed, running it again")
+            raise
+        # Without prefetching the call would have started now and taken the full duration
+        duration = (self.finished_at or time.monotonic()) - self.started_at
+        saved = min(duration, requested_at - self.started_at)
+        self._settle("hit")
+        metrics.observe("prefetch_saved_seconds", saved, tool=self.tool_name)
+        print(f"Prefetched {self.tool_name} used, saved {saved:.3f}s")
+        return result
+
+    def _settle(self, outcome):
+        metrics.inc("prefetch_total", outcome=outcome)
+        if self.on_outcome is not None:
+            self.on_outcome(outcome)
+
+    def discard(self, outcome="unused"):
+        """
+        Cancel an unused prefetch and record the work spent on it
+
+        Args:
+            outcome: "miss" if the model called the tool differently, "unused" if it did not call it
+        """
+        if self.claimed or self.discarded:
+            return
+        self.discarded = True
+        self.task.cancel()
+        wasted = (self.finished_at or time.monotonic()) - self.started_at
+        self._settle(outcome)
+        metrics.observe("prefetch_wasted_seconds", wasted, tool=self.tool_name)
+        print(f"Prefetched {self.tool_name} {outcome}, wasted {wasted:.3f}s")
+
+
+def jaccard(a, b):
+    a, b = set(normalize_question(a).split()), set(normalize_question(b).split())
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+class ContextPrefetcher:
+
+    def __init__(self):
+        """
+        Speculatively run get_context for a question while the first completion is in flight.
+        The prefetch copies the filters (channel_id, author, include_web, ...) that most of
+        the model's recent get_context calls used, and prefetching backs off to occasional
+        exploration while too few prefetches are used.
+        """
+        self.enabled = os.getenv('SPECULATIVE_PREFETCH', 'false').lower() == 'true'
+        self.threshold = float(os.getenv('PREFETCH_MATCH_THRESHOLD', "0.5"))
+        self.min_hit_rate = float(os.getenv('PREFETCH_MIN_HIT_RATE', "0.3"))
+        self.explore_rate = float(os.getenv('PREFETCH_EXPLORE_RATE', "0.1"))
+        self.tool_name = "get_context"
+        window = int(os.getenv('PREFETCH_WINDOW', "50"))
+        self.recent_calls = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def observe_call(self, tool_name, arguments):
+        """Remember the filters of a get_context call the model made"""
+        if tool_name != self.tool_name:
+            return
+        self.recent_calls.append({
+            name: json.dumps(value, sort_keys=True)
+            for name, value in arguments.items()
+            if name != "query" and value not in (None, False, "")
+        })
+
+    def predicted_filters(self):
+        """Filter values used by more than half of the model's recent calls"""
+        counts = Counter(item for call in self.recent_calls for item in call.items())
+        return {name: json.loads(value) for (name, value), count in counts.items() if count * 2 > len(self.recent_calls)}
+
+    def hit_rate(self):
+        if not self.outcomes:
+            return None
+        return sum(outcome == "hit" for outcome in self.outcomes) / len(self.outcomes)
+
+    def record_outcome(self, outcome):
+        self.outcomes.append(outcome)
+
+    def start(self, question, call_tool):
+        """
+        Start fetching document context for the question
+
+        Args:
+            question: The /bot question
+            call_tool: Coroutine function (tool_name, arguments) -> result text
+
+        Returns:
+            Prefetch, or None when disabled
+        """
+        if not self.enabled or not question:
+            return None
+        hit_rate = self.hit_rate()
+        if hit_rate is not None and len(self.outcomes) >= 10 and hit_rate < self.min_hit_rate \
+                and random.random() >= self.explore_rate:
+            metrics.inc("prefetch_skipped_total")
+            return None
+        arguments = {**self.predicted_filters(), "query": question}
+        return Prefetch(self.tool_name, arguments, lambda: call_tool(self.tool_name, arguments), self.record_outcome)
+
+
+# Global instance
+context_prefetcher = ContextPrefetcher()
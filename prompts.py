@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from datetime import date
+from typing import List, Dict, Any, Optional, Tuple
+from metrics import metrics, RATIO_BUCKETS
+from packer import context_packer
+
+# Kept free of anything that changes between calls so the prompt prefix can be cached
+SYSTEM_PROMPT = (
+    "You are Jarvis, a helpful Discord bot. Respond conversationally based on the chat context. "
+    "You have access to tools that can search through uploaded documents. Use the get_context tool "
+    "when users ask questions that might be answered by documents they've shared. Don't give very long "
+    "answers, try to answer in less than 1500 words. You have also the web_search tool which you can use "
+    "to search for latest information from internet. Use this tool when you feel you require the latest "
+    "information from the net. Today's date is given at the end of the latest message; while doing net "
+    "search if month or year is needed, use that date."
+)
+
+
+class PromptBuilder:
+
+    def __init__(self):
+        """
+        Lay out prompts so consecutive calls share the longest possible prefix:
+        tool schemas and the system prompt first, then the summary and history
+        (append-only between turns), and volatile content such as the date last.
+        Provider prompt caching and the prefix caches of vLLM/llama.cpp only
+        reuse work up to the first byte that differs.
+        """
+        self.system_prompt = os.getenv('SYSTEM_PROMPT', SYSTEM_PROMPT)
+        self.max_prefixes = int(os.getenv('PREFIX_TRACK_ENTRIES', "4096"))
+        # Hashes of recently sent prompt prefixes, used to estimate local prefix reuse
+        self._prefixes = OrderedDict()
+
+    @staticmethod
+    def canonical_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Tool schemas sorted by name with sorted keys, so they serialize identically every call"""
+        ordered = sorted(tools, key=lambda tool: tool["function"]["name"])
+        return json.loads(json.dumps(ordered, sort_keys=True))
+
+    @staticmethod
+    def date_note(today: Optional[date] = None) -> str:
+        return f"\n\n(Today's date is {(today or date.today()).isoformat()}.)"
+
+    def build(self,
+              summary: Optional[str],
+              history: List[Dict[str, Any]],
+              current: Dict[str, Any],
+              tools: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Build the first-round message list
+
+        Args:
+            summary: Rolling channel summary, if any
+            history: Formatted history messages, oldest first
+            current: The message being answered
+            tools: Tool schemas sent with the request (already canonical)
+
+        Returns:
+            Tuple of (messages, token usage breakdown from the packer)
+        """
+        system_messages = [{"role": "system", "content": self.system_prompt}]
+        if summary:
+            system_messages.append({"role": "system", "content": f"Summary of the earlier conversation in this channel:\n{summary}"})
+
+        # The date rides on the newest message, which is the end of the prompt anyway
+        current = {**current, "content": current["content"] + self.date_note()}
+        return context_packer.pack(system_messages, history, current, tools=tools)
+
+    @staticmethod
+    def follow_up(messages: List[Dict[str, Any]], assistant_message: Dict[str, Any], tool_responses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Second-round messages: the first round's messages unchanged, then the tool exchange"""
+        return messages + [{
+            "role": "assistant",
+            "content": assistant_message.get("content"),
+            "tool_calls": assistant_message["tool_calls"]
+        }] + list(tool_responses)
+
+    def observe_prefix(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Record how much of this prompt repeats a recently sent one
+
+        Args:
+            messages: Messages about to be sent
+            tools: Tool schemas sent with them
+
+        Returns:
+            Number of leading messages already sent before
+        """
+        digest = hashlib.sha256(json.dumps(tools or [], sort_keys=True).encode())
+        reused = 0
+        reused_tokens = 0
+        total_tokens = 0
+        matching = True
+        for i, message in enumerate(messages):
+            digest.update(json.dumps(message, sort_keys=True).encode())
+            key = digest.copy().hexdigest()
+            tokens = context_packer.message_tokens(message)
+            total_tokens += tokens
+            if matching and key in self._prefixes:
+                reused = i + 1
+                reused_tokens += tokens
+                self._prefixes.move_to_end(key)
+            else:
+                matching = False
+                self._prefixes[key] = True
+        while len(self._prefixes) > self.max_prefixes:
+            self._prefixes.popitem(last=False)
+
+        metrics.inc("prompt_prefix_requests_total", reused="yes" if reused else "no")
+        if total_tokens:
+            metrics.observe("prompt_prefix_reuse_ratio", reused_tokens / total_tokens, buckets=RATIO_BUCKETS)
+        return reused
+
+    @staticmethod
+    def record_usage(usage: Optional[Dict[str, Any]]):
+        """Record prompt and provider-cached token counts from a completion's usage block"""
+        if not usage:
+            return
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        # OpenAI, vLLM and llama.cpp report prompt_tokens_details.cached_tokens
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        metrics.inc("llm_prompt_tokens_total", prompt_tokens)
+        metrics.inc("llm_cached_prompt_tokens_total", cached_tokens)
+        if prompt_tokens:
+            metrics.observe("llm_cached_prompt_ratio", cached_tokens / prompt_tokens, buckets=RATIO_BUCKETS)
+
+
+# Global instance
+prompt_builder = PromptBuilder()
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from metrics import metrics
+from tracing import tracer
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class SchedulerBusy(Exception):
+    """Raised when a lane's queue is full and the request is shed"""
+
+
+class RequestScheduler:
+
+    def __init__(self):
+        """
+        Global concurrency limit with two priority lanes. Within a lane, waiting
+        requests are served round-robin across guilds, then across channels.
+        """
+        self.max_concurrency = int(os.getenv('SCHEDULER_CONCURRENCY', "8"))
+        self.max_queue = {
+            INTERACTIVE: int(os.getenv('SCHEDULER_MAX_QUEUE', "50")),
+            BACKGROUND: int(os.getenv('SCHEDULER_MAX_BACKGROUND_QUEUE', "200")),
+        }
+        # Every Nth grant goes to background work when both lanes wait, so it never starves
+        self.background_every = int(os.getenv('SCHEDULER_BACKGROUND_EVERY', "4"))
+        self.active = 0
+        self.queues = {INTERACTIVE: OrderedDict(), BACKGROUND: OrderedDict()}
+        self.depth = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._grants = 0
+
+    async def run(self, lane, guild_id, channel_id, coro_factory):
+        """
+        Run coro_factory() once a slot is free
+        
+        Args:
+            lane: INTERACTIVE or BACKGROUND
+            guild_id: Guild the work belongs to (None for DMs)
+            channel_id: Channel the work belongs to
+            coro_factory: Callable returning the coroutine to run
+            
+        Returns:
+            The coroutine's result
+            
+        Raises:
+            SchedulerBusy: If the lane's queue is full
+        """
+        with tracer.span("scheduler_wait", lane=lane):
+            await self.acquire(lane, guild_id, channel_id)
+        try:
+            return await coro_factory()
+        finally:
+            self.release()
+
+    async def acquire(self, lane, guild_id, channel_id):
+        """Wait for a slot in the given lane"""
+        enqueued_at = time.monotonic()
+        
+        if self.active < self.max_concurrency and not any(self.depth.values()):
+            self.active += 1
+            metrics.observe("scheduler_wait_seconds", 0.0, lane=lane)
+            return
+        
+        if self.depth[lane] >= self.max_queue[lane]:
+            metrics.inc("scheduler_shed_total", lane=lane)
+            raise SchedulerBusy(f"{lane} queue is full")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        channels = self.queues[lane].setdefault(guild_id, OrderedDict())
+        channels.setdefault(channel_id, deque()).append(waiter)
+        self._set_depth(lane, self.depth[lane] + 1)
+        
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was granted just as we were cancelled
+                self.release()
+            else:
+                self._remove(lane, guild_id, channel_id, waiter)
+            raise
+        
+        metrics.observe("scheduler_wait_seconds", time.monotonic() - enqueued_at, lane=lane)
+
+    def release(self):
+        """Free a slot and hand it to the next waiter"""
+        self.active -= 1
+        while self.active < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self.active += 1
+            waiter.set_result(None)
+        metrics.set_gauge("scheduler_active", self.active)
+
+    def _next_waiter(self):
+        lanes = [INTERACTIVE, BACKGROUND]
+        if self.background_every and self._grants % self.background_every == self.background_every - 1:
+            lanes.reverse()
+        
+        for lane in lanes:
+            while self.depth[lane]:
+                waiter = self._pop(lane)
+                if not waiter.done():
+                    self._grants += 1
+                    return waiter
+        return None
+
+    def _pop(self, lane):
+        """Pop the next waiter round-robin over guilds, then channels"""
+        guilds = self.queues[lane]
+        guild_id, channels = next(iter(guilds.items()))
+        channel_id, waiters = next(iter(channels.items()))
+        waiter = waiters.popleft()
+        
+        if waiters:
+            channels.move_to_end(channel_id)
+        else:
+            del channels[channel_id]
+        if channels:
+            guilds.move_to_end(guild_id)
+        else:
+            del guilds[guild_id]
+        
+        self._set_depth(lane, self.depth[lane] - 1)
+        return waiter
+
+    def _remove(self, lane, guild_id, channel_id, waiter):
+        channels = self.queues[lane].get(guild_id)
+        if not channels or channel_id not in channels or waiter not in channels[channel_id]:
+            return
+        channels[channel_id].remove(waiter)
+        if not channels[channel_id]:
+            del channels[channel_id]
+        if not channels:
+            del self.queues[lane][guild_id]
+        self._set_depth(lane, self.depth[lane] - 1)
+
+    def _set_depth(self, lane, depth):
+        self.depth[lane] = depth
+        metrics.set_gauge("scheduler_queue_depth", depth, lane=lane)
+
+
+# Global instance
+scheduler = RequestScheduler()
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from dotenv import load_dotenv
+from sharedstate import start_server
+
+load_dotenv()
+
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+
+
+def recommended_shards(token):
+    """Ask Discord for the recommended shard count and identify concurrency"""
+    request = urllib.request.Request(GATEWAY_URL, headers={
+        "Authorization": f"Bot {token}",
+        "User-Agent": "DiscordBot (chat-jarvis, 1.0)"
+    })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        data = json.load(response)
+    return data["shards"], data.get("session_start_limit", {}).get("max_concurrency", 1)
+
+
+def shard_groups(shard_count, processes):
+    """Split shard ids 0..shard_count-1 into contiguous ranges, one per process"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+class ShardLauncher:
+
+    def __init__(self, groups, shard_count, env, metrics_port_base, with_tools, stagger, limits=None):
+        """
+        Run one main.py process per shard group and restart any that exit.
+        Guilds always land on the same shard, so per-guild state (scheduler queues,
+        cached answers, summaries) stays local to one process. Global limits, the
+        document set version that invalidates cached answers, and the web search
+        cache go through the shared state server, whose `limits` proxy is used to
+        reclaim the slots of processes that exit.
+        """
+        self.groups = groups
+        self.shard_count = shard_count
+        self.env = env
+        self.metrics_port_base = metrics_port_base
+        self.with_tools = with_tools
+        self.stagger = stagger
+        self.limits = limits
+        self.processes = {}
+        self.stopping = False
+
+    def _spawn(self, name):
+        env = dict(self.env)
+        if name == "tools":
+            command = [sys.executable, "tools.py"]
+        else:
+            index = int(name.split("-")[1])
+            command = [sys.executable, "main.py"]
+            env['SHARD_COUNT'] = str(self.shard_count)
+            env['SHARD_IDS'] = ",".join(str(shard_id) for shard_id in self.groups[index])
+            if self.metrics_port_base:
+                env['METRICS_PORT'] = str(self.metrics_port_base + index)
+        print(f"Starting {name}" + (f" (shards {env['SHARD_IDS']})" if 'SHARD_IDS' in env else ""))
+        self.processes[name] = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    def start(self):
+        if self.with_tools:
+            self._spawn("tools")
+        for i in range(len(self.groups)):
+            self._spawn(f"shard-{i}")
+            # Discord allows only max_concurrency identifies per 5 seconds
+            time.sleep(self.stagger)
+
+    def _reap(self, name, process):
+        """Release the global limit slots an exited process still held"""
+        if self.limits is None:
+            return
+        try:
+            freed = self.limits.release_owner(process.pid)
+        except (OSError, EOFError) as e:
+            print(f"Could not reclaim limits of {name}: {e!r}")
+            return
+        if freed:
+            print(f"Reclaimed {freed} global limit slot(s) held by {name}")
+
+    def supervise(self):
+        restarts = {}
+        restart_at = {}
+        while not self.stopping:
+            time.sleep(1)
+            now = time.monotonic()
+            for name, process in list(self.processes.items()):
+                if self.stopping or process.poll() is None:
+                    continue
+                if name not in restart_at:
+                    # Schedule the restart and keep watching the other processes meanwhile
+                    self._reap(name, process)
+                    delay = min(60, 2 ** restarts.get(name, 0))
+                    print(f"{name} exited with code {process.returncode}, restarting in {delay}s")
+                    restart_at[name] = now + delay
+                    restarts[name] = restarts.get(name, 0) + 1
+                elif now >= restart_at[name]:
+                    del restart_at[name]
+                    self._spawn(name)
+
+    def stop(self, *args):
+        self.stopping = True
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the bot as several shard-group processes")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-count", type=int, default=int(os.getenv('SHARD_COUNT', "0")),
+                        help="Total shards (default: Discord's recommendation, at least one per process)")
+    parser.add_argument("--metrics-port-base", type=int, default=int(os.getenv('METRICS_PORT', "9100")),
+                        help="Shard process i serves metrics on this port + i (0 = off)")
+    parser.add_argument("--with-tools", action="store_true", help="Also run the MCP tool server (tools.py)")
+    parser.add_argument("--stagger", type=float, default=5.0, help="Seconds between shard process starts")
+    args = parser.parse_args()
+
+    token = os.getenv('DISCORD_BOT_TOKEN')
+    if not token:
+        sys.exit("Error: Please set DISCORD_BOT_TOKEN in your environment variables")
+
+    shard_count = args.shard_count
+    stagger = args.stagger
+    if not shard_count:
+        recommended, max_concurrency = recommended_shards(token)
+        shard_count = max(recommended, args.processes)
+        stagger = args.stagger / max_concurrency
+    groups = shard_groups(shard_count, args.processes)
+
+    authkey = secrets.token_hex(16)
+    manager = start_server(authkey=authkey.encode())
+    host, port = manager.address
+    env = dict(os.environ,
+               SHARED_STATE_ADDRESS=f"{host}:{port}",
+               SHARED_STATE_AUTHKEY=authkey)
+    print(f"Shared state server on {host}:{port}; {shard_count} shards over {len(groups)} processes")
+
+    launcher = ShardLauncher(groups, shard_count, env, args.metrics_port_base, args.with_tools, stagger, manager.limits())
+    signal.signal(signal.SIGTERM, launcher.stop)
+    try:
+        launcher.start()
+        launcher.supervise()
+    except KeyboardInterrupt:
+        launcher.stop()
+    finally:
+        manager.shutdown()
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from multiprocessing.managers import BaseManager
+from dotenv import load_dotenv
+from metrics import metrics
+
+load_dotenv()
+
+
+class SharedLimits:
+
+    def __init__(self):
+        """
+        Cross-process concurrency counters, token buckets, version counters and
+        small caches. One instance lives in the shard launcher and is reached by
+        every shard process through a multiprocessing manager; a single-process
+        bot uses a local instance.
+        """
+        self._lock = threading.Lock()
+        self.in_flight = {}
+        # Slots held per owner (process id), so a crashed process's slots can be reclaimed
+        self.holders = {}
+        self.buckets = {}
+        self.counters = {}
+        self.caches = {}
+
+    def try_acquire(self, name: str, limit: int, owner=None) -> bool:
+        """Take one of `limit` slots for name on behalf of owner, or return False if all are in use"""
+        with self._lock:
+            if self.in_flight.get(name, 0) >= limit:
+                return False
+            self.in_flight[name] = self.in_flight.get(name, 0) + 1
+            held = self.holders.setdefault(owner, {})
+            held[name] = held.get(name, 0) + 1
+            return True
+
+    def release(self, name: str, owner=None):
+        """Return one of owner's slots; ignored if they were already reclaimed"""
+        with self._lock:
+            held = self.holders.get(owner, {})
+            if held.get(name, 0) <= 0:
+                return
+            held[name] -= 1
+            self.in_flight[name] = max(0, self.in_flight.get(name, 0) - 1)
+
+    def release_owner(self, owner) -> int:
+        """Reclaim every slot still held by owner (e.g. a process that exited); returns how many"""
+        with self._lock:
+            held = self.holders.pop(owner, {})
+            for name, count in held.items():
+                self.in_flight[name] = max(0, self.in_flight.get(name, 0) - count)
+            return sum(held.values())
+
+    def reserve(self, name: str, rate: float, burst: float) -> float:
+        """
+        Reserve one token from the name's bucket
+
+        Args:
+            name: Bucket name
+            rate: Tokens added per second
+            burst: Bucket capacity
+
+        Returns:
+            Seconds the caller must wait before using its token (0 if available now)
+        """
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated_at = self.buckets.get(name, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate) - 1
+            self.buckets[name] = (tokens, now)
+            return 0.0 if tokens >= 0 else -tokens / rate
+
+    def increment(self, name: str) -> int:
+        """Bump a shared counter (e.g. the document set version) and return its new value"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+            return self.counters[name]
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    def cache_get(self, cache: str, key):
+        with self._lock:
+            return self.caches.get(cache, {}).get(key)
+
+    def cache_put(self, cache: str, key, value, max_entries: int):
+        """Store a value in a shared cache, evicting the oldest stored entries beyond max_entries"""
+        with self._lock:
+            entries = self.caches.setdefault(cache, {})
+            entries.pop(key, None)
+            entries[key] = value
+            while len(entries) > max_entries:
+                del entries[next(iter(entries))]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": dict(self.in_flight),
+                "buckets": {k: v[0] for k, v in self.buckets.items()},
+                "counters": dict(self.counters),
+                "caches": {k: len(v) for k, v in self.caches.items()}
+            }
+
+
+class SharedStateManager(BaseManager):
+    pass
+
+
+_server_limits = SharedLimits()
+
+
+def _get_server_limits():
+    return _server_limits
+
+
+SharedStateManager.register("limits", callable=_get_server_limits)
+
+
+def start_server(address=("127.0.0.1", 0), authkey: bytes = None) -> SharedStateManager:
+    """Start the manager process that owns the shared limits (used by shards.py)"""
+    manager = SharedStateManager(address=address, authkey=authkey)
+    manager.start()
+    return manager
+
+
+class SharedState:
+
+    def __init__(self):
+        """
+        Global limits, counters and caches shared by all shard processes. GLOBAL_LIMITS is a JSON object
+        such as {"llm": {"concurrency": 32, "rate": 5, "burst": 10}, "web_search": {"rate": 1}};
+        names without an entry are unlimited. SHARED_STATE_ADDRESS/SHARED_STATE_AUTHKEY
+        are set by shards.py; without them the limits apply to this process only.
+        """
+        self.limits = json.loads(os.getenv('GLOBAL_LIMITS', "{}"))
+        self.address = os.getenv('SHARED_STATE_ADDRESS')
+        self.authkey = os.getenv('SHARED_STATE_AUTHKEY', "").encode()
+        self.poll_interval = float(os.getenv('SHARED_STATE_POLL', "0.02"))
+        self._local = SharedLimits()
+        self._remote = None
+        self._connect_lock = threading.Lock()
+
+    def _backend(self):
+        """Manager proxy when running under shards.py, else the local instance"""
+        if not self.address:
+            return self._local
+        if self._remote is None:
+            with self._connect_lock:
+                if self._remote is None:
+                    host, port = self.address.rsplit(":", 1)
+                    manager = SharedStateManager(address=(host, int(port)), authkey=self.authkey)
+                    manager.connect()
+                    self._remote = manager.limits()
+        return self._remote
+
+    async def _call(self, method, *args):
+        if not self.address:
+            return getattr(self._local, method)(*args)
+        try:
+            # Proxy calls are blocking socket round trips; proxies keep one connection per thread
+            return await asyncio.to_thread(lambda: getattr(self._backend(), method)(*args))
+        except (OSError, EOFError) as e:
+            print(f"Shared state unavailable ({e!r}), applying limits locally")
+            self._remote = None
+            return getattr(self._local, method)(*args)
+
+    async def acquire(self, name: str, limit: int):
+        """Wait until one of the name's global slots is free"""
+        delay = self.poll_interval
+        while not await self._call("try_acquire", name, limit, os.getpid()):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    async def release(self, name: str):
+        await self._call("release", name, os.getpid())
+
+    async def throttle(self, name: str, rate: float, burst: float):
+        """Wait for a token from the name's global rate bucket"""
+        wait = await self._call("reserve", name, rate, burst)
+        if wait > 0:
+            metrics.observe("global_rate_wait_seconds", wait, limit=name)
+            await asyncio.sleep(wait)
+
+    async def increment(self, name: str) -> int:
+        return await self._call("increment", name)
+
+    async def counter(self, name: str) -> int:
+        return await self._call("counter", name)
+
+    async def cache_get(self, cache: str, key):
+        return await self._call("cache_get", cache, key)
+
+    async def cache_put(self, cache: str, key, value, max_entries: int):
+        await self._call("cache_put", cache, key, value, max_entries)
+
+    @asynccontextmanager
+    async def limit(self, name: str):
+        """Apply the configured rate limit and concurrency cap for name around a request"""
+        config = self.limits.get(name)
+        if not config:
+            yield
+            return
+
+        if config.get("rate"):
+            await self.throttle(name, float(config["rate"]), float(config.get("burst", config["rate"])))
+        concurrency = config.get("concurrency")
+        if not concurrency:
+            yield
+            return
+
+        await self.acquire(name, int(concurrency))
+        try:
+            yield
+        finally:
+            await self.release(name)
+
+
+# Global instance
+shared_state = SharedState()
@@ -0,0 +1,496 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _adapt_datetime(value):
+    # Stored like TiDB DATETIME: naive UTC, so values sort and compare the same way
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(sep=" ")
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter("DATETIME", lambda raw: datetime.fromisoformat(raw.decode()))
+
+
+def _connect(path):
+    connection = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,
+        isolation_level=None  # autocommit, like the TiDB connections
+    )
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}")
+    return connection
+
+
+class SQLiteManager:
+    def __init__(self):
+        """
+        Embedded drop-in for TiDBManager: same tables and methods, stored in one
+        SQLite file (SQLITE_PATH) in WAL mode with FTS5 for chat search. Each
+        thread gets its own connection so readers never block each other.
+        """
+        self.path = os.getenv('SQLITE_PATH', "jarvis.db")
+        self._local = threading.local()
+        self.connection = None
+        self.connect()
+
+    def connect(self):
+        """Open the database file and create the schema"""
+        try:
+            self.connection = self._connection()
+            print(f"Connected to SQLite database at {self.path}")
+            self.create_database_and_table()
+        except Exception as e:
+            print(f"Error connecting to SQLite: {e}")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = _connect(self.path)
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, query, params=()):
+        return self._connection().execute(query, params)
+
+    def create_database_and_table(self):
+        """Create tables, indexes and the full-text index if they don't exist"""
+        try:
+            self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id VARCHAR(20) UNIQUE NOT NULL,
+                channel_id VARCHAR(20) NOT NULL,
+                guild_id VARCHAR(20),
+                author VARCHAR(255) NOT NULL,
+                content TEXT,
+                timestamp DATETIME NOT NULL,
+                edited_timestamp DATETIME NULL,
+                type INT DEFAULT 0,
+                embeds JSON NULL,
+                attachments JSON NULL,
+                mentions JSON NULL,
+                referenced_message_id VARCHAR(20) NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_channel_time ON messages (channel_id, timestamp, id);
+            CREATE INDEX IF NOT EXISTS idx_messages_guild_id ON messages (guild_id);
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content, content='messages', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END;
+
+            CREATE TABLE IF NOT EXISTS attachments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                attachment_id VARCHAR(64) NOT NULL,
+                message_id VARCHAR(64) NOT NULL,
+                channel_id VARCHAR(64) NOT NULL,
+                guild_id VARCHAR(64),
+                author VARCHAR(255) NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                title VARCHAR(255) NULL,
+                description TEXT NULL,
+                content_type TEXT NULL,
+                size INT NOT NULL,
+                url TEXT NOT NULL,
+                proxy_url TEXT NOT NULL,
+                text_content TEXT NULL,
+                vector_embedding JSON NULL,
+                timestamp DATETIME NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_attachments_message_id ON attachments (message_id);
+            CREATE INDEX IF NOT EXISTS idx_attachments_channel_id ON attachments (channel_id);
+
+            CREATE TABLE IF NOT EXISTS channel_summaries (
+                channel_id VARCHAR(20) PRIMARY KEY,
+                summary TEXT NOT NULL,
+                summarized_until_timestamp DATETIME NOT NULL,
+                summarized_until_id INT NOT NULL,
+                message_count INT DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            """)
+            print("Database and tables (messages, attachments, channel_summaries) created/verified successfully!")
+        except Exception as e:
+            print(f"Error creating database and table: {e}")
+
+    def add_message(self, message_data, read_back=True):
+        """Add a message to the database (read_back is accepted for TiDBManager parity; reads here are never stale)"""
+        insert_query = """
+        INSERT INTO messages
+        (message_id, channel_id, guild_id, author, content, timestamp,
+         edited_timestamp, type, embeds, attachments, mentions, referenced_message_id)
+        VALUES (:message_id, :channel_id, :guild_id, :author, :content, :timestamp,
+                :edited_timestamp, :type, :embeds, :attachments, :mentions, :referenced_message_id)
+        """
+
+        try:
+            self._execute(insert_query, message_data)
+            print(f"Message added successfully: {message_data['message_id']}")
+        except Exception as e:
+            print(f"Error adding message: {e}")
+
+    def add_attachment(self, attachment_data):
+        """Add an attachment to the database"""
+        insert_query = """
+        INSERT INTO attachments
+        (attachment_id, message_id, channel_id, guild_id, author, filename,
+        title, description, content_type, size, url, proxy_url, text_content,
+        vector_embedding, timestamp)
+        VALUES (:attachment_id, :message_id, :channel_id, :guild_id, :author, :filename,
+                :title, :description, :content_type, :size, :url, :proxy_url, :text_content,
+                :vector_embedding, :timestamp)
+        """
+
+        try:
+            self._execute(insert_query, attachment_data)
+            print(f"Attachment added successfully: {attachment_data['attachment_id']}")
+        except Exception as e:
+            print(f"Error adding attachment: {e}")
+
+    def get_chat_history(self, channel_id, limit=20):
+        """Fetch chat history for a specific channel"""
+        select_query = """
+        SELECT id, author, content, type, referenced_message_id, timestamp
+        FROM messages
+        WHERE channel_id = ?
+        ORDER BY timestamp DESC, id DESC
+        LIMIT ?
+        """
+
+        try:
+            results = [dict(row) for row in self._execute(select_query, (channel_id, limit))]
+            # Reverse to get chronological order (oldest first)
+            return list(reversed(results))
+        except Exception as e:
+            print(f"Error fetching chat history: {e}")
+            return []
+
+    def get_chats(self, messages: list[str]):
+        """Full-text search over chat history, best matches first"""
+        # Any keyword may match, like fts_match_word; quoting keeps FTS5 syntax out of user input
+        terms = [word.replace('"', '""') for keyword in messages for word in keyword.split()]
+        if not terms:
+            return []
+
+        search_query = """
+        SELECT messages.content FROM messages_fts
+        JOIN messages ON messages.id = messages_fts.rowid
+        WHERE messages_fts MATCH ?
+        ORDER BY bm25(messages_fts)
+        LIMIT 15
+        """
+        try:
+            match = " OR ".join(f'"{term}"' for term in terms)
+            return [tuple(row) for row in self._execute(search_query, (match,))]
+        except Exception as e:
+            print(f"Error fetching the chats {e}")
+            return []
+
+    def get_referenced_message(self, message_id):
+        """Get referenced message content for replies"""
+        try:
+            row = self._execute("SELECT author, content FROM messages WHERE message_id = ?", (message_id,)).fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            print(f"Error fetching referenced message: {e}")
+            return None
+
+    def get_referenced_messages(self, message_ids):
+        """Get referenced messages for several replies in one query, keyed by message_id"""
+        message_ids = list({message_id for message_id in message_ids if message_id})
+        if not message_ids:
+            return {}
+
+        placeholders = ", ".join(["?"] * len(message_ids))
+        select_query = f"SELECT message_id, author, content FROM messages WHERE message_id IN ({placeholders})"
+
+        try:
+            return {row['message_id']: dict(row) for row in self._execute(select_query, message_ids)}
+        except Exception as e:
+            print(f"Error fetching referenced messages: {e}")
+            return {}
+
+    def get_messages_after(self, channel_id, after_timestamp=None, after_id=0, limit=200):
+        """Fetch messages of a channel newer than a (timestamp, id) cursor, oldest first"""
+        if after_timestamp is None:
+            select_query = """
+            SELECT id, author, content, timestamp
+            FROM messages
+            WHERE channel_id = ?
+            ORDER BY timestamp ASC, id ASC
+            LIMIT ?
+            """
+            params = (channel_id, limit)
+        else:
+            select_query = """
+            SELECT id, author, content, timestamp
+            FROM messages
+            WHERE channel_id = ?
+            AND (timestamp > ? OR (timestamp = ? AND id > ?))
+            ORDER BY timestamp ASC, id ASC
+            LIMIT ?
+            """
+            params = (channel_id, after_timestamp, after_timestamp, after_id, limit)
+
+        try:
+            return [dict(row) for row in self._execute(select_query, params)]
+        except Exception as e:
+            print(f"Error fetching messages after cursor: {e}")
+            return []
+
+    def get_channel_summary(self, channel_id):
+        """Get the rolling conversation summary for a channel"""
+        select_query = """
+        SELECT channel_id, summary, summarized_until_timestamp, summarized_until_id, message_count
+        FROM channel_summaries WHERE channel_id = ?
+        """
+
+        try:
+            row = self._execute(select_query, (channel_id,)).fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            print(f"Error fetching channel summary: {e}")
+            return None
+
+    def save_channel_summary(self, summary_data):
+        """Insert or replace the rolling conversation summary for a channel"""
+        upsert_query = """
+        INSERT INTO channel_summaries
+        (channel_id, summary, summarized_until_timestamp, summarized_until_id, message_count)
+        VALUES (:channel_id, :summary, :summarized_until_timestamp, :summarized_until_id, :message_count)
+        ON CONFLICT (channel_id) DO UPDATE SET
+            summary = excluded.summary,
+            summarized_until_timestamp = excluded.summarized_until_timestamp,
+            summarized_until_id = excluded.summarized_until_id,
+            message_count = excluded.message_count,
+            updated_at = CURRENT_TIMESTAMP
+        """
+
+        try:
+            self._execute(upsert_query, summary_data)
+            print(f"Channel summary saved: {summary_data['channel_id']}")
+        except Exception as e:
+            print(f"Error saving channel summary: {e}")
+
+    def delete_table(self, table_name: str, confirm: bool = False) -> bool:
+        """
+        Delete a table from the SQLite database
+
+        Args:
+            table_name: Name of the table to delete
+            confirm: Safety confirmation flag
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not confirm:
+            print(f"WARNING: This will permanently delete the table '{table_name}'!")
+            print("To proceed, call this method with confirm=True")
+            return False
+
+        try:
+            exists = self._execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+            ).fetchone()[0]
+            if not exists:
+                print(f"Table '{table_name}' does not exist.")
+                return False
+
+            self._execute(f'DROP TABLE "{table_name}"')
+            print(f"Table '{table_name}' deleted successfully!")
+            return True
+
+        except Exception as e:
+            print(f"Error deleting table '{table_name}': {e}")
+            return False
+
+    def close_connection(self):
+        """Close this thread's database connection"""
+        connection = getattr(self._local, "connection", None)
+        if connection:
+            connection.close()
+            self._local.connection = None
+            print("Database connection closed.")
+
+
+class QueryResult:
+
+    def __init__(self, id: str, document: str, metadata: Dict[str, Any], distance: float):
+        """One vector search hit, shaped like TiDBVectorClient's results"""
+        self.id = id
+        self.document = document
+        self.metadata = metadata
+        self.distance = distance
+
+
+def _matches(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """Evaluate a TiDBVectorClient-style metadata filter ({key: value} or {key: {"$op": value}})"""
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op in ("$lt", "$lte", "$gt", "$gte"):
+                if value is None:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+    return True
+
+
+class SQLiteVectorClient:
+
+    def __init__(self, table_name: str, vector_dimension: int, path: Optional[str] = None, drop_existing_table: bool = False):
+        """
+        Vector collection stored in SQLite and searched in-process with exact
+        cosine distance. Vectors are loaded into memory and reloaded when the
+        collection's version changes, including writes from the other bot process. Metadata
+        filters are applied before ranking, so filtered queries always return k
+        matches when there are that many.
+        """
+        self.table_name = table_name
+        self.vector_dimension = vector_dimension
+        self.connection = _connect(path or os.getenv('SQLITE_PATH', "jarvis.db"))
+        self._lock = threading.Lock()
+        if drop_existing_table:
+            self.connection.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        self.connection.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{table_name}" (
+            id TEXT PRIMARY KEY,
+            document TEXT,
+            embedding BLOB NOT NULL,
+            metadata JSON
+        )
+        """)
+        # Bumped with every write so readers only reload when this collection changed
+        self.connection.execute("CREATE TABLE IF NOT EXISTS vector_versions (table_name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        self.connection.execute("INSERT OR IGNORE INTO vector_versions (table_name, version) VALUES (?, 0)", (table_name,))
+        self._version = None
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._matrix = np.zeros((0, vector_dimension), dtype=np.float32)
+
+    def _refresh(self):
+        """Reload vectors if the table changed since the last load (caller holds the lock)"""
+        version = self.connection.execute(
+            "SELECT version FROM vector_versions WHERE table_name = ?", (self.table_name,)
+        ).fetchone()[0]
+        if version == self._version:
+            return
+        rows = self.connection.execute(f'SELECT id, document, embedding, metadata FROM "{self.table_name}"').fetchall()
+        self._ids = [row["id"] for row in rows]
+        self._documents = [row["document"] for row in rows]
+        self._metadatas = [json.loads(row["metadata"]) if row["metadata"] else {} for row in rows]
+        self._matrix = (
+            np.frombuffer(b"".join(row["embedding"] for row in rows), dtype=np.float32).reshape(len(rows), self.vector_dimension)
+            if rows else np.zeros((0, self.vector_dimension), dtype=np.float32)
+        )
+        self._version = version
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def insert(self, ids: List[str], texts: List[str], embeddings: List[List[float]], metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Insert or replace vectors with their documents and metadata"""
+        metadatas = metadatas or [{} for _ in ids]
+        vectors = self._normalize(embeddings)
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany(
+                    f'INSERT OR REPLACE INTO "{self.table_name}" (id, document, embedding, metadata) VALUES (?, ?, ?, ?)',
+                    [(id, text, vector.tobytes(), json.dumps(metadata, default=str))
+                     for id, text, vector, metadata in zip(ids, texts, vectors, metadatas)]
+                )
+                self._bump_version()
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def query(self, query_vector: List[float], k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[QueryResult]:
+        """Return the k nearest vectors by cosine distance, after applying the metadata filter"""
+        query = self._normalize(query_vector)
+        with self._lock:
+            self._refresh()
+            if filter:
+                rows = np.array([i for i, metadata in enumerate(self._metadatas) if _matches(metadata, filter)], dtype=np.int64)
+            else:
+                rows = np.arange(len(self._ids))
+            if not len(rows):
+                return []
+            distances = 1.0 - self._matrix[rows] @ query
+            if len(rows) > k:
+                top = np.argpartition(distances, k)[:k]
+                top = top[np.argsort(distances[top])]
+            else:
+                top = np.argsort(distances)
+            return [
+                QueryResult(self._ids[rows[i]], self._documents[rows[i]], self._metadatas[rows[i]], float(distances[i]))
+                for i in top
+            ]
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None):
+        """Delete vectors by id and/or metadata filter"""
+        with self._lock:
+            self._refresh()
+            targets = set(ids or [])
+            if filter:
+                targets.update(id for id, metadata in zip(self._ids, self._metadatas) if _matches(metadata, filter))
+            if not targets:
+                return
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany(f'DELETE FROM "{self.table_name}" WHERE id = ?', [(id,) for id in targets])
+                self._bump_version()
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def _bump_version(self):
+        self.connection.execute("UPDATE vector_versions SET version = version + 1 WHERE table_name = ?", (self.table_name,))
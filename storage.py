@@ -0,0 +1,50 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "tidb" (default) uses the TiDB cluster at TIDB_CONNECTION_URL; "sqlite" keeps
+# chat history and vectors in a local file (SQLITE_PATH) for single-node setups
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'tidb').lower()
+
+
+def create_db_manager():
+    """Create the chat database manager for the configured backend"""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlitedb import SQLiteManager
+        return SQLiteManager()
+    if STORAGE_BACKEND == 'tidb':
+        from tidb import TiDBManager
+        return TiDBManager()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+def create_vector_client(table_name, vector_dimension):
+    """
+    Create a vector collection for the configured backend
+    
+    Args:
+        table_name: Collection (table) name
+        vector_dimension: Embedding dimension
+        
+    Returns:
+        Client with insert/query/delete like TiDBVectorClient
+    """
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlitedb import SQLiteVectorClient
+        return SQLiteVectorClient(table_name=table_name, vector_dimension=vector_dimension)
+    
+    from tidb_vector.integrations import TiDBVectorClient
+    connection_string = os.getenv('TIDB_CONNECTION_URL')
+    if not connection_string:
+        raise ValueError("TIDB_CONNECTION_URL not found in environment variables")
+    return TiDBVectorClient(
+        table_name=table_name,
+        connection_string=connection_string,
+        vector_dimension=vector_dimension,
+        drop_existing_table=False,  # Don't drop existing table
+        distance_strategy="cosine"
+    )
+
+
+db_manager = create_db_manager()
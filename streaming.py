@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from typing import List, Optional
+from metrics import metrics
+
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+def split_message(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    """Split text into Discord-sized parts, preferring newline and space boundaries"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind(' ', 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n ') if cut < limit else text[cut:]
+    parts.append(text)
+    return parts
+
+
+class StreamingReply:
+
+    def __init__(self, channel, started_at: Optional[float] = None, placeholder: str = "⏳ Thinking..."):
+        """
+        Progressively edited Discord reply fed by streamed LLM tokens
+        
+        Args:
+            channel: Discord channel to reply in
+            started_at: time.monotonic() when the user's message arrived
+            placeholder: Text shown until the first token arrives
+        """
+        self.channel = channel
+        self.started_at = started_at or time.monotonic()
+        self.placeholder = placeholder
+        self.edit_interval = float(os.getenv('STREAM_EDIT_INTERVAL', "1.2"))
+        self.text = ""
+        self.messages = []
+        self._shown = []
+        self._last_flush = 0.0
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+        self._first_token_recorded = False
+
+    async def start(self):
+        """Post the placeholder message"""
+        self.messages = [await self.channel.send(self.placeholder)]
+        self._shown = [self.placeholder]
+        self._last_flush = time.monotonic()
+
+    async def push(self, delta: str):
+        """Append streamed text, editing the reply at most once per edit interval"""
+        if not delta:
+            return
+        self.text += delta
+        wait = self.edit_interval - (time.monotonic() - self._last_flush)
+        if wait <= 0:
+            await self._flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush(wait))
+
+    async def reset(self):
+        """Discard streamed text, e.g. when the model turned out to be calling tools"""
+        self.text = ""
+
+    async def finish(self, final_text: Optional[str] = None) -> list:
+        """
+        Write the final text and return every Discord message that holds it
+        
+        Args:
+            final_text: Authoritative reply text; replaces the streamed buffer
+            
+        Returns:
+            List of sent/edited Discord messages, in order
+        """
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        if final_text is not None:
+            self.text = final_text
+        await self._flush(final=True)
+        return list(self.messages)
+
+    async def _delayed_flush(self, wait: float):
+        await asyncio.sleep(wait)
+        await self._flush()
+
+    async def _flush(self, final: bool = False):
+        async with self._lock:
+            text = self.text if self.text.strip() else ("" if final else self.placeholder)
+            if not text:
+                text = "..."
+            parts = split_message(text)
+
+            for i, part in enumerate(parts):
+                if i < len(self.messages):
+                    if self._shown[i] != part:
+                        self.messages[i] = await self.messages[i].edit(content=part) or self.messages[i]
+                        self._shown[i] = part
+                else:
+                    self.messages.append(await self.channel.send(part))
+                    self._shown.append(part)
+
+            if final:
+                # The reply may have shrunk after a reset
+                for extra in self.messages[len(parts):]:
+                    await extra.delete()
+                del self.messages[len(parts):]
+                del self._shown[len(parts):]
+
+            self._last_flush = time.monotonic()
+            if self.text.strip() and not self._first_token_recorded:
+                self._first_token_recorded = True
+                metrics.observe("time_to_first_visible_token_seconds", self._last_flush - self.started_at)
@@ -0,0 +1,104 @@
+import asyncio
+import os
+from collections import defaultdict
+from storage import db_manager
+from llm import llmManager
+from packer import context_packer
+from scheduler import scheduler, SchedulerBusy, BACKGROUND
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a Discord channel's conversation for a helpful bot called Jarvis. "
+    "Fold the new messages into the existing summary. Keep names, decisions, open questions, facts and "
+    "documents people referred to; drop greetings and small talk. Write plain prose, no preamble, "
+    "at most {max_words} words."
+)
+
+
+class ChannelSummarizer:
+
+    def __init__(self):
+        """Keep an incremental per-channel summary of messages older than the recent tail"""
+        self.enabled = os.getenv('SUMMARIES_ENABLED', 'true').lower() == 'true'
+        self.batch_size = int(os.getenv('SUMMARY_BATCH_SIZE', "20"))
+        self.tail_size = int(os.getenv('SUMMARY_TAIL_SIZE', "10"))
+        self.max_words = int(os.getenv('SUMMARY_MAX_WORDS', "300"))
+        self.pending = defaultdict(int)
+        self.tasks = {}
+
+    def note_message(self, guild_id, channel_id):
+        """Count a stored message and start a background update once a batch has built up"""
+        if not self.enabled:
+            return
+        
+        self.pending[channel_id] += 1
+        if self.pending[channel_id] < self.batch_size:
+            return
+        
+        task = self.tasks.get(channel_id)
+        if task and not task.done():
+            return
+        
+        self.pending[channel_id] = 0
+        self.tasks[channel_id] = asyncio.create_task(self._scheduled_update(guild_id, channel_id))
+
+    async def _scheduled_update(self, guild_id, channel_id):
+        try:
+            await scheduler.run(BACKGROUND, guild_id, channel_id, lambda: self.update_summary(channel_id))
+        except SchedulerBusy:
+            # Messages stay unsummarized and are picked up by the next batch
+            self.pending[channel_id] = self.batch_size
+
+    async def update_summary(self, channel_id):
+        """Fold every unsummarized message except the recent tail into the channel summary"""
+        try:
+            while await self._fold_batch(channel_id):
+                pass
+        except Exception as e:
+            print(f"Error updating summary for channel {channel_id}: {e}")
+
+    async def _fold_batch(self, channel_id):
+        """Fold one batch into the summary; returns True if more backlog remains"""
+        limit = self.batch_size * 5 + self.tail_size
+        current = db_manager.get_channel_summary(channel_id)
+        
+        if current:
+            new_messages = db_manager.get_messages_after(
+                channel_id,
+                current['summarized_until_timestamp'],
+                current['summarized_until_id'],
+                limit=limit
+            )
+        else:
+            new_messages = db_manager.get_messages_after(channel_id, limit=limit)
+        
+        to_fold = new_messages[:-self.tail_size] if self.tail_size else new_messages
+        if not to_fold:
+            return False
+        
+        transcript = "\n".join(
+            f"{row['author']}: {context_packer.truncate(row['content'], context_packer.max_message_tokens)}"
+            for row in to_fold
+        )
+        previous_summary = current['summary'] if current else "(none yet)"
+        
+        response = await llmManager.make_chat_completion_request(messages=[
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_words=self.max_words)},
+            {"role": "user", "content": f"Existing summary:\n{previous_summary}\n\nNew messages:\n{transcript}"}
+        ])
+        summary = response["choices"][0]["message"]["content"]
+        if not summary:
+            return False
+        
+        db_manager.save_channel_summary({
+            'channel_id': channel_id,
+            'summary': summary.strip(),
+            'summarized_until_timestamp': to_fold[-1]['timestamp'],
+            'summarized_until_id': to_fold[-1]['id'],
+            'message_count': (current['message_count'] if current else 0) + len(to_fold)
+        })
+        print(f"Summarized {len(to_fold)} messages for channel {channel_id}")
+        return len(new_messages) >= limit
+
+
+# Global instance
+summarizer = ChannelSummarizer()
@@ -1,16 +1,51 @@
 import mysql.connector
+from mysql.connector import pooling
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from urllib.parse import urlparse
 
 load_dotenv()
 
+DATABASE = "chatJarvis"
+READ = "read"
+WRITE = "write"
+
 class TiDBManager:
     def __init__(self):
+        """
+        Chat storage with separate write and read connection pools. Reads can go
+        to a replica/follower endpoint (TIDB_READ_CONNECTION_URL) with TiDB stale
+        reads; reads for a channel written within the staleness window go to the
+        primary so a reply always sees the messages that prompted it.
+        """
         self.connection = None
+        self.pools = {}
+        self.pool_slots = {}
+        self.read_staleness = float(os.getenv('TIDB_READ_STALENESS', "0"))
+        self.replica_read = os.getenv('TIDB_REPLICA_READ')
+        # Replica lag is bounded by the staleness; allow some extra for replication delay
+        self.read_your_writes_window = float(os.getenv('TIDB_READ_YOUR_WRITES_WINDOW', str(self.read_staleness + 2)))
+        self._recent_writes = {}
+        self.stale_reads = False
         self.connect()
     
-
+    def _connection_args(self, connection_url):
+        """mysql.connector arguments for a mysql:// connection URL"""
+        parsed_url = urlparse(connection_url)
+        ssl_ca = os.getenv('TIDB_SSL_CA')
+        return {
+            "host": parsed_url.hostname,
+            "port": parsed_url.port or 4000,
+            "user": parsed_url.username,
+            "password": parsed_url.password,
+            "ssl_ca": ssl_ca if ssl_ca else None,
+            "ssl_verify_cert": True if ssl_ca else False,
+            "ssl_verify_identity": True if ssl_ca else False,
+            "autocommit": True
+        }
 
     def connect(self):
         """Establish connection to TiDB database using connection URL"""
@@ -21,36 +56,100 @@ class TiDBManager:
                 raise Exception("TIDB_CONNECTION_URL not found in environment variables")
             
             parsed_url = urlparse(connection_url)
-            
-            host = parsed_url.hostname
-            port = parsed_url.port or 4000
-            user = parsed_url.username
-            password = parsed_url.password
             database = parsed_url.path.lstrip('/') if parsed_url.path else ''
             
             self.connection = mysql.connector.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
                 database=database,
-                ssl_ca=os.getenv('TIDB_SSL_CA') if os.getenv('TIDB_SSL_CA') else None,
-                ssl_verify_cert=True if os.getenv('TIDB_SSL_CA') else False,
-                ssl_verify_identity=True if os.getenv('TIDB_SSL_CA') else False,
-                autocommit=True
+                **self._connection_args(connection_url)
             )
             print("Connected to TiDB successfully!")
             self.create_database_and_table()
+            self.create_pools(connection_url, os.getenv('TIDB_READ_CONNECTION_URL') or connection_url)
         except Exception as e:
             print(f"Error connecting to TiDB: {e}")
+
+    def create_pools(self, write_url, read_url):
+        """Open the write pool on the primary and the read pool on the read endpoint"""
+        sizes = {
+            WRITE: int(os.getenv('TIDB_WRITE_POOL_SIZE', "5")),
+            READ: int(os.getenv('TIDB_READ_POOL_SIZE', "10")),
+        }
+        self.stale_reads = read_url != write_url or bool(self.read_staleness or self.replica_read)
+        for role, url in ((WRITE, write_url), (READ, read_url)):
+            self.pools[role] = pooling.MySQLConnectionPool(
+                pool_name=f"jarvis_{role}",
+                pool_size=sizes[role],
+                # Read sessions get their stale-read SET on every checkout (_configure_read_session),
+                # so the reset round trip is skipped for them
+                pool_reset_session=role == WRITE,
+                database=DATABASE,
+                **self._connection_args(url)
+            )
+            # get_connection() fails when the pool is empty; wait for a free connection instead
+            self.pool_slots[role] = threading.BoundedSemaphore(sizes[role])
+        print(f"Connection pools ready (write: {sizes[WRITE]}, read: {sizes[READ]}"
+              f"{', separate read endpoint' if read_url != write_url else ''})")
+
+    def _configure_read_session(self, connection):
+        """
+        Apply follower/stale read settings to a read connection as it is checked out.
+        One combined SET per checkout; tracking which physical connections were
+        already configured would mean relying on driver internals.
+        """
+        assignments, params = [], []
+        if self.read_staleness:
+            assignments.append("tidb_read_staleness = %s")
+            params.append(str(-int(self.read_staleness)))
+        if self.replica_read:
+            assignments.append("tidb_replica_read = %s")
+            params.append(self.replica_read)
+        if not assignments:
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SET SESSION " + ", ".join(assignments), tuple(params))
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def _cursor(self, role, dictionary=False):
+        """Check out a pooled connection for one statement and return it afterwards"""
+        with self.pool_slots[role]:
+            connection = self.pools[role].get_connection()
+            try:
+                if role == READ:
+                    self._configure_read_session(connection)
+                cursor = connection.cursor(dictionary=dictionary)
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+            finally:
+                connection.close()
+
+    def _note_write(self, channel_id):
+        now = time.monotonic()
+        self._recent_writes[channel_id] = now
+        if len(self._recent_writes) > 10000:
+            cutoff = now - self.read_your_writes_window
+            self._recent_writes = {k: v for k, v in self._recent_writes.items() if v >= cutoff}
+
+    def _read_role(self, channel_id=None):
+        """Primary for channels written too recently for the read endpoint to have caught up"""
+        if channel_id is not None and self.stale_reads:
+            written_at = self._recent_writes.get(channel_id)
+            if written_at is not None and time.monotonic() - written_at < self.read_your_writes_window:
+                return WRITE
+        return READ
+
     def create_database_and_table(self):
         """Create database and messages table if they don't exist"""
         try:
             cursor = self.connection.cursor()
             
             # Create database
-            cursor.execute("CREATE DATABASE IF NOT EXISTS chatJarvis")
-            cursor.execute("USE chatJarvis")
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DATABASE}")
+            cursor.execute(f"USE {DATABASE}")
             
             # Create table
             create_table_query = """
@@ -105,13 +204,33 @@ class TiDBManager:
             )
             """
             cursor.execute(create_attachments_table_query)
+
+            create_summaries_table_query = """
+            CREATE TABLE IF NOT EXISTS channel_summaries (
+                channel_id VARCHAR(20) PRIMARY KEY,
+                summary TEXT NOT NULL,
+                summarized_until_timestamp DATETIME NOT NULL,
+                summarized_until_id INT NOT NULL,
+                message_count INT DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+            """
+            cursor.execute(create_summaries_table_query)
             cursor.close()
-            print("Database and tables (messages, attachments) created/verified successfully!")
+            print("Database and tables (messages, attachments, channel_summaries) created/verified successfully!")
         except Exception as e:
             print(f"Error creating database and table: {e}")
     
-    def add_message(self, message_data):
-        """Add a message to the database"""
+    def add_message(self, message_data, read_back=True):
+        """
+        Add a message to the database
+        
+        Args:
+            message_data: Message row
+            read_back: Whether reads of the channel must see the message right away. False for a
+                /bot question, which its reply gets directly, so the reply's context reads can
+                still use the read endpoint.
+        """
         insert_query = """
         INSERT INTO messages 
         (message_id, channel_id, guild_id, author, content, timestamp, 
@@ -122,9 +241,10 @@ class TiDBManager:
         """
         
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(insert_query, message_data)
-            cursor.close()
+            with self._cursor(WRITE) as cursor:
+                cursor.execute(insert_query, message_data)
+            if read_back:
+                self._note_write(message_data['channel_id'])
             print(f"Message added successfully: {message_data['message_id']}")
         except Exception as e:
             print(f"Error adding message: {e}")
@@ -143,27 +263,26 @@ class TiDBManager:
         """
         
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(insert_query, attachment_data)
-            cursor.close()
+            with self._cursor(WRITE) as cursor:
+                cursor.execute(insert_query, attachment_data)
+            self._note_write(attachment_data['channel_id'])
             print(f"Attachment added successfully: {attachment_data['attachment_id']}")
         except Exception as e:
             print(f"Error adding attachment: {e}")
     def get_chat_history(self, channel_id, limit=20):
         """Fetch chat history for a specific channel"""
         select_query = """
-        SELECT author, content, type, referenced_message_id, timestamp
+        SELECT id, author, content, type, referenced_message_id, timestamp
         FROM messages 
         WHERE channel_id = %s 
-        ORDER BY timestamp DESC 
+        ORDER BY timestamp DESC, id DESC 
         LIMIT %s
         """
         
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(select_query, (channel_id, limit))
-            results = cursor.fetchall()
-            cursor.close()
+            with self._cursor(self._read_role(channel_id), dictionary=True) as cursor:
+                cursor.execute(select_query, (channel_id, limit))
+                results = cursor.fetchall()
             # Reverse to get chronological order (oldest first)
             return list(reversed(results))
         except Exception as e:
@@ -180,10 +299,9 @@ class TiDBManager:
                DESC LIMIT 15;
             """
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(search_query,(keywords,keywords))
-            result = cursor.fetchall()
-            cursor.close()
+            with self._cursor(READ) as cursor:
+                cursor.execute(search_query,(keywords,keywords))
+                result = cursor.fetchall()
             return list(result)
         except Exception as e:
             print(f"Error fetching the chats {e}")
@@ -196,15 +314,112 @@ class TiDBManager:
         """
         
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(select_query, (message_id,))
-            result = cursor.fetchone()
-            cursor.close()
+            with self._cursor(READ, dictionary=True) as cursor:
+                cursor.execute(select_query, (message_id,))
+                result = cursor.fetchone()
+            if result is None and self.stale_reads:
+                # The message may be too new for the read endpoint
+                with self._cursor(WRITE, dictionary=True) as cursor:
+                    cursor.execute(select_query, (message_id,))
+                    result = cursor.fetchone()
             return result
         except Exception as e:
             print(f"Error fetching referenced message: {e}")
             return None
     
+    def get_referenced_messages(self, message_ids):
+        """Get referenced messages for several replies in one query, keyed by message_id"""
+        message_ids = list({message_id for message_id in message_ids if message_id})
+        if not message_ids:
+            return {}
+        
+        try:
+            found = self._fetch_messages_by_id(READ, message_ids)
+            missing = [message_id for message_id in message_ids if message_id not in found]
+            if missing and self.stale_reads:
+                # Recent replies may reference messages the read endpoint has not seen yet
+                found.update(self._fetch_messages_by_id(WRITE, missing))
+            return found
+        except Exception as e:
+            print(f"Error fetching referenced messages: {e}")
+            return {}
+    
+    def _fetch_messages_by_id(self, role, message_ids):
+        placeholders = ", ".join(["%s"] * len(message_ids))
+        select_query = f"""
+        SELECT message_id, author, content FROM messages WHERE message_id IN ({placeholders})
+        """
+        with self._cursor(role, dictionary=True) as cursor:
+            cursor.execute(select_query, tuple(message_ids))
+            return {row['message_id']: row for row in cursor.fetchall()}
+    
+    def get_messages_after(self, channel_id, after_timestamp=None, after_id=0, limit=200):
+        """Fetch messages of a channel newer than a (timestamp, id) cursor, oldest first"""
+        if after_timestamp is None:
+            select_query = """
+            SELECT id, author, content, timestamp
+            FROM messages
+            WHERE channel_id = %s
+            ORDER BY timestamp ASC, id ASC
+            LIMIT %s
+            """
+            params = (channel_id, limit)
+        else:
+            select_query = """
+            SELECT id, author, content, timestamp
+            FROM messages
+            WHERE channel_id = %s
+            AND (timestamp > %s OR (timestamp = %s AND id > %s))
+            ORDER BY timestamp ASC, id ASC
+            LIMIT %s
+            """
+            params = (channel_id, after_timestamp, after_timestamp, after_id, limit)
+        
+        try:
+            with self._cursor(self._read_role(channel_id), dictionary=True) as cursor:
+                cursor.execute(select_query, params)
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error fetching messages after cursor: {e}")
+            return []
+    
+    def get_channel_summary(self, channel_id):
+        """Get the rolling conversation summary for a channel"""
+        select_query = """
+        SELECT channel_id, summary, summarized_until_timestamp, summarized_until_id, message_count
+        FROM channel_summaries WHERE channel_id = %s
+        """
+        
+        try:
+            with self._cursor(self._read_role(channel_id), dictionary=True) as cursor:
+                cursor.execute(select_query, (channel_id,))
+                return cursor.fetchone()
+        except Exception as e:
+            print(f"Error fetching channel summary: {e}")
+            return None
+    
+    def save_channel_summary(self, summary_data):
+        """Insert or replace the rolling conversation summary for a channel"""
+        upsert_query = """
+        INSERT INTO channel_summaries
+        (channel_id, summary, summarized_until_timestamp, summarized_until_id, message_count)
+        VALUES (%(channel_id)s, %(summary)s, %(summarized_until_timestamp)s, 
+                %(summarized_until_id)s, %(message_count)s)
+        ON DUPLICATE KEY UPDATE
+            summary = VALUES(summary),
+            summarized_until_timestamp = VALUES(summarized_until_timestamp),
+            summarized_until_id = VALUES(summarized_until_id),
+            message_count = VALUES(message_count)
+        """
+        
+        try:
+            with self._cursor(WRITE) as cursor:
+                cursor.execute(upsert_query, summary_data)
+            self._note_write(summary_data['channel_id'])
+            print(f"Channel summary saved: {summary_data['channel_id']}")
+        except Exception as e:
+            print(f"Error saving channel summary: {e}")
+    
     def delete_table(self, table_name: str, confirm: bool = False) -> bool:
         """
         Delete a table from the TiDB database
@@ -256,6 +471,3 @@ class TiDBManager:
         if self.connection:
             self.connection.close()
             print("Database connection closed.")
-
-
-db_manager = TiDBManager()
\ No newline at end of file
@@ -1,33 +1,113 @@
 from fastmcp import FastMCP
 from typing import Optional
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from vectors import vector_manager
-from netsearch import search_web_perplexity
-from tidb import db_manager
+from embedders import embedding_manager
+from netsearch import search_web_perplexity, TIME_SENSITIVE_PATTERN
+from storage import db_manager
+from compactor import context_compactor
+from metrics import start_metrics_server
+from tracing import tracer
 load_dotenv()
 import os
 host = os.getenv('MCP_HOST', '127.0.0.1')
 port = int(os.getenv('MCP_PORT', 9096))
 mcp = FastMCP("Exam-Bot")
 
+# Blocking work runs on bounded pools so the server's event loop stays free.
+# Embedding is CPU-bound; vector queries go through SQLAlchemy's pool; chat
+# searches use the database manager's read pool, so keep at most its size.
+embed_executor = ThreadPoolExecutor(max_workers=int(os.getenv('TOOL_EMBED_WORKERS', 2)), thread_name_prefix="embed")
+search_executor = ThreadPoolExecutor(max_workers=int(os.getenv('TOOL_SEARCH_WORKERS', 8)), thread_name_prefix="search")
+db_executor = ThreadPoolExecutor(max_workers=int(os.getenv('TOOL_DB_WORKERS', 4)), thread_name_prefix="db")
+background_tasks = set()
+
+# Passages returned by get_context; pick with benchmarks/retrieval_eval.py
+context_top_k = int(os.getenv('CONTEXT_TOP_K', 5))
+
+
+async def run_blocking(executor, func, *args):
+    """Run a blocking call on the given executor, keeping the current trace context"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, func, *args))
+
+
+async def run_traced(span_name, executor, func, *args):
+    """run_blocking inside a span"""
+    with tracer.span(span_name):
+        return await run_blocking(executor, func, *args)
+
+
+def spawn(coro):
+    """Start a fire-and-forget task, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
 
 @mcp.tool()
-def get_context(query:str,channel_id: Optional[str] = None,author: Optional[str] = None ):
+async def get_context(query:str,channel_id: Optional[str] = None,author: Optional[str] = None, include_web: bool = False, traceparent: Optional[str] = None):
     """
     Get the relevant context regarding a topic or query.
-    Arguments: It takes the string to be searched to get enough context related to that query or string or facts. Also the channel_id and author(both are optional)
+    Arguments: It takes the string to be searched to get enough context related to that query or string or facts. Also the channel_id and author(both are optional).
+    Set include_web to also search fresh results of earlier web searches.
+
+    Returns:
+      It returns a list of passages (content plus source, author, date and part) relevant to the query.
+    """
+    with tracer.span("tool.get_context", traceparent=traceparent):
+        query_embedding = await run_traced("embedding", embed_executor, embedding_manager.get_embedding, query)
+        searches = [run_traced("vector_query", search_executor, vector_manager.search_by_embedding, query_embedding, context_top_k, channel_id, author)]
+        if include_web:
+            searches.append(run_traced("vector_query_web", search_executor, vector_manager.search_web_chunks, query, context_top_k, None, query_embedding))
+        
+        result = sorted(
+            [chunk for chunks in await asyncio.gather(*searches) for chunk in chunks],
+            key=lambda chunk: chunk["similarity_score"]
+        )[:context_top_k]
+        result = context_compactor.compact_chunks(result, "get_context")
+        print(f"get_context returned {len(result)} passages for: {query}")
+        return result 
+
+@mcp.tool()
+async def get_context_multi(queries: list[str], channel_id: Optional[str] = None, author: Optional[str] = None, k: int = 5, traceparent: Optional[str] = None):
+    """
+    Get relevant context for several queries at once, e.g. the parts of a multi-part question.
+    Arguments: A list of search strings, optional channel_id and author filters, and k results per query.
 
     Returns:
-      It returns a list of dictionary containing the relevant chunks.
+      It returns one merged list of the relevant passages without duplicates, most similar first.
     """
-    print("using tool")
-    result = vector_manager.search_similar_chunks(query,5,channel_id,author)
-    print("Response from the tool: ", result)
-    print(f"here is the result: {result}")
-    return result 
+    with tracer.span("tool.get_context_multi", traceparent=traceparent):
+        queries = [query for query in queries if query.strip()]
+        if not queries:
+            return []
+        
+        # One batched embedding call, then the vector searches run concurrently
+        embeddings = await run_traced("embedding", embed_executor, embedding_manager.get_embeddings, queries)
+        results = await asyncio.gather(*[
+            run_traced("vector_query", search_executor, vector_manager.search_by_embedding, embedding, k, channel_id, author)
+            for embedding in embeddings
+        ])
+        
+        merged = {}
+        for query, chunks in zip(queries, results):
+            for chunk in chunks:
+                best = merged.get(chunk["id"])
+                if best is None or chunk["similarity_score"] < best["similarity_score"]:
+                    merged[chunk["id"]] = {**chunk, "query": query}
+        
+        result = sorted(merged.values(), key=lambda chunk: chunk["similarity_score"])
+        result = context_compactor.compact_chunks(result, "get_context_multi")
+        print(f"get_context_multi returned {len(result)} passages for {len(queries)} queries")
+        return result
 
 @mcp.tool()
-def web_search(query: str) -> str:
+async def web_search(query: str, traceparent: Optional[str] = None) -> str:
     """
     Search the web for current information using Perplexity AI.
     
@@ -37,20 +117,42 @@ def web_search(query: str) -> str:
     Returns:
         Web search results with current information and sources
     """
-    print(f"Searching web for: {query}")
-    
-    result = search_web_perplexity(query)
-    
-    if result["success"]:
-        print(f"Web search successful for: {query}")
-        return result["content"]
-    else:
-        error_msg = f"Web search failed: {result['error']}"
-        print(error_msg)
-        return error_msg
+    with tracer.span("tool.web_search", traceparent=traceparent):
+        print(f"Searching web for: {query}")
+        
+        # Serve a still-fresh indexed answer to a similar query without a network call
+        query_embedding = await run_traced("embedding", embed_executor, embedding_manager.get_embedding, query)
+        local = await run_traced("vector_query_web", search_executor, vector_manager.search_web_chunks, query, 5, vector_manager.web_max_distance, query_embedding)
+        if local:
+            print(f"Web search served from local index for: {query}")
+            sources = sorted({source for chunk in local for source in chunk["metadata"].get("sources", [])})
+            content = "\n\n".join(chunk["content"] for chunk in local)
+            fetched_at = local[0]["metadata"].get("fetched_at")
+            if sources:
+                content += "\n\nSources:\n" + "\n".join(sources)
+            return context_compactor.compact_text(f"{content}\n\n(Retrieved from web search at {fetched_at})", "web_search")
+        
+        with tracer.span("web_request"):
+            result = await search_web_perplexity(query)
+        
+        if result["success"]:
+            print(f"Web search successful for: {query}")
+            spawn(run_blocking(
+                embed_executor,
+                vector_manager.store_web_result,
+                query,
+                result["content"],
+                result.get("sources"),
+                bool(TIME_SENSITIVE_PATTERN.search(query))
+            ))
+            return context_compactor.compact_text(result["content"], "web_search")
+        else:
+            error_msg = f"Web search failed: {result['error']}"
+            print(error_msg)
+            return error_msg
 
 @mcp.tool()
-def search_chats(keywords:list[str]) -> list:
+async def search_chats(keywords:list[str], traceparent: Optional[str] = None) -> list:
     """
     It searches the chat history to find the relevant chats. 
 
@@ -60,16 +162,20 @@ def search_chats(keywords:list[str]) -> list:
     Returns: 
        It return a list of messages relevant to the keyword from chat history.
     """
-    
-    print(f"searching for the chats relvant to these {keywords}")
+    with tracer.span("tool.search_chats", traceparent=traceparent):
+        print(f"searching for the chats relvant to these {keywords}")
 
-    result = db_manager.get_chats(keywords)
-    print(f"Here is the result,{result[:5]}")
-    
-    return result
+        result = await run_traced("fts_query", db_executor, db_manager.get_chats, keywords)
+        result = context_compactor.compact_texts([row[0] for row in result], "search_chats")
+        print(f"search_chats returned {len(result)} messages")
+        
+        return result
 
 if __name__ == "__main__":
     print("🚀 Starting MCP server...")
+    metrics_port = int(os.getenv('TOOLS_METRICS_PORT', "9101"))
+    if metrics_port:
+        start_metrics_server(os.getenv('METRICS_HOST', '127.0.0.1'), metrics_port)
     mcp.run(
         transport="http",
         host=host,
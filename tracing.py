@@ -0,0 +1,208 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+from metrics import metrics, debug_routes
+
+logger = logging.getLogger("trace")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        """Attach attributes to the span"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class Tracer:
+
+    def __init__(self):
+        """Lightweight spans carried through contextvars, exported as metrics and JSON logs"""
+        self.sample_rate = float(os.getenv('TRACE_SAMPLE_RATE', "1.0"))
+        self.log_spans = os.getenv('TRACE_LOG', 'false').lower() == 'true'
+        self.recent = deque(maxlen=int(os.getenv('TRACE_BUFFER', "2000")))
+
+    @contextmanager
+    def span(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """
+        Time a block as a span; nested spans (also across awaits and gathered tasks) become children
+        
+        Args:
+            name: Span name, also the label of the span_duration_seconds histogram
+            traceparent: W3C traceparent of a remote parent (e.g. passed over the MCP hop)
+            attributes: Extra attributes recorded with the span
+        """
+        parent = _current_span.get()
+        remote = self.parse_traceparent(traceparent) if traceparent else None
+        if remote:
+            trace_id, parent_id, sampled = remote
+        elif parent:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id, sampled = uuid.uuid4().hex, None, random.random() < self.sample_rate
+        
+        span = Span(name, trace_id, parent_id, sampled, attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            _current_span.reset(token)
+            metrics.observe("span_duration_seconds", span.duration, span=name)
+            if span.sampled:
+                self.recent.append(span.to_dict())
+                if self.log_spans:
+                    logger.info(json.dumps(span.to_dict(), default=str))
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def traceparent(self) -> Optional[str]:
+        """W3C traceparent header value for the current span"""
+        span = _current_span.get()
+        if span is None:
+            return None
+        return f"00-{span.trace_id}-{span.span_id}-{'01' if span.sampled else '00'}"
+
+    @staticmethod
+    def parse_traceparent(value: str):
+        parts = value.split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        return parts[1], parts[2], parts[3] == "01"
+
+    def traces(self, limit: int = 50):
+        """Most recent sampled traces, spans grouped by trace id"""
+        grouped = {}
+        for span in reversed(self.recent):
+            if span["trace_id"] not in grouped:
+                if len(grouped) >= limit:
+                    continue
+                grouped[span["trace_id"]] = []
+            grouped[span["trace_id"]].append(span)
+        return [sorted(spans, key=lambda s: s["start"]) for spans in grouped.values()]
+
+
+class SamplingProfiler:
+
+    def __init__(self):
+        """Statistical CPU profiler: a thread samples every thread's stack at an interval"""
+        self.interval = float(os.getenv('PROFILE_INTERVAL', "0.005"))
+        self.enabled = False
+        self.samples = Counter()
+        self.sample_count = 0
+        self._thread = None
+        self._stop = None
+
+    def start(self, interval: Optional[float] = None):
+        if interval:
+            self.interval = interval
+        if self.enabled:
+            return
+        self.enabled = True
+        # Each sampler thread gets its own stop event, so a quick stop/start can't revive the old one
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.enabled = False
+        if self._stop is not None:
+            self._stop.set()
+            self._thread.join()
+            self._stop = None
+            self._thread = None
+
+    def reset(self):
+        self.samples.clear()
+        self.sample_count = 0
+
+    def _run(self, stop: threading.Event):
+        own_id = threading.get_ident()
+        while not stop.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+            stop.wait(self.interval)
+
+    def collapsed(self) -> str:
+        """Samples in collapsed-stack format (input for flamegraph tools)"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+# Global instances
+tracer = Tracer()
+profiler = SamplingProfiler()
+
+
+def _traces_route(query):
+    limit = int(query.get("limit", ["50"])[0])
+    return "application/json", json.dumps(tracer.traces(limit), default=str)
+
+
+def _profile_route(query):
+    """?enable=1[&interval=0.01] starts sampling, ?enable=0 stops, ?reset=1 clears"""
+    if query.get("reset", ["0"])[0] == "1":
+        profiler.reset()
+    if "enable" in query:
+        if query["enable"][0] == "1":
+            interval = query.get("interval")
+            profiler.start(float(interval[0]) if interval else None)
+        else:
+            profiler.stop()
+    if query.get("format", ["json"])[0] == "collapsed":
+        return "text/plain", profiler.collapsed()
+    return "application/json", json.dumps({
+        "enabled": profiler.enabled,
+        "interval": profiler.interval,
+        "samples": profiler.sample_count,
+        "top": profiler.samples.most_common(20)
+    })
+
+
+debug_routes["/debug/traces"] = _traces_route
+debug_routes["/debug/profile"] = _profile_route
@@ -1,8 +1,13 @@
 import os
+import time
+import hashlib
+import json
+import numpy as np
+from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from tidb_vector.integrations import TiDBVectorClient
 from embedders import embedding_manager
+from storage import create_vector_client
 from dotenv import load_dotenv
 import logging
 
@@ -16,31 +21,33 @@ class VectorManager:
     def __init__(self):
         """Initialize vector store manager"""
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=int(os.getenv('CHUNK_SIZE', "1000")),
+            chunk_overlap=int(os.getenv('CHUNK_OVERLAP', "200")),
             length_function=len,
             separators=["\n\n", "\n", " ", ""]
         )
         self.vector_client = None
+        self.web_client = None
+        self.web_ttl = float(os.getenv('WEB_INDEX_TTL', "86400"))
+        self.web_fresh_ttl = float(os.getenv('WEB_INDEX_FRESH_TTL', "3600"))
+        self.web_max_distance = float(os.getenv('WEB_INDEX_MAX_DISTANCE', "0.15"))
+        # Two-stage retrieval: pick the closest documents, then search only their chunks
+        self.doc_client = None
+        self.hierarchical = os.getenv('HIERARCHICAL_RETRIEVAL', 'false').lower() == 'true'
+        self.doc_top_n = int(os.getenv('DOC_TOP_N', "5"))
         self._initialize_vector_store()
     
     def _initialize_vector_store(self):
-        """Initialize TiDB Vector Client"""
+        """Initialize the vector collections on the configured storage backend"""
         try:
-            connection_string = os.getenv('TIDB_CONNECTION_URL')
-            if not connection_string:
-                raise ValueError("TIDB_CONNECTION_URL not found in environment variables")
-            
-            self.vector_client = TiDBVectorClient(
-                table_name='embed',
-                connection_string=connection_string,
-                vector_dimension=embedding_manager.get_dimension(),
-                drop_existing_table=False,  # Don't drop existing table
-                distance_strategy="cosine"
-            )
-            logger.info("TiDB Vector Client initialized successfully")
+            self.vector_client = create_vector_client('embed', embedding_manager.get_dimension())
+            # Web search results live in their own collection with expiry metadata
+            self.web_client = create_vector_client('web_embed', embedding_manager.get_dimension())
+            # One vector per document (mean of its chunk vectors) for the first retrieval stage
+            self.doc_client = create_vector_client('doc_embed', embedding_manager.get_dimension())
+            logger.info("Vector store initialized successfully")
         except Exception as e:
-            logger.error(f"Error initializing TiDB Vector Client: {e}")
+            logger.error(f"Error initializing vector store: {e}")
             raise
     
     def chunk_text(self, text: str) -> List[str]:
@@ -65,7 +72,8 @@ class VectorManager:
                         text_content: str, 
                         attachment_data: Dict[str, Any]) -> bool:
         """
-        Process document: chunk text, generate embeddings, and store in vector store
+        Process document: chunk text, generate embeddings, and store in vector store.
+        Also stores the document embedding and sets attachment_data['vector_embedding'] to it (JSON).
         
         Args:
             text_content: Extracted text from document
@@ -125,6 +133,24 @@ class VectorManager:
                 metadatas=metadatas
             )
             
+            document_embedding = self.document_embedding(chunk_embeddings)
+            self.doc_client.insert(
+                ids=[str(attachment_data['attachment_id'])],
+                texts=[f"{attachment_data['filename']}\n{chunks[0]}"],
+                embeddings=[document_embedding],
+                metadatas=[{
+                    "message_id": attachment_data['message_id'],
+                    "channel_id": attachment_data['channel_id'],
+                    "guild_id": attachment_data.get('guild_id'),
+                    "author": attachment_data['author'],
+                    "filename": attachment_data['filename'],
+                    "attachment_id": attachment_data['attachment_id'],
+                    "timestamp": attachment_data['timestamp'].isoformat() if attachment_data.get('timestamp') else None,
+                    "total_chunks": len(chunks)
+                }]
+            )
+            attachment_data['vector_embedding'] = json.dumps(document_embedding)
+            
             logger.info(f"Successfully stored {len(chunks)} chunks for {attachment_data['filename']}")
             return True
             
@@ -132,6 +158,14 @@ class VectorManager:
             logger.error(f"Error storing document chunks: {e}")
             return False
     
+    @staticmethod
+    def document_embedding(chunk_embeddings: List[List[float]]) -> List[float]:
+        """Mean of the normalized chunk vectors, renormalized"""
+        vectors = np.asarray(chunk_embeddings, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        mean = vectors.mean(axis=0)
+        return (mean / (np.linalg.norm(mean) + 1e-12)).tolist()
+    
     def search_similar_chunks(self, 
                         query: str, 
                         k: int = 5,
@@ -152,7 +186,32 @@ class VectorManager:
         try:
             # Generate embedding for the query
             query_embedding = embedding_manager.get_embedding(query)
+        except Exception as e:
+            logger.error(f"Error searching similar chunks: {e}")
+            return []
+        
+        results = self.search_by_embedding(query_embedding, k, channel_id, author)
+        logger.info(f"Found {len(results)} similar chunks for query: {query}")
+        return results
+    
+    def search_by_embedding(self,
+                            query_embedding: List[float],
+                            k: int = 5,
+                            channel_id: Optional[str] = None,
+                            author: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Search for document chunks similar to an already computed embedding
+        
+        Args:
+            query_embedding: Embedding of the query
+            k: Number of results to return
+            channel_id: Filter by channel ID
+            author: Filter by author
             
+        Returns:
+            List of similar chunks with metadata
+        """
+        try:
             # Build metadata filter
             metadata_filter = {}
             if channel_id:
@@ -160,12 +219,15 @@ class VectorManager:
             if author:
                 metadata_filter["author"] = author
             
-            # Search vector store using query method
-            results = self.vector_client.query(
-                query_vector=query_embedding,
-                k=k,
-                filter=metadata_filter if metadata_filter else None
-            )
+            if self.hierarchical:
+                results = self._search_within_top_documents(query_embedding, k, metadata_filter)
+            else:
+                # Search vector store using query method
+                results = self.vector_client.query(
+                    query_vector=query_embedding,
+                    k=k,
+                    filter=metadata_filter if metadata_filter else None
+                )
             
             # Format results to match expected output
             formatted_results = []
@@ -178,13 +240,146 @@ class VectorManager:
                 }
                 formatted_results.append(formatted_result)
             
-            logger.info(f"Found {len(formatted_results)} similar chunks for query: {query}")
             return formatted_results
             
         except Exception as e:
             logger.error(f"Error searching similar chunks: {e}")
             return []
     
+    def _search_within_top_documents(self, query_embedding, k, metadata_filter):
+        """
+        Stage one ranks documents, stage two ranks chunks of the top DOC_TOP_N documents only.
+        Documents stored before document vectors existed need backfill_documents.py to be found.
+        """
+        documents = self.doc_client.query(
+            query_vector=query_embedding,
+            k=self.doc_top_n,
+            filter=metadata_filter if metadata_filter else None
+        )
+        if not documents:
+            # No document vectors in this scope yet (e.g. stored before they existed and not backfilled)
+            return self.vector_client.query(
+                query_vector=query_embedding,
+                k=k,
+                filter=metadata_filter if metadata_filter else None
+            )
+        attachment_ids = [document.metadata["attachment_id"] for document in documents]
+        return self.vector_client.query(
+            query_vector=query_embedding,
+            k=k,
+            filter={**metadata_filter, "attachment_id": {"$in": attachment_ids}}
+        )
+    
+    def store_web_result(self,
+                         query: str,
+                         content: str,
+                         sources: Optional[List[str]] = None,
+                         time_sensitive: bool = False) -> bool:
+        """
+        Chunk, embed and store a web search answer for local reuse
+        
+        Args:
+            query: The search query that produced the answer
+            content: Answer text from the web search
+            sources: Source URLs cited by the answer
+            time_sensitive: Use the shorter freshness TTL
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            chunks = self.chunk_text(content)
+            if not chunks:
+                return False
+            
+            embeddings = embedding_manager.get_embeddings(chunks)
+            query_key = hashlib.sha1(query.strip().lower().encode('utf-8')).hexdigest()[:16]
+            now = time.time()
+            ttl = self.web_fresh_ttl if time_sensitive else self.web_ttl
+            
+            # Replace any earlier answer to the same query
+            self.web_client.delete(filter={"query_key": query_key})
+            
+            self.web_client.insert(
+                ids=[f"web_{query_key}_{i}" for i in range(len(chunks))],
+                texts=chunks,
+                embeddings=embeddings,
+                metadatas=[{
+                    "source_type": "web",
+                    "query": query,
+                    "query_key": query_key,
+                    "sources": sources or [],
+                    "fetched_at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+                    "expires_at": now + ttl,
+                    "chunk_index": i,
+                    "total_chunks": len(chunks)
+                } for i in range(len(chunks))]
+            )
+            
+            logger.info(f"Indexed {len(chunks)} web chunks for query: {query}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error storing web result: {e}")
+            return False
+    
+    def search_web_chunks(self,
+                          query: str,
+                          k: int = 5,
+                          max_distance: Optional[float] = None,
+                          query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Search indexed web results that are still fresh
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            max_distance: Only return chunks at most this cosine distance away
+            query_embedding: Precomputed embedding of the query
+            
+        Returns:
+            List of fresh web chunks with metadata
+        """
+        try:
+            if query_embedding is None:
+                query_embedding = embedding_manager.get_embedding(query)
+            # Expired chunks are excluded by the query itself, so they can't crowd out fresh ones
+            results = self.web_client.query(
+                query_vector=query_embedding,
+                k=k,
+                filter={"expires_at": {"$gt": time.time()}}
+            )
+            
+            formatted_results = []
+            for result in results:
+                if max_distance is not None and result.distance > max_distance:
+                    continue
+                formatted_results.append({
+                    "content": result.document,
+                    "metadata": result.metadata,
+                    "similarity_score": result.distance,
+                    "id": result.id
+                })
+                if len(formatted_results) >= k:
+                    break
+            
+            logger.info(f"Found {len(formatted_results)} fresh web chunks for query: {query}")
+            return formatted_results
+            
+        except Exception as e:
+            logger.error(f"Error searching web chunks: {e}")
+            return []
+    
+    def purge_expired_web_chunks(self) -> bool:
+        """Delete web chunks past their expiry"""
+        try:
+            self.web_client.delete(filter={"expires_at": {"$lt": time.time()}})
+            logger.info("Purged expired web chunks")
+            return True
+        except Exception as e:
+            logger.error(f"Error purging web chunks: {e}")
+            return False
+    
     def delete_document_chunks(self, message_id: str) -> bool:
         """
         Delete all chunks for a specific message
@@ -200,6 +395,9 @@ class VectorManager:
             self.vector_client.delete(
                 filter={"message_id": message_id}
             )
+            self.doc_client.delete(
+                filter={"message_id": message_id}
+            )
             logger.info(f"Deleted chunks for message {message_id}")
             return True
             